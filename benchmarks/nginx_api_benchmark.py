@@ -0,0 +1,289 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""nginx API config benchmark for the LabManager performance profiles
+
+Renders the nginx API config of each profile, serves a stub WSGI app with uwsgi using the profile's process, thread and
+listen settings, and drives concurrent GraphQL-sized POST requests through nginx over keep-alive connections. Requires
+the `nginx` and `uwsgi` binaries.
+
+    python benchmarks/nginx_api_benchmark.py --requests 5000 --concurrency 64 --output nginx_bench.json
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+GTM_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GTM_ROOT)
+
+from gtmlib.common.render import get_performance_profiles, render_nginx_api  # noqa: E402
+
+DEFAULT_OVERRIDE = os.path.join(GTM_ROOT, 'gtmlib', 'resources', 'labmanager_resources',
+                                'labmanager-config-override.yaml')
+
+STUB_APP = '''import os
+
+BODY = b'{"data": {"labbookList": "' + b'x' * int(os.environ['STUB_RESPONSE_BYTES']) + b'"}}'
+
+
+def application(environ, start_response):
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    if length:
+        environ['wsgi.input'].read(length)
+    start_response('200 OK', [('Content-Type', 'application/json'), ('Content-Length', str(len(BODY)))])
+    return [BODY]
+'''
+
+NGINX_CONF = '''daemon off;
+worker_processes auto;
+pid {root}/nginx.pid;
+error_log {root}/error.log;
+
+events {{
+  worker_connections 4096;
+}}
+
+http {{
+  access_log off;
+  client_body_temp_path {root}/client_body;
+  proxy_temp_path {root}/proxy;
+  fastcgi_temp_path {root}/fastcgi;
+  uwsgi_temp_path {root}/uwsgi;
+  scgi_temp_path {root}/scgi;
+
+  include {root}/nginx_api.conf;
+}}
+'''
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    """Method to wait until a local port accepts connections
+
+    Args:
+        port(int): Port to connect to
+        timeout(float): Seconds to wait
+
+    Returns:
+        None
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise ValueError(f"Nothing listening on port {port} after {timeout}s")
+            time.sleep(0.1)
+
+
+def get_somaxconn() -> int:
+    try:
+        with open('/proc/sys/net/core/somaxconn', 'rt') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 128
+
+
+def start_servers(root: str, settings: typing.Dict[str, typing.Any],
+                  args: argparse.Namespace) -> typing.Tuple[int, typing.List[subprocess.Popen]]:
+    """Method to start uwsgi with the stub app and nginx with the rendered config of a profile
+
+    Args:
+        root(str): Working directory for sockets, configs and temp files
+        settings(dict): Profile settings
+        args(Namespace): Command line arguments
+
+    Returns:
+        tuple: nginx port, started processes
+    """
+    app_file = os.path.join(root, 'stub_app.py')
+    with open(app_file, 'wt') as f:
+        f.write(STUB_APP)
+
+    uwsgi_socket = os.path.join(root, 'labmanager.sock')
+    env = dict(os.environ, STUB_RESPONSE_BYTES=str(args.response_bytes))
+    uwsgi = subprocess.Popen([args.uwsgi, '--socket', uwsgi_socket, '--chmod-socket=666', '--master',
+                              '--enable-threads', '--disable-logging',
+                              '--processes', str(settings['uwsgi_processes']),
+                              '--threads', str(settings['uwsgi_threads']),
+                              '--listen', str(min(settings['uwsgi_listen'], get_somaxconn())),
+                              '--wsgi-file', app_file], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    port = get_free_port()
+    with open(os.path.join(root, 'nginx_api.conf'), 'wt') as f:
+        f.write(render_nginx_api(settings, port=port, socket=uwsgi_socket, uwsgi_params=args.uwsgi_params))
+    with open(os.path.join(root, 'nginx.conf'), 'wt') as f:
+        f.write(NGINX_CONF.format(root=root))
+    nginx = subprocess.Popen([args.nginx, '-p', root, '-c', os.path.join(root, 'nginx.conf')],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    processes = [uwsgi, nginx]
+    try:
+        deadline = time.monotonic() + 10
+        while not os.path.exists(uwsgi_socket):
+            if time.monotonic() > deadline or uwsgi.poll() is not None:
+                raise ValueError("uwsgi failed to start")
+            time.sleep(0.1)
+        wait_for_port(port)
+    except BaseException:
+        stop_servers(processes)
+        raise
+    return port, processes
+
+
+def stop_servers(processes: typing.List[subprocess.Popen]) -> None:
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_load(port: int, num_requests: int, concurrency: int, request_bytes: int) -> typing.Dict[str, typing.Any]:
+    """Method to send GraphQL-sized POST requests from several keep-alive connections at once
+
+    Args:
+        port(int): nginx port
+        num_requests(int): Total number of requests
+        concurrency(int): Number of connections sending requests at the same time
+        request_bytes(int): Size of each request body
+
+    Returns:
+        dict
+    """
+    query = json.dumps({"query": "query { labbookList { edges { node { name } } } }",
+                        "variables": {"padding": "x" * max(0, request_bytes - 80)}}).encode()
+    headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+
+    def worker(count: int) -> typing.Tuple[typing.List[float], int]:
+        latencies = []
+        errors = 0
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                conn.request('POST', '/labbook/', body=query, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+        return latencies, errors
+
+    counts = [num_requests // concurrency + (1 if i < num_requests % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, counts))
+    wall = time.perf_counter() - start
+
+    latencies = sorted([latency for worker_latencies, _ in results for latency in worker_latencies])
+    errors = sum(e for _, e in results)
+    if not latencies:
+        raise ValueError("Every request failed")
+
+    def percentile(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+    return {"requests": num_requests,
+            "errors": errors,
+            "requests_per_second": round(len(latencies) / wall, 1),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the nginx API config of each performance profile")
+    parser.add_argument("--override", default=DEFAULT_OVERRIDE, metavar="<file>",
+                        help="Config override the profiles are loaded from")
+    parser.add_argument("--profiles", nargs="+", default=None, metavar="<profile>",
+                        help="Profiles to benchmark, defaults to all")
+    parser.add_argument("--requests", type=int, default=2000, help="Number of requests per profile")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent connections")
+    parser.add_argument("--request-bytes", type=int, default=2048, help="Size of each request body")
+    parser.add_argument("--response-bytes", type=int, default=16384, help="Size of each response body")
+    parser.add_argument("--nginx", default="nginx", help="nginx binary")
+    parser.add_argument("--uwsgi", default="uwsgi", help="uwsgi binary")
+    parser.add_argument("--uwsgi-params", default="/etc/nginx/uwsgi_params", help="uwsgi_params file nginx includes")
+    parser.add_argument("--output", default=None, metavar="<file>", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    for binary in [args.nginx, args.uwsgi]:
+        if not shutil.which(binary):
+            print(f"Error: `{binary}` not found", file=sys.stderr)
+            return 1
+
+    _, profiles = get_performance_profiles(args.override)
+    results = {}
+    for name in args.profiles or sorted(profiles):
+        if name not in profiles:
+            print(f"Error: unknown profile `{name}`", file=sys.stderr)
+            return 1
+
+        with tempfile.TemporaryDirectory(prefix='gtm-nginx-bench-') as root:
+            port, processes = start_servers(root, profiles[name], args)
+            try:
+                # Warm up the uwsgi workers
+                run_load(port, args.concurrency, args.concurrency, args.request_bytes)
+                results[name] = run_load(port, args.requests, args.concurrency, args.request_bytes)
+            finally:
+                stop_servers(processes)
+
+        r = results[name]
+        print(f"{name:<12} {r['requests_per_second']:>9.1f} req/s  mean: {r['mean_ms']:>7.2f}ms  "
+              f"p50: {r['p50_ms']:>7.2f}ms  p95: {r['p95_ms']:>7.2f}ms  p99: {r['p99_ms']:>7.2f}ms  "
+              f"errors: {r['errors']}")
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""Startup-time benchmark for the gtm CLI
+
+Runs each command under `python -X importtime` and records the import cost the command pays before doing any work.
+Commands that would talk to Docker are measured by loading the component exactly as `gtm.py` does on dispatch.
+`-X importtime` needs Python 3.7 or newer to run the benchmark, gtm itself does not.
+
+    python benchmarks/startup_benchmark.py --repeat 5 --output bench_output.json --max-ms 150
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import typing
+
+GTM_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Label -> arguments passed to the interpreter
+COMMANDS = {'--help': ['gtm.py', '--help'],
+            'labmanager log': ['-c', 'import gtm; import gtmlib.common.logreader'],
+            'labmanager': ['-c', 'import gtm; gtm.load_component("labmanager")'],
+            'developer': ['-c', 'import gtm; gtm.load_component("developer")'],
+            'base-image': ['-c', 'import gtm; gtm.load_component("base-image")'],
+            'circleci': ['-c', 'import gtm; gtm.load_component("circleci")']}
+
+
+def parse_importtime(output: str) -> typing.Dict[str, typing.Any]:
+    """Method to summarize the stderr produced by `python -X importtime`
+
+    Args:
+        output(str): Captured stderr
+
+    Returns:
+        dict
+    """
+    total_us = 0
+    num_modules = 0
+    top_level = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        total_us += int(self_us)
+        num_modules += 1
+
+        # Top level imports have exactly one space of indentation before the name
+        if not name[1:].startswith(" "):
+            top_level.append((name.strip(), int(cumulative_us)))
+
+    top_level.sort(key=lambda x: x[1], reverse=True)
+    return {"import_ms": round(total_us / 1000, 2),
+            "modules": num_modules,
+            "heaviest": [{"module": n, "cumulative_ms": round(us / 1000, 2)} for n, us in top_level[:5]]}
+
+
+def run_command(label: str, args: typing.List[str]) -> typing.Dict[str, typing.Any]:
+    """Method to run one command under -X importtime
+
+    Args:
+        label(str): Name of the command
+        args(list): Interpreter arguments
+
+    Returns:
+        dict
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([GTM_ROOT, env.get('PYTHONPATH', '')])
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=GTM_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise ValueError(f"Command `{label}` failed:\n{result.stderr}")
+
+    data = parse_importtime(result.stderr)
+    data['wall_ms'] = round(wall_ms, 2)
+    return data
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure gtm CLI startup cost per command")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs per command. The fastest run is reported")
+    parser.add_argument("--output", default=None, metavar="<file>",
+                        help="Write the results as JSON to this file")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Fail if any command spends more than this many ms importing")
+    args = parser.parse_args()
+
+    results = {}
+    for label, cmd_args in COMMANDS.items():
+        runs = [run_command(label, cmd_args) for _ in range(max(args.repeat, 1))]
+        results[label] = min(runs, key=lambda r: r['import_ms'])
+
+        heaviest = ", ".join(f"{h['module']} ({h['cumulative_ms']}ms)" for h in results[label]['heaviest'][:3])
+        print(f"{label:<16} import: {results[label]['import_ms']:>8.1f}ms  wall: {results[label]['wall_ms']:>8.1f}ms"
+              f"  modules: {results[label]['modules']:>4}  heaviest: {heaviest}")
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_ms is not None:
+        over = [label for label in results if results[label]['import_ms'] > args.max_ms]
+        if over:
+            print(f"Error: startup budget of {args.max_ms}ms exceeded by: {', '.join(over)}", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
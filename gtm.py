@@ -18,14 +18,69 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import argparse
+import importlib
+import json
 import os
 import sys
 
-from gtmlib import labmanager
-from gtmlib import developer
-from gtmlib import baseimage
-from gtmlib import circleci
-from gtmlib.common.logreader import show_log
+
+# Subpackage backing each component. Components are only imported once selected, so commands like
+# `gtm labmanager log` or `--help` do not pay for loading docker, GitPython and yaml.
+COMPONENT_MODULES = {'labmanager': 'gtmlib.labmanager',
+                     'demo': 'gtmlib.labmanager',
+                     'developer': 'gtmlib.developer',
+                     'base-image': 'gtmlib.baseimage',
+                     'circleci': 'gtmlib.circleci',
+                     'wheelhouse': 'gtmlib.wheelhouse'}
+
+
+def load_component(component):
+    """Method to import the gtmlib subpackage for a component on demand
+
+    Args:
+        component(str): Name of the component
+
+    Returns:
+        module
+    """
+    return importlib.import_module(COMPONENT_MODULES[component])
+
+
+def show_client_log(args):
+    """Method to show the client log, either following it or answering a query
+
+    Args:
+        args(Namespace): Parsed arguments
+
+    Returns:
+        None
+    """
+    if args.stats:
+        from gtmlib.common.logstats import show_log_stats
+        show_log_stats(top=args.top)
+    elif any([args.since, args.until, args.level, args.file, args.func]):
+        from gtmlib.common.logquery import show_log_query
+        show_log_query(since=args.since, until=args.until, level=args.level, filename=args.file, func=args.func)
+    else:
+        from gtmlib.common.logreader import show_log
+        show_log(lines=args.lines)
+
+
+def print_docker_stats():
+    """Method to print how many docker connections and API calls the command made
+
+    Returns:
+        None
+    """
+    # Only report if a component actually loaded the docker client, never import it just for this
+    if 'gtmlib.common.dockerclient' not in sys.modules:
+        print("\n*** Docker stats: docker client not used")
+        return
+
+    stats = sys.modules['gtmlib.common.dockerclient'].get_docker_stats()
+    print("\n*** Docker stats: {} client(s), {} version negotiation(s), {} connection(s), "
+          "{} API call(s) ({} failed)".format(stats['clients'], stats['negotiations'], stats['connections'],
+                                              stats['api_calls'], stats['api_errors']))
 
 
 def format_action_help(actions):
@@ -69,14 +124,20 @@ def labmanager_actions(args):
     Returns:
         None
     """
+    if args.action == "log":
+        # Reading the log needs neither docker nor git, so skip constructing a builder
+        show_client_log(args)
+        return
 
+    labmanager = load_component('labmanager')
     builder = labmanager.LabManagerBuilder()
     if "override_name" in args:
         if args.override_name:
             builder.image_name = args.override_name
 
     if args.action == "build":
-        builder.build_image(show_output=args.verbose, no_cache=args.no_cache)
+        builder.build_image(show_output=args.verbose, no_cache=args.no_cache,
+                            measure_import_time=args.measure_import_time)
 
         # Print Name of image
         print("\n\n*** Built LabManager Image: {}\n".format(builder.image_name))
@@ -122,8 +183,6 @@ def labmanager_actions(args):
     elif args.action == "run":
         print("Error: Unsupported action provided: `{}`. Did you mean `start`?".format(args.action), file=sys.stderr)
         sys.exit(1)
-    elif args.action == "log":
-        show_log()
     elif args.action == "start" or args.action == "stop":
         # If not a tagged version, force to latest
         if ":" not in builder.image_name:
@@ -138,6 +197,18 @@ def labmanager_actions(args):
             if not launcher.is_running:
                 launcher.launch()
                 print("*** Ran: {}".format(image_name))
+
+                if args.wait:
+                    report = launcher.wait_until_ready(timeout=args.wait_timeout)
+                    print(labmanager.format_timeline(report))
+                    if args.timings == '-':
+                        print(json.dumps(report, indent=2))
+                    elif args.timings:
+                        with open(args.timings, 'wt') as f:
+                            json.dump(report, f, indent=2)
+                    if not report['ready']:
+                        print("Error: LabManager did not become ready: {}".format(report['failure']), file=sys.stderr)
+                        sys.exit(1)
             else:
                 print("Error: Docker container by name `{}' is already started.".format(builder.image_name), file=sys.stderr)
                 sys.exit(1)
@@ -165,7 +236,7 @@ def demo_actions(args):
     Returns:
         None
     """
-
+    labmanager = load_component('demo')
     builder = labmanager.LabManagerBuilder()
     if "override_name" in args:
         if args.override_name:
@@ -204,6 +275,11 @@ def developer_actions(args):
     Returns:
         None
     """
+    if args.action == "log":
+        show_client_log(args)
+        return
+
+    developer = load_component('developer')
     if args.action == "build":
         builder = developer.LabManagerDevBuilder()
         if "override_name" in args:
@@ -216,6 +292,7 @@ def developer_actions(args):
         print("\n\n*** Built LabManager Dev Image: {}\n".format(builder.image_name))
 
     elif args.action == "prune":
+        labmanager = load_component('labmanager')
         lm_builder = labmanager.LabManagerBuilder()
         lm_builder.cleanup(dev_images=True)
     elif args.action == "setup":
@@ -230,8 +307,6 @@ def developer_actions(args):
     elif args.action == "attach":
         du = developer.DockerUtil()
         du.attach()
-    elif args.action == "log":
-        show_log()
     else:
         print("Error: Unsupported action provided: {}".format(args.action), file=sys.stderr)
         sys.exit(1)
@@ -246,21 +321,42 @@ def baseimage_actions(args):
     Returns:
         None
     """
+    baseimage = load_component('base-image')
     builder = baseimage.BaseImageBuilder()
     image_name = None
     if ("override_name" in args) and args.override_name:
         image_name = args.override_name
 
     if args.action == "build":
-        builder.build(image_name=image_name, verbose=args.verbose, no_cache=args.no_cache)
+        builder.build(image_name=image_name, verbose=args.verbose, no_cache=args.no_cache, jobs=args.jobs)
     elif args.action == "publish":
-        builder.publish(image_name=image_name, verbose=args.verbose)
+        builder.publish(image_name=image_name, verbose=args.verbose, jobs=args.jobs, registry=args.registry)
 
     else:
         print("Error: Unsupported action provided: {}".format(args.action), file=sys.stderr)
         sys.exit(1)
 
 
+def wheelhouse_actions(args):
+    """Method to provide logic and perform actions for the wheelhouse component
+
+    Args:
+        args(Namespace): Parsed arguments
+
+    Returns:
+        None
+    """
+    wheelhouse = load_component('wheelhouse')
+    builder = wheelhouse.WheelhouseBuilder()
+
+    if args.action == "build":
+        wheelhouse_dir = builder.build(verbose=args.verbose, no_cache=args.no_cache)
+        print("\n*** Wheelhouse: {}\n".format(wheelhouse_dir))
+    else:
+        print("Error: Unsupported action provided: {}".format(args.action), file=sys.stderr)
+        sys.exit(1)
+
+
 def circleci_actions(args):
     """Method to provide logic and perform actions for the circleci component
 
@@ -270,6 +366,7 @@ def circleci_actions(args):
     Returns:
         None
     """
+    circleci = load_component('circleci')
     builder = circleci.CircleCIImageBuilder()
 
     if args.action == 'build-common':
@@ -291,7 +388,7 @@ if __name__ == '__main__':
                                 ["publish", "Publish the latest build to Docker Hub"],
                                 ["publish-edge", "Publish the latest build to Docker Hub as an Edge release"],
                                 ["prune", "Remove all images except the latest LabManager build"],
-                                ["log", "Show the client log file"],
+                                ["log", "Follow or query the client log file (see --lines, --since, --stats)"],
                                 ]
 
     components['demo'] = [["build", "Build the LabManager Docker image"],
@@ -303,7 +400,7 @@ if __name__ == '__main__':
                                ["run", "Start the LabManager dev container (not applicable to PyCharm configs)"],
                                ["attach", "Attach to the running dev container"],
                                ["prune", "Remove all images except the latest labmanager-dev build"],
-                               ["log", "Show the client log file"]]
+                               ["log", "Follow or query the client log file (see --lines, --since, --stats)"]]
 
     components['base-image'] = [["build", "Build all available base images"],
                                 ["publish", "Publish all available base images to docker hub"]]
@@ -311,6 +408,8 @@ if __name__ == '__main__':
     components['circleci'] = [["build-common", "Build the CircleCI container for the `lmcommon` repo"],
                               ["build-api", "Build the CircleCI container for the `labmanager-service-labbook` repo"]]
 
+    components['wheelhouse'] = [["build", "Build wheels for the current requirements files (done by image builds)"]]
+
     # Prep the help string
     help_str = format_component_help(components)
     component_str = ", ".join(list(components.keys()))
@@ -333,6 +432,72 @@ if __name__ == '__main__':
                         default=False,
                         action='store_true',
                         help="Boolean indicating if docker cache should be ignored")
+    parser.add_argument("--measure-import-time",
+                        default=False,
+                        action='store_true',
+                        help="Measure the API's cold-start import time with and without bytecode after the build "
+                             "(`labmanager build` only)")
+    parser.add_argument("--jobs", "-j",
+                        default=1,
+                        type=int,
+                        metavar="<N>",
+                        help="Number of images to build or publish concurrently (base-image only)")
+    parser.add_argument("--registry",
+                        default=None,
+                        metavar="<host:port>",
+                        help="Push base images to this registry instead of Docker Hub, e.g. localhost:5000")
+    parser.add_argument("--lines",
+                        default=0,
+                        type=int,
+                        metavar="<N>",
+                        help="Number of existing records to show before following the log (`log` action only)")
+    parser.add_argument("--since",
+                        default=None,
+                        metavar="<time>",
+                        help="Query the log for records at or after this time, e.g. 14:02 or '2018-07-25 14:02'")
+    parser.add_argument("--until",
+                        default=None,
+                        metavar="<time>",
+                        help="Query the log for records at or before this time")
+    parser.add_argument("--level",
+                        default=None,
+                        metavar="<level>",
+                        help="Query the log for records at or above this level, e.g. WARNING")
+    parser.add_argument("--file",
+                        default=None,
+                        metavar="<filename>",
+                        help="Query the log for records logged from this source file")
+    parser.add_argument("--func",
+                        default=None,
+                        metavar="<function>",
+                        help="Query the log for records logged from this function")
+    parser.add_argument("--stats",
+                        default=False,
+                        action='store_true',
+                        help="Print level counts, top sources and error rate for the client log and its rotations")
+    parser.add_argument("--top",
+                        default=10,
+                        type=int,
+                        metavar="<N>",
+                        help="Number of sources to show with --stats")
+    parser.add_argument("--wait",
+                        default=False,
+                        action='store_true',
+                        help="Wait for every port and supervisor program to be ready and print a startup timeline "
+                             "(`labmanager start` only)")
+    parser.add_argument("--wait-timeout",
+                        default=120.0,
+                        type=float,
+                        metavar="<seconds>",
+                        help="Fail if the container isn't ready this long after starting (with --wait)")
+    parser.add_argument("--timings",
+                        default=None,
+                        metavar="<file>",
+                        help="Write the startup timings as JSON to this file, or `-` for stdout (with --wait)")
+    parser.add_argument("--docker-stats",
+                        default=False,
+                        action='store_true',
+                        help="Print the number of docker connections and API calls made by the command")
     parser.add_argument("component",
                         choices=list(components.keys()),
                         metavar="component",
@@ -341,17 +506,14 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
-    if args.component == "labmanager":
-        # LabManager Selected
-        labmanager_actions(args)
-    elif args.component == "developer":
-        # Base Image Selected
-        developer_actions(args)
-    elif args.component == "base-image":
-        # Base Image Selected
-        baseimage_actions(args)
-    elif args.component == "circleci":
-        # CircleCI Selected
-        circleci_actions(args)
-    elif args.component == "demo":
-        demo_actions(args)
+    # Dispatch to the selected component. Each handler loads its own gtmlib subpackage.
+    dispatch = {'labmanager': labmanager_actions,
+                'developer': developer_actions,
+                'base-image': baseimage_actions,
+                'circleci': circleci_actions,
+                'wheelhouse': wheelhouse_actions,
+                'demo': demo_actions}
+    dispatch[args.component](args)
+
+    if args.docker_stats:
+        print_docker_stats()
@@ -18,15 +18,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
-import json
 import glob
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from pkg_resources import resource_filename
 
 from git import Repo
-import docker
 from docker.errors import ImageNotFound, NotFound
 
+from gtmlib.common import get_docker_client
+from gtmlib.common.buildmanifest import BuildManifest, hash_build_context, resolve_parent_digests
+from gtmlib.common.buildstate import BuildStateStore
+from gtmlib.common.buildstream import run_build
+from gtmlib.common.dockerfile import get_parent_images, split_image_reference
+from gtmlib.common.pushprogress import PushProgress
+
 
 class BaseImageBuilder(object):
     """Class to manage building base images
@@ -35,7 +44,13 @@ class BaseImageBuilder(object):
         """
 
         """
+        # The JSON tracking file used before the state store is imported the first time the store is opened
         self.tracking_file = os.path.join(self._get_gtm_dir(), ".image-build-status.json")
+        self.state = BuildStateStore(os.path.join(self._get_gtm_dir(), ".image-build-status.db"),
+                                     legacy_json=self.tracking_file)
+        self._lock = threading.Lock()
+        self.manifest = BuildManifest()
+        self._unchanged_tags = set()  # type: typing.Set[str]
 
     def _get_gtm_dir(self) -> str:
         """Method to get the root gtm directory
@@ -64,110 +79,242 @@ class BaseImageBuilder(object):
         """
         return "{}-{}".format(self._get_current_commit_hash()[:8], str(datetime.utcnow().date()))
 
-    def _update_tracking_file(self, image_tag: str, built: bool, published: bool) -> None:
-        """Method to update the status of an image in the tracking file
+    def _get_image_details(self, image_tag: str) -> typing.Tuple[typing.Optional[int], typing.Optional[str]]:
+        """Method to get the size and id of a local image
 
         Args:
-            built(bool): Flag indicating if the image has been built
-            published(bool): Flag indiciating if the image has been published
             image_tag(str): Name of the built image
 
         Returns:
-            None
+            tuple: size in bytes, image id
         """
-        if os.path.isfile(self.tracking_file):
-            with open(self.tracking_file, "rt") as f:
-                data = json.load(f)
-
-        else:
-            # No tracking file exists
-            data = {}
+        try:
+            image = get_docker_client().images.get(image_tag)
+        except (ImageNotFound, NotFound):
+            return None, None
+        return image.attrs.get('Size'), image.id
 
-        # Update the dictionary setting publish to False
-        data[image_tag] = {"isBuilt": built, "isPublished": published}
+    @staticmethod
+    def _get_dependencies(build_dirs: typing.List[str]) -> typing.Dict[str, typing.Set[str]]:
+        """Method to find which of the given base images are built FROM one another
 
-        with open(self.tracking_file, "wt") as f:
-            json.dump(data, f)
+        Args:
+            build_dirs(list): Base image build directories
 
-    def _build_image(self, build_dir: str, verbose=False, no_cache=False) -> str:
+        Returns:
+            dict: build dir -> set of build dirs it depends on
         """
+        dirs_by_tag = {"gigantum/{}".format(os.path.basename(os.path.normpath(d))): d for d in build_dirs}
+
+        dependencies = {}
+        for build_dir in build_dirs:
+            dependencies[build_dir] = set()
+            dockerfile = os.path.join(build_dir, "Dockerfile")
+            if not os.path.isfile(dockerfile):
+                continue
+            for parent in get_parent_images(dockerfile):
+                repository, _ = split_image_reference(parent)
+                if repository in dirs_by_tag and dirs_by_tag[repository] != build_dir:
+                    dependencies[build_dir].add(dirs_by_tag[repository])
+
+        # Fail early on cycles instead of deadlocking the scheduler
+        remaining = {k: set(v) for k, v in dependencies.items()}
+        while remaining:
+            ready = [k for k, v in remaining.items() if not v]
+            if not ready:
+                raise ValueError("Circular FROM dependency between base images: {}".format(
+                    ", ".join(sorted(os.path.basename(os.path.normpath(x)) for x in remaining))))
+            for k in ready:
+                del remaining[k]
+            for v in remaining.values():
+                v.difference_update(ready)
+
+        return dependencies
+
+    def _build_image(self, build_dir: str, verbose=False, no_cache=False, pull=None, prefix="") -> str:
+        """Method to build a base image, unless the build manifest shows its context is unchanged
+
+        The context hash covers the Dockerfile, the files it copies and the digest of its parent image. If it matches
+        the last successful build, that image is reused (and retagged if the tag suffix has changed since).
 
         Args:
-            build_dir:
+            build_dir: Directory containing the Dockerfile
+            pull: Flag indicating if the parent image should be pulled. If None, only "minimal" images pull
+            prefix: String prepended to each line of verbose output
 
         Returns:
-
+            str: the image tag
         """
-        client = docker.from_env()
+        client = get_docker_client()
 
         # Generate tags for both the named and latest versions
         base_tag = "gigantum/{}".format(os.path.basename(os.path.normpath(build_dir)))
         named_tag = "{}:{}".format(base_tag, self._generate_image_tag_suffix())
 
         # If a "minimal" image that could be the source for other images, you should pull, otherwise, you shouldn't
-        if "minimal" in base_tag:
-            pull = True
-        else:
-            pull = False
-
-        if verbose:
-            [print(ln[list(ln.keys())[0]], end='') for ln in client.api.build(path=build_dir,
-                                                                              tag=named_tag,
-                                                                              nocache=no_cache,
-                                                                              pull=pull, rm=True,
-                                                                              decode=True)]
-        else:
-            client.images.build(path=build_dir, tag=named_tag, pull=pull, nocache=no_cache)
+        if pull is None:
+            pull = "minimal" in base_tag
+
+        context_hash = None
+        if not no_cache:
+            dockerfile = os.path.join(build_dir, "Dockerfile")
+            parent_digests = resolve_parent_digests(client, dockerfile, pull)
+            if parent_digests is not None:
+                context_hash = hash_build_context(dockerfile, build_dir, parent_digests)
+                reused = self.manifest.reuse(client, base_tag, context_hash, named_tag)
+                if reused == "unchanged":
+                    print("{}Build context unchanged, reusing {}".format(prefix, named_tag))
+                    with self._lock:
+                        self._unchanged_tags.add(named_tag)
+                    return named_tag
+                elif reused == "retagged":
+                    print("{}Build context unchanged, retagged last build as {}".format(prefix, named_tag))
+                    return named_tag
+
+        run_build(client, verbose=verbose, prefix=prefix, path=build_dir, tag=named_tag, nocache=no_cache,
+                  pull=pull, rm=True)
 
         # Tag with latest in case images depend on each other. Will not get published.
         client.images.get(named_tag).tag(f"{base_tag}:latest")
 
         # Verify the desired image built successfully
         try:
-            client.images.get(named_tag)
+            image = client.images.get(named_tag)
         except NotFound:
             raise ValueError("Image Build Failed!")
 
+        if context_hash:
+            self.manifest.record(base_tag, context_hash, named_tag, image.id)
+
         return named_tag
 
-    def _publish_image(self, image_tag: str, verbose=False) -> None:
+    def _publish_image(self, image_tag: str, verbose=False, progress: PushProgress = None,
+                       registry: str = None) -> typing.Optional[str]:
         """Private method to push images to the logged in server (e.g hub.docker.com)
 
         Args:
             image_tag(str): full image tag to publish
+            verbose(bool): flag indicating if the raw push output should be printed
+            progress(PushProgress): optional aggregated progress to update
+            registry(str): optional registry host (e.g. localhost:5000) to push to instead of Docker Hub
 
         Returns:
-            None
+            str: the pushed manifest digest, if the registry reported one
         """
-        client = docker.from_env()
+        client = get_docker_client()
 
         # Split out the image and the tag
         image, tag = image_tag.split(":")
 
-        if verbose:
-            [print(ln[list(ln.keys())[0]], end='') for ln in client.api.push(image, tag=tag,
-                                                                             stream=True, decode=True)]
-        else:
-            client.images.push(image, tag=tag)
+        if registry:
+            client.api.tag(image_tag, "{}/{}".format(registry, image), tag)
+            image = "{}/{}".format(registry, image)
+
+        for ln in client.api.push(image, tag=tag, stream=True, decode=True):
+            if 'error' in ln:
+                raise ValueError(ln.get('errorDetail', {}).get('message') or ln['error'])
+            if progress:
+                progress.update(image_tag, ln)
+            if verbose and 'status' in ln:
+                layer = "{}: ".format(ln['id']) if 'id' in ln else ""
+                print("[{}] {}{}".format(image_tag, layer, ln['status']))
+
+        return progress.digests.get(image_tag) if progress else None
 
-    def build(self, image_name: str = None, verbose=False, no_cache=False) -> None:
+    @staticmethod
+    def _run_in_dependency_order(dependencies: typing.Dict[str, typing.Set[str]], jobs: int,
+                                 work: typing.Callable[[str], typing.Any],
+                                 on_start: typing.Callable[[str], None],
+                                 on_success: typing.Callable[[str, typing.Any], None],
+                                 label: typing.Callable[[str], str]) -> typing.Dict[str, Exception]:
+        """Method to run `work` on every item of a dependency graph using a pool of `jobs` threads
+
+        An item is started as soon as all of its dependencies have succeeded. If an item fails, everything that
+        depends on it (directly or not) is skipped and reported as failed.
+
+        Args:
+            dependencies(dict): item -> set of items it depends on
+            jobs(int): maximum number of items in flight
+            work(callable): function run on a worker for each item
+            on_start(callable): called on the main thread before an item is submitted
+            on_success(callable): called on the main thread with the item and the result of `work`
+            label(callable): returns a display name for an item
+
+        Returns:
+            dict: failed item -> exception
+        """
+        dependents = {d: [x for x in dependencies if d in dependencies[x]] for d in dependencies}
+        remaining = {d: set(deps) for d, deps in dependencies.items()}
+        failed = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = {}
+
+            def submit_ready():
+                for item in sorted([d for d, deps in remaining.items() if not deps]):
+                    del remaining[item]
+                    on_start(item)
+                    futures[pool.submit(work, item)] = item
+
+            submit_ready()
+            while futures:
+                done, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed[item] = e
+                        print(" - Failed: {}: {}".format(label(item), e))
+
+                        # Nothing depending on a failed item can run
+                        blocked = list(dependents[item])
+                        while blocked:
+                            child = blocked.pop()
+                            if child in remaining:
+                                del remaining[child]
+                                failed[child] = ValueError("{} failed".format(label(item)))
+                                blocked.extend(dependents[child])
+                        continue
+
+                    on_success(item, result)
+                    for child in dependents[item]:
+                        if child in remaining:
+                            remaining[child].discard(item)
+                submit_ready()
+
+        return failed
+
+    def _find_build_dirs(self) -> typing.List[str]:
+        """Method to find all base image build directories in the base-images submodule
+
+        Returns:
+            list
+        """
+        docker_file_dir = os.path.join(resource_filename('gtmlib', 'resources'), 'submodules', 'base-images')
+        build_dirs = glob.glob(os.path.join(docker_file_dir, "*"))
+        return sorted([x for x in build_dirs if os.path.isdir(x) is True])
+
+    def build(self, image_name: str = None, verbose=False, no_cache=False, jobs: int = 1) -> None:
         """Method to build all, or a single image based on the dockerfiles stored within the base-image submodule
 
+        Images are built in dependency order (from the FROM lines of each Dockerfile). Independent images are built
+        concurrently on up to `jobs` workers, and each image starts as soon as the base images it builds FROM are done.
+
         Args:
             image_name(str): Name of a base image to build. If omitted all are built
             verbose(bool): flag indication if output should print to the console
             no_cache(bool): flag indicating if the docker cache should be ignored
+            jobs(int): maximum number of images to build at once
 
         Returns:
             None
         """
+        all_build_dirs = self._find_build_dirs()
+
         build_dirs = []
         if not image_name:
-            # Find all images to build in the base_image submodule ref
-            docker_file_dir = os.path.join(resource_filename('gtmlib', 'resources'), 'submodules', 'base-images')
-            build_dirs = glob.glob(os.path.join(docker_file_dir,
-                                                "*"))
-            build_dirs = [x for x in build_dirs if os.path.isdir(x) is True]
+            build_dirs = all_build_dirs
 
         else:
             possible_build_dir = os.path.join(resource_filename('gtmlib', 'resources'), 'submodules',
@@ -180,41 +327,70 @@ class BaseImageBuilder(object):
         if not build_dirs:
             raise ValueError("No images to build")
 
-        # Make sure minimals are always built first
-        for cnt, base in enumerate(build_dirs):
-            if "minimal" in base:
-                build_dirs.insert(0, build_dirs.pop(cnt))
+        # Parents outside this build (e.g. when building a single image) are used from their existing :latest tag
+        all_dependencies = self._get_dependencies(all_build_dirs)
+        dependencies = {d: all_dependencies.get(d, set()) & set(build_dirs) for d in build_dirs}
+        jobs = max(1, jobs)
+
+        def image_label(build_dir):
+            return os.path.basename(os.path.normpath(build_dir))
+
+        def build_one(build_dir):
+            # Images with no parent in this build start from an upstream image, so pull it. Otherwise the parent
+            # was just tagged :latest locally and must not be replaced by a pull.
+            pull = len(all_dependencies.get(build_dir, set())) == 0
+            prefix = "[{}] ".format(image_label(build_dir)) if jobs > 1 else ""
+            start_time = time.time()
+            image_tag = self._build_image(build_dir, verbose=verbose, no_cache=no_cache, pull=pull, prefix=prefix)
+            return image_tag, time.time() - start_time
+
+        started = 0
 
-        for cnt, build_dir in enumerate(build_dirs):
-            print("({}/{}) Building Base Image: {}".format(cnt+1, len(build_dirs),
-                                                           os.path.basename(os.path.normpath(build_dir))))
-            # Build each image
-            image_tag = self._build_image(build_dir, verbose=verbose, no_cache=no_cache)
+        def on_start(build_dir):
+            nonlocal started
+            started += 1
+            print("({}/{}) Building Base Image: {}".format(started, len(dependencies), image_label(build_dir)))
 
-            # Update tracking file
-            self._update_tracking_file(image_tag, built=True, published=False)
+        def on_success(build_dir, result):
+            image_tag, build_seconds = result
 
-            print(" - Complete")
+            # Update build state, keeping the publish status of an image that was reused as is
+            if image_tag not in self._unchanged_tags or not self.state.get(image_tag):
+                size, image_id = self._get_image_details(image_tag)
+                self.state.mark_built(image_tag, build_seconds=build_seconds, size=size, image_id=image_id)
+
+            print(" - Complete: {}".format(image_label(build_dir)))
             print(" - Tag: {}".format(image_tag))
 
-    def publish(self, image_name: str = None, verbose=False) -> None:
+        failed = self._run_in_dependency_order(dependencies, jobs, build_one, on_start, on_success, image_label)
+
+        if failed:
+            raise ValueError("Failed to build base images: {}".format(", ".join(sorted(image_label(x)
+                                                                                        for x in failed))))
+
+    def publish(self, image_name: str = None, verbose=False, jobs: int = 1, retries: int = 3,
+                registry: str = None) -> None:
         """Method to publish images and update the Environment Repository
 
+        Up to `jobs` images are pushed at once. An image built FROM another image being published waits for its parent,
+        so the layers they share are uploaded once and found in the registry by the child. Each image is retried up to
+        `retries` times and marked published in the build state as soon as it finishes.
+
         Args:
             image_name(str): Name of a base image to build. If omitted all are built
+            verbose(bool): flag indicating if the raw push output should be printed
+            jobs(int): maximum number of pushes in flight
+            retries(int): number of times to retry a failed push
+            registry(str): optional registry host (e.g. localhost:5000) to push to instead of Docker Hub
 
         Returns:
             None
         """
-        # Open tracking file
-        if os.path.isfile(self.tracking_file):
-            with open(self.tracking_file, "rt") as f:
-                tracking_data = json.load(f)
-        else:
+        if not self.state.list_images():
             raise ValueError("You must first build images locally before publishing")
 
         # Prune out all but unpublished images
-        tags_to_push = [x for x in list(tracking_data.keys()) if tracking_data[x]['isPublished'] is False]
+        tags_to_push = [x['tag'] for x in self.state.list_images(published=False)]
 
         if image_name:
             # Prune out all but the image to publish
@@ -223,17 +399,60 @@ class BaseImageBuilder(object):
             else:
                 raise ValueError("Image `{}` not found.".format(image_name))
 
-        num_images = len(tags_to_push)
-        for cnt, image_tag in enumerate(tags_to_push):
-            print("({}/{}) Publishing Base Image: {}".format(cnt+1, num_images, image_tag))
-
-            # Publish each image
-            self._publish_image(image_tag, verbose)
-
+        if not tags_to_push:
+            print("No unpublished images")
+            return
+
+        # Order pushes by the FROM relationships between base images
+        dir_dependencies = self._get_dependencies(self._find_build_dirs())
+        tags_by_dir = {}
+        for image_tag in tags_to_push:
+            repository = image_tag.split(":")[0]
+            for build_dir in dir_dependencies:
+                if "gigantum/{}".format(os.path.basename(os.path.normpath(build_dir))) == repository:
+                    tags_by_dir.setdefault(build_dir, []).append(image_tag)
+
+        dependencies = {}
+        for image_tag in tags_to_push:
+            dependencies[image_tag] = set()
+            for build_dir, tags in tags_by_dir.items():
+                if image_tag in tags:
+                    for parent_dir in dir_dependencies[build_dir]:
+                        dependencies[image_tag].update(tags_by_dir.get(parent_dir, []))
+
+        progress = PushProgress(len(tags_to_push))
+        started = 0
+
+        def push_one(image_tag):
+            progress.start(image_tag)
+            try:
+                for attempt in range(retries + 1):
+                    try:
+                        return self._publish_image(image_tag, verbose=verbose, progress=progress, registry=registry)
+                    except Exception as e:
+                        if attempt == retries:
+                            raise
+                        delay = 2 ** (attempt + 1)
+                        print(" - Push of {} failed ({}), retrying in {}s".format(image_tag, e, delay))
+                        time.sleep(delay)
+            finally:
+                progress.finish(image_tag)
+
+        def on_start(image_tag):
+            nonlocal started
+            started += 1
+            print("({}/{}) Publishing Base Image: {}".format(started, len(tags_to_push), image_tag))
+
+        def on_success(image_tag, digest):
             # TODO Update YAML def
 
-            # Update tracking file
-            self._update_tracking_file(image_tag, built=True, published=True)
+            # Update build state
+            self.state.mark_published(image_tag, digest=digest)
 
-            print(" - Complete")
-            print(" - Tag: {}".format(image_tag))
+            print(" - Complete: {}".format(image_tag))
+            if digest:
+                print(" - Digest: {}".format(digest))
+
+        failed = self._run_in_dependency_order(dependencies, jobs, push_one, on_start, on_success, lambda x: x)
+        if failed:
+            raise ValueError("Failed to publish base images: {}".format(", ".join(sorted(failed))))
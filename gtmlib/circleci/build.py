@@ -24,9 +24,14 @@ from datetime import datetime
 from pkg_resources import resource_filename
 
 from git import Repo
-import docker
 from docker.errors import ImageNotFound, NotFound
 
+from gtmlib.common import get_docker_client
+from gtmlib.common.buildcontext import get_build_context
+from gtmlib.common.buildmanifest import BuildManifest, hash_build_context, resolve_parent_digests
+from gtmlib.common.buildstream import run_build
+from gtmlib.wheelhouse import WheelhouseBuilder
+
 
 class CircleCIImageBuilder(object):
     """Class to manage building base images
@@ -36,6 +41,7 @@ class CircleCIImageBuilder(object):
 
         """
         self.tracking_file = os.path.join(self._get_gtm_dir(), ".image-build-status.json")
+        self.manifest = BuildManifest()
 
     def _get_gtm_dir(self) -> str:
         """Method to get the root gtm directory
@@ -65,16 +71,16 @@ class CircleCIImageBuilder(object):
         return "{}-{}".format(self._get_current_commit_hash()[:8], str(datetime.utcnow().date()))
 
     def _build_image(self, docker_file: str, docker_repo_name: str, verbose=False, no_cache=False) -> str:
-        """
+        """Method to build a CircleCI image, unless the build manifest shows its context is unchanged
 
         Args:
             docker_file(str): name of the dockerfile to build
             docker_repo_name(str): name of the dockerhub repo to push to
 
         Returns:
-
+            str: the image tag
         """
-        client = docker.from_env()
+        client = get_docker_client()
 
         # Generate tags for both the named and latest versions
         docker_build_dir = os.path.expanduser(resource_filename("gtmlib", "resources"))
@@ -88,26 +94,36 @@ class CircleCIImageBuilder(object):
         else:
             pull = False
 
-        if verbose:
-            [print(ln[list(ln.keys())[0]], end='') for ln in client.api.build(path=docker_build_dir,
-                                                                              dockerfile=docker_file,
-                                                                              tag=named_tag,
-                                                                              nocache=no_cache,
-                                                                              pull=pull, rm=True,
-                                                                              decode=True)]
-        else:
-            client.images.build(path=docker_build_dir,  dockerfile=docker_file, tag=named_tag,
-                                pull=True, nocache=no_cache)
+        # Python dependencies are installed offline from the wheelhouse
+        wheelhouse = WheelhouseBuilder()
+
+        context_hash = None
+        if not no_cache:
+            dockerfile = os.path.join(docker_build_dir, docker_file)
+            parent_digests = resolve_parent_digests(client, dockerfile, pull)
+            if parent_digests is not None:
+                context_hash = hash_build_context(dockerfile, docker_build_dir, parent_digests,
+                                                  build_args={'wheelhouse': wheelhouse.get_key()})
+                if self.manifest.reuse(client, base_tag, context_hash, named_tag):
+                    print(f"Build context unchanged, reusing last build as {named_tag}")
+                    return named_tag
+
+        wheelhouse_dir = wheelhouse.build(verbose=verbose)
+        build_context = get_build_context(docker_build_dir, docker_file, extra_dirs={'wheelhouse': wheelhouse_dir})
+        run_build(client, verbose=verbose, **build_context, tag=named_tag, nocache=no_cache, pull=pull, rm=True)
 
         # Tag with latest in case images depend on each other. Will not get published.
         client.images.get(named_tag).tag(f"{base_tag}:latest")
 
         # Verify the desired image built successfully
         try:
-            client.images.get(named_tag)
+            image = client.images.get(named_tag)
         except NotFound:
             raise ValueError("Image Build Failed!")
 
+        if context_hash:
+            self.manifest.record(base_tag, context_hash, named_tag, image.id)
+
         return named_tag
 
     def _publish_image(self, image_tag: str, verbose=False) -> None:
@@ -119,7 +135,7 @@ class CircleCIImageBuilder(object):
         Returns:
             None
         """
-        client = docker.from_env()
+        client = get_docker_client()
 
         # Split out the image and the tag
         image, tag = image_tag.split(":")
@@ -0,0 +1,181 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import stat
+import tarfile
+import typing
+
+from docker.utils.build import PatternMatcher
+
+from gtmlib.common.buildmanifest import get_copy_sources
+
+# Never worth sending to the daemon, whatever .dockerignore says
+DEFAULT_EXCLUDES = ['**/*.pyc', '**/__pycache__', '**/.git', '**/.DS_Store']
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def load_dockerignore(context_dir: str) -> typing.List[str]:
+    """Method to read the exclude patterns from a context's .dockerignore
+
+    Args:
+        context_dir(str): Build context directory
+
+    Returns:
+        list
+    """
+    path = os.path.join(context_dir, '.dockerignore')
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'rt') as f:
+        return [ln.strip() for ln in f.read().splitlines() if ln.strip() and not ln.strip().startswith('#')]
+
+
+class BuildContext(object):
+    """Class to send only the files a Dockerfile uses as its build context
+
+    The file set is the Dockerfile plus every local COPY/ADD source, less anything excluded by .dockerignore (or the
+    default excludes). The tar archive is generated while it is uploaded, so it is never written to disk or held in
+    memory. Directories from outside the context (e.g. the wheelhouse cache) can be added under a path in the archive.
+    """
+    def __init__(self, context_dir: str, dockerfile: str,
+                 extra_dirs: typing.Optional[typing.Dict[str, str]] = None) -> None:
+        """Constructor
+
+        Args:
+            context_dir(str): Build context directory
+            dockerfile(str): Dockerfile name, relative to the context directory
+            extra_dirs(dict): Path in the archive -> directory to include there in full
+        """
+        self.context_dir = os.path.abspath(context_dir)
+        self.dockerfile = dockerfile
+        self.paths = {}  # type: typing.Dict[str, str]
+        self.files = self._find_files()
+
+        for prefix, directory in sorted((extra_dirs or {}).items()):
+            for root, dirs, names in os.walk(directory):
+                dirs.sort()
+                for name in sorted(names):
+                    full_path = os.path.join(root, name)
+                    rel_path = os.path.join(prefix, os.path.relpath(full_path, directory))
+                    if rel_path not in self.paths:
+                        self.files.append(rel_path)
+                    self.paths[rel_path] = full_path
+
+    def _is_excluded(self, rel_path: str, matcher: PatternMatcher) -> bool:
+        parts = rel_path.split(os.path.sep)
+        return any(matcher.matches('/'.join(parts[:i])) for i in range(1, len(parts) + 1))
+
+    def _find_files(self) -> typing.List[str]:
+        """Method to compute the minimal set of files the build needs
+
+        Returns:
+            list: paths relative to the context directory
+        """
+        matcher = PatternMatcher(DEFAULT_EXCLUDES + load_dockerignore(self.context_dir))
+        sources = get_copy_sources(os.path.join(self.context_dir, self.dockerfile), self.context_dir)
+        files = [x for x in sources if os.path.lexists(os.path.join(self.context_dir, x))
+                 and not self._is_excluded(x, matcher)]
+        files = [self.dockerfile] + [x for x in files if x != self.dockerfile]
+        self.paths = {x: os.path.join(self.context_dir, x) for x in files}
+        return files
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes of the files in the context"""
+        return sum([os.lstat(self.paths[x]).st_size for x in self.files])
+
+    def summary(self) -> str:
+        """Method to describe the context for the build output
+
+        Returns:
+            str
+        """
+        return "Build context: {} files, {:.1f} MB".format(len(self.files), self.size / 1e6)
+
+    def _get_tarinfo(self, rel_path: str) -> tarfile.TarInfo:
+        """Method to create a tar header for a file
+
+        Owner and group are not recorded, so the archive only depends on paths, modes, times and contents.
+        """
+        full_path = self.paths[rel_path]
+        st = os.lstat(full_path)
+        info = tarfile.TarInfo(rel_path.replace(os.path.sep, '/'))
+        info.mode = stat.S_IMODE(st.st_mode)
+        info.mtime = int(st.st_mtime)
+        if stat.S_ISLNK(st.st_mode):
+            info.type = tarfile.SYMTYPE
+            info.linkname = os.readlink(full_path)
+        else:
+            info.size = st.st_size
+        return info
+
+    def _iter_member(self, rel_path: str, chunk_size: int) -> typing.Iterator[bytes]:
+        """Method to generate the tar member (header, data and padding) for one file"""
+        info = self._get_tarinfo(rel_path)
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        if info.type != tarfile.REGTYPE:
+            return
+
+        remaining = info.size
+        with open(self.paths[rel_path], 'rb') as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise ValueError("{} changed while sending the build context".format(rel_path))
+                remaining -= len(chunk)
+                yield chunk
+        if info.size % BLOCK_SIZE:
+            yield b'\0' * (BLOCK_SIZE - info.size % BLOCK_SIZE)
+
+    def stream(self, chunk_size: int = 1 << 20) -> typing.Iterator[bytes]:
+        """Method to generate the tar archive of the context
+
+        Args:
+            chunk_size(int): Maximum bytes of file data per chunk
+
+        Returns:
+            generator of bytes
+        """
+        for rel_path in self.files:
+            for chunk in self._iter_member(rel_path, chunk_size):
+                yield chunk
+
+        # End of archive marker
+        yield b'\0' * (2 * BLOCK_SIZE)
+
+
+def get_build_context(context_dir: str, dockerfile: str,
+                      extra_dirs: typing.Optional[typing.Dict[str, str]] = None) -> typing.Dict[str, typing.Any]:
+    """Method to get the arguments for `APIClient.build` / `images.build` that send a pruned, streamed context
+
+    The context size is printed.
+
+    Args:
+        context_dir(str): Build context directory
+        dockerfile(str): Dockerfile name, relative to the context directory
+        extra_dirs(dict): Path in the archive -> directory to include there in full
+
+    Returns:
+        dict: fileobj, custom_context and dockerfile keyword arguments
+    """
+    context = BuildContext(context_dir, dockerfile, extra_dirs=extra_dirs)
+    print(context.summary())
+    return {'fileobj': context.stream(), 'custom_context': True, 'dockerfile': dockerfile}
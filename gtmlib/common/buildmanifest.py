@@ -0,0 +1,246 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import glob
+import hashlib
+import json
+import os
+import threading
+import typing
+
+from docker.errors import APIError, ImageNotFound
+
+from gtmlib.common.cache import get_cache_dir, write_atomic
+from gtmlib.common.dockerfile import get_parent_images, parse_dockerfile
+from gtmlib.common.fileindex import FileIndex
+
+
+def get_copy_sources(dockerfile: str, context_dir: str) -> typing.List[str]:
+    """Method to find the files in a build context that a Dockerfile COPYs or ADDs
+
+    Sources copied from another stage or image (--from) and remote ADD URLs are not part of the context and are skipped.
+
+    Args:
+        dockerfile(str): Path to the Dockerfile
+        context_dir(str): Build context directory
+
+    Returns:
+        list: Sorted file paths relative to the context directory
+    """
+    context_dir = os.path.abspath(context_dir)
+    files = set()
+    for instruction, arguments in parse_dockerfile(dockerfile):
+        if instruction not in ('COPY', 'ADD'):
+            continue
+
+        if arguments.lstrip().startswith('['):
+            tokens = json.loads(arguments)
+        else:
+            tokens = arguments.split()
+        if any(t.startswith('--from') for t in tokens):
+            continue
+        tokens = [t for t in tokens if not t.startswith('--')]
+
+        # The last token is the destination
+        for source in tokens[:-1]:
+            if '://' in source:
+                continue
+            for match in glob.glob(os.path.join(context_dir, source)) or [os.path.join(context_dir, source)]:
+                if os.path.isdir(match):
+                    for root, dirs, names in os.walk(match):
+                        dirs.sort()
+                        for name in names:
+                            files.add(os.path.relpath(os.path.join(root, name), context_dir))
+                else:
+                    files.add(os.path.relpath(match, context_dir))
+
+    return sorted(files)
+
+
+def hash_build_context(dockerfile: str, context_dir: str, parent_digests: typing.Dict[str, str],
+                       build_args: typing.Optional[typing.Dict[str, str]] = None,
+                       index: typing.Optional[FileIndex] = None) -> str:
+    """Method to compute a hash of everything that determines the result of a build
+
+    The hash covers the Dockerfile, the path, mode and content of every file it copies, the digests of the parent
+    images and any build arguments. File contents are hashed through a FileIndex, so only files that changed since
+    the last build are read.
+
+    Args:
+        dockerfile(str): Path to the Dockerfile
+        context_dir(str): Build context directory
+        parent_digests(dict): Parent image reference -> resolved image digest
+        build_args(dict): Build arguments passed to the daemon
+        index(FileIndex): Index of the context directory, one is loaded if omitted
+
+    Returns:
+        str: hex digest
+    """
+    h = hashlib.sha256()
+    with open(dockerfile, 'rb') as f:
+        h.update(b'dockerfile\0' + f.read() + b'\0')
+
+    for parent in sorted(parent_digests):
+        h.update('parent\0{}\0{}\0'.format(parent, parent_digests[parent]).encode())
+
+    for key in sorted(build_args or {}):
+        h.update('arg\0{}\0{}\0'.format(key, build_args[key]).encode())
+
+    if index is None:
+        index = FileIndex(context_dir)
+    sources = get_copy_sources(dockerfile, context_dir)
+    file_hashes = index.hash_files(sources)
+    for rel_path in sources:
+        if rel_path not in file_hashes:
+            # A missing source fails the build, never match it
+            h.update('missing\0{}\0'.format(rel_path).encode())
+            continue
+        h.update('file\0{}\0{}\0{}\0'.format(rel_path, int(index.is_executable(rel_path)),
+                                             file_hashes[rel_path]).encode())
+
+    return h.hexdigest()
+
+
+def resolve_parent_digests(client, dockerfile: str, pull: bool) -> typing.Optional[typing.Dict[str, str]]:
+    """Method to resolve the parent images of a Dockerfile to digests
+
+    When the build will pull, the parent is resolved against the registry, so an updated upstream image changes the
+    hash. Otherwise the local image id is used.
+
+    Args:
+        client(DockerClient): Docker client
+        dockerfile(str): Path to the Dockerfile
+        pull(bool): Flag indicating if the build pulls its parents
+
+    Returns:
+        dict: Parent image reference -> digest, or None if a parent could not be resolved
+    """
+    digests = {}
+    for parent in get_parent_images(dockerfile):
+        try:
+            if pull:
+                digests[parent] = _get_registry_digest(client, parent)
+            else:
+                digests[parent] = client.images.get(parent).id
+        except (APIError, ImageNotFound):
+            return None
+        if digests[parent] is None:
+            return None
+    return digests
+
+
+def _get_registry_digest(client, image: str) -> typing.Optional[str]:
+    """Method to get the manifest digest of an image in its registry
+
+    images.get_registry_data() isn't available in every supported docker-py release, so this falls back to the low
+    level distribution inspect and finally gives up (returns None).
+    """
+    try:
+        return client.images.get_registry_data(image).id
+    except AttributeError:
+        pass
+    try:
+        return client.api.inspect_distribution(image)['Descriptor']['digest']
+    except (AttributeError, KeyError):
+        return None
+
+
+class BuildManifest(object):
+    """Class to remember the context hash of the last successful build of each image repository
+
+    The manifest is a JSON file in the gtm cache directory, keyed by repository (e.g. gigantum/python3-minimal).
+    """
+    def __init__(self, manifest_file: str = None) -> None:
+        """Constructor
+
+        Args:
+            manifest_file(str): Path to the manifest, defaults to .gtm-cache/build-manifest.json
+        """
+        self.manifest_file = manifest_file or os.path.join(get_cache_dir(), 'build-manifest.json')
+        self._lock = threading.Lock()
+
+    def _load(self) -> typing.Dict[str, typing.Dict[str, str]]:
+        try:
+            with open(self.manifest_file, 'rt') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, repository: str) -> typing.Optional[typing.Dict[str, str]]:
+        """Method to get the last successful build of a repository
+
+        Args:
+            repository(str): Image repository
+
+        Returns:
+            dict: with `hash`, `tag` and `image_id`, or None
+        """
+        with self._lock:
+            return self._load().get(repository)
+
+    def record(self, repository: str, context_hash: str, tag: str, image_id: str) -> None:
+        """Method to record a successful build
+
+        Args:
+            repository(str): Image repository
+            context_hash(str): Hash from hash_build_context()
+            tag(str): Full tag the image was built as
+            image_id(str): Docker image id
+
+        Returns:
+            None
+        """
+        with self._lock:
+            data = self._load()
+            data[repository] = {"hash": context_hash, "tag": tag, "image_id": image_id}
+            write_atomic(self.manifest_file, json.dumps(data, indent=2, sort_keys=True).encode())
+
+    def reuse(self, client, repository: str, context_hash: str, tag: str) -> typing.Optional[str]:
+        """Method to reuse the last build of a repository if its context hash matches
+
+        If the matching image was built under a different tag (e.g. on an earlier day) it is retagged, so no build is
+        needed either way. The :latest tag is updated as a normal build would.
+
+        Args:
+            client(DockerClient): Docker client
+            repository(str): Image repository
+            context_hash(str): Hash from hash_build_context()
+            tag(str): Full tag the build would produce
+
+        Returns:
+            str: "unchanged" or "retagged" if the image was reused, None if it must be built
+        """
+        entry = self.get(repository)
+        if not entry or entry.get('hash') != context_hash:
+            return None
+
+        try:
+            image = client.images.get(entry['image_id'])
+        except (APIError, ImageNotFound):
+            return None
+
+        image.tag("{}:latest".format(repository))
+        if entry['tag'] == tag:
+            return "unchanged"
+
+        name, version = tag.rsplit(':', 1)
+        image.tag(name, version)
+        self.record(repository, context_hash, tag, image.id)
+        return "retagged"
@@ -0,0 +1,168 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import sqlite3
+import time
+import typing
+from contextlib import contextmanager
+
+
+class BuildStateStore(object):
+    """Class to track the build and publish status of images in a SQLite database
+
+    Every update is a single transaction, so concurrent builds and publishes (threads or processes) can't lose or
+    corrupt each other's updates. A legacy JSON tracking file is imported the first time the database is opened.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS images (
+            tag TEXT PRIMARY KEY,
+            is_built INTEGER NOT NULL DEFAULT 0,
+            is_published INTEGER NOT NULL DEFAULT 0,
+            build_seconds REAL,
+            size INTEGER,
+            image_id TEXT,
+            digest TEXT,
+            built_at REAL,
+            published_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_file: str, legacy_json: str = None, timeout: float = 30.0) -> None:
+        """Constructor
+
+        Args:
+            db_file(str): Path to the SQLite database
+            legacy_json(str): Path to a JSON tracking file to import once
+            timeout(float): Seconds to wait for another writer to release the database
+        """
+        self.db_file = db_file
+        self.legacy_json = legacy_json
+        self.timeout = timeout
+        self._initialized = False
+
+    @contextmanager
+    def _transaction(self) -> typing.Iterator[sqlite3.Connection]:
+        """Method to open a connection and run a write transaction
+
+        BEGIN IMMEDIATE takes the database write lock up front, so a read-modify-write never interleaves with another
+        writer. Connections are not shared, which keeps the store safe to use from worker threads.
+        """
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, isolation_level=None)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._initialized:
+                    self._initialize(conn)
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            self._initialized = True
+        finally:
+            conn.close()
+
+    def _initialize(self, conn: sqlite3.Connection) -> None:
+        """Method to create the schema and import the legacy JSON tracking file if it hasn't been yet"""
+        for statement in self.SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+        imported = conn.execute("SELECT value FROM meta WHERE key = 'imported_json'").fetchone()
+        if imported or not self.legacy_json or not os.path.isfile(self.legacy_json):
+            return
+
+        with open(self.legacy_json, "rt") as f:
+            data = json.load(f)
+        for tag, status in data.items():
+            conn.execute("INSERT OR IGNORE INTO images (tag, is_built, is_published) VALUES (?, ?, ?)",
+                         (tag, int(status.get("isBuilt", False)), int(status.get("isPublished", False))))
+        conn.execute("INSERT INTO meta (key, value) VALUES ('imported_json', ?)", (self.legacy_json,))
+
+    def mark_built(self, tag: str, build_seconds: float = None, size: int = None, image_id: str = None) -> None:
+        """Method to record a successful build. The image is (again) unpublished
+
+        Args:
+            tag(str): Full image tag
+            build_seconds(float): Build duration
+            size(int): Image size in bytes
+            image_id(str): Docker image id
+
+        Returns:
+            None
+        """
+        with self._transaction() as conn:
+            # Upsert without ON CONFLICT, which needs SQLite 3.24+ (Ubuntu 18.04 ships 3.22)
+            conn.execute("INSERT OR IGNORE INTO images (tag) VALUES (?)", (tag,))
+            conn.execute("UPDATE images SET is_built = 1, is_published = 0, build_seconds = ?, size = ?, "
+                         "image_id = ?, built_at = ? WHERE tag = ?",
+                         (build_seconds, size, image_id, time.time(), tag))
+
+    def mark_published(self, tag: str, digest: str = None) -> None:
+        """Method to record a successful publish
+
+        Args:
+            tag(str): Full image tag
+            digest(str): Manifest digest reported by the registry
+
+        Returns:
+            None
+        """
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO images (tag, is_built) VALUES (?, 1)", (tag,))
+            conn.execute("UPDATE images SET is_published = 1, digest = COALESCE(?, digest), published_at = ? "
+                         "WHERE tag = ?",
+                         (digest, time.time(), tag))
+
+    def get(self, tag: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Method to get the state of one image
+
+        Args:
+            tag(str): Full image tag
+
+        Returns:
+            dict: the image's row, or None if it isn't tracked
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM images WHERE tag = ?", (tag,)).fetchone()
+        return dict(row) if row else None
+
+    def list_images(self, published: bool = None) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Method to list tracked images
+
+        Args:
+            published(bool): If set, only list images with this publish status
+
+        Returns:
+            list: rows ordered by tag
+        """
+        with self._transaction() as conn:
+            if published is None:
+                rows = conn.execute("SELECT * FROM images ORDER BY tag").fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM images WHERE is_published = ? ORDER BY tag",
+                                    (int(published),)).fetchall()
+        return [dict(row) for row in rows]
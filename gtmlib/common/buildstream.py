@@ -0,0 +1,296 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import csv
+import io
+import json
+import os
+import re
+import time
+import typing
+
+from gtmlib.common.cache import get_cache_dir, write_atomic
+from gtmlib.common.dockerfile import split_image_reference
+
+STEP_STARTED = 'step_started'
+CACHE_HIT = 'cache_hit'
+CACHE_MISS = 'cache_miss'
+STEP_FINISHED = 'step_finished'
+OUTPUT = 'output'
+STATUS = 'status'
+ERROR = 'error'
+IMAGE_ID = 'image_id'
+
+STEP_RE = re.compile(r"^Step (\d+)/(\d+) : (.*)$")
+
+
+class BuildEvent(object):
+    """Class for one typed event parsed from the daemon build stream"""
+    def __init__(self, kind: str, step: typing.Optional[int] = None, message: str = '') -> None:
+        self.kind = kind
+        self.step = step
+        self.message = message
+
+    def __repr__(self) -> str:
+        return "BuildEvent({!r}, {!r}, {!r})".format(self.kind, self.step, self.message)
+
+
+class BuildStep(object):
+    """Class to record the timing of one Dockerfile step"""
+    def __init__(self, number: int, total: int, instruction: str, started: float) -> None:
+        self.number = number
+        self.total = total
+        self.instruction = instruction
+        self.started = started
+        self.finished = None  # type: typing.Optional[float]
+        self.cached = None  # type: typing.Optional[bool]
+
+    @property
+    def duration(self) -> typing.Optional[float]:
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        duration = self.duration
+        return {'step': self.number, 'total': self.total, 'instruction': self.instruction,
+                'cached': self.cached, 'seconds': round(duration, 3) if duration is not None else None}
+
+
+class BuildStreamParser(object):
+    """Class to turn the decoded JSON stream of a docker build into typed events and per-step timings
+
+    Use `feed` for each decoded message, or `consume` to process (and optionally print) a whole stream.
+    """
+    def __init__(self, clock: typing.Callable[[], float] = time.monotonic) -> None:
+        """Constructor
+
+        Args:
+            clock(callable): Time source, in seconds
+        """
+        self.clock = clock
+        self.steps = []  # type: typing.List[BuildStep]
+        self.image_id = None  # type: typing.Optional[str]
+        self.error = None  # type: typing.Optional[str]
+        self.started = clock()
+        self.finished = None  # type: typing.Optional[float]
+        self._partial = ''
+
+    @property
+    def current_step(self) -> typing.Optional[BuildStep]:
+        return self.steps[-1] if self.steps else None
+
+    def _finish_step(self, events: typing.List[BuildEvent]) -> None:
+        step = self.current_step
+        if step and step.finished is None:
+            step.finished = self.clock()
+            if step.cached is None:
+                # Steps without a container (e.g. FROM, or metadata-only steps) did no work
+                step.cached = False
+            events.append(BuildEvent(STEP_FINISHED, step.number, step.instruction))
+
+    def _parse_line(self, line: str, events: typing.List[BuildEvent]) -> None:
+        step_number = self.current_step.number if self.current_step else None
+        match = STEP_RE.match(line.strip())
+        if match:
+            self._finish_step(events)
+            step = BuildStep(int(match.group(1)), int(match.group(2)), match.group(3), self.clock())
+            self.steps.append(step)
+            events.append(BuildEvent(STEP_STARTED, step.number, step.instruction))
+        elif line.strip() == '---> Using cache':
+            if self.current_step:
+                self.current_step.cached = True
+            events.append(BuildEvent(CACHE_HIT, step_number, line.strip()))
+        elif line.strip().startswith('---> Running in'):
+            if self.current_step:
+                self.current_step.cached = False
+            events.append(BuildEvent(CACHE_MISS, step_number, line.strip()))
+        elif line.startswith('Successfully built '):
+            self._finish_step(events)
+            if not self.image_id:
+                self.image_id = line.split()[-1]
+                events.append(BuildEvent(IMAGE_ID, step_number, self.image_id))
+
+    def feed(self, message: typing.Dict[str, typing.Any]) -> typing.List[BuildEvent]:
+        """Method to process one decoded message from the build stream
+
+        Args:
+            message(dict): Decoded JSON message
+
+        Returns:
+            list: BuildEvents, in order
+        """
+        events = []  # type: typing.List[BuildEvent]
+        step_number = self.current_step.number if self.current_step else None
+
+        if 'error' in message or 'errorDetail' in message:
+            self.error = (message.get('errorDetail') or {}).get('message') or message.get('error')
+            self._finish_step(events)
+            events.append(BuildEvent(ERROR, step_number, self.error))
+
+        elif 'aux' in message:
+            aux = message['aux']
+            if isinstance(aux, dict) and aux.get('ID'):
+                self.image_id = aux['ID']
+                events.append(BuildEvent(IMAGE_ID, step_number, self.image_id))
+
+        elif 'stream' in message:
+            text = message['stream']
+            events.append(BuildEvent(OUTPUT, step_number, text))
+
+            # Stream messages are not aligned to lines
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            for line in lines:
+                self._parse_line(line, events)
+
+        elif 'status' in message:
+            if not (message.get('progressDetail') or {}).get('total'):
+                status = message['status']
+                if message.get('id'):
+                    status = "{}: {}".format(message['id'], status)
+                events.append(BuildEvent(STATUS, step_number, status))
+
+        return events
+
+    def close(self) -> None:
+        """Method to mark the end of the stream"""
+        events = []  # type: typing.List[BuildEvent]
+        if self._partial:
+            self._parse_line(self._partial, events)
+            self._partial = ''
+        self._finish_step(events)
+        self.finished = self.clock()
+
+    def consume(self, stream: typing.Iterable[typing.Dict[str, typing.Any]],
+                output: typing.Optional[typing.Callable[[str], None]] = None, prefix: str = '') -> 'BuildStreamParser':
+        """Method to process a whole build stream
+
+        Args:
+            stream(iterable): Decoded messages, e.g. from `APIClient.build(decode=True)`
+            output(callable): If set, called with each line of build output to display
+            prefix(str): String prepended to each displayed line
+
+        Returns:
+            BuildStreamParser: self
+        """
+        at_line_start = True
+        for message in stream:
+            for event in self.feed(message):
+                if output is None:
+                    continue
+                if event.kind == OUTPUT:
+                    # Keep the daemon's line breaks, prefixing each new line
+                    for piece in event.message.splitlines(True):
+                        output((prefix if at_line_start else '') + piece)
+                        at_line_start = piece.endswith('\n')
+                elif event.kind in (STATUS, ERROR):
+                    output("{}{}\n".format(prefix, event.message))
+                    at_line_start = True
+        self.close()
+
+        if self.error:
+            raise ValueError("Image Build Failed: {}".format(self.error))
+        return self
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        """Method to summarize the build
+
+        Returns:
+            dict
+        """
+        end = self.finished if self.finished is not None else self.clock()
+        return {'image_id': self.image_id,
+                'error': self.error,
+                'seconds': round(end - self.started, 3),
+                'cached_steps': len([s for s in self.steps if s.cached]),
+                'steps': [s.to_dict() for s in self.steps]}
+
+    def write_report(self, path: str) -> None:
+        """Method to write the step timings as JSON, or as CSV if the path ends with .csv
+
+        Args:
+            path(str): Output file
+
+        Returns:
+            None
+        """
+        if path.lower().endswith('.csv'):
+            fields = ['step', 'total', 'instruction', 'cached', 'seconds']
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator='\n')
+            writer.writeheader()
+            for step in self.steps:
+                writer.writerow(step.to_dict())
+            write_atomic(path, buffer.getvalue().encode())
+        else:
+            write_atomic(path, json.dumps(self.report(), indent=2).encode())
+
+    def summary(self) -> str:
+        """Method to describe the build timing in one line
+
+        Returns:
+            str
+        """
+        report = self.report()
+        slowest = sorted([s for s in self.steps if s.duration is not None], key=lambda s: s.duration, reverse=True)
+        text = "Build took {:.1f}s, {}/{} steps cached".format(report['seconds'], report['cached_steps'],
+                                                               len(self.steps))
+        if slowest and not slowest[0].cached:
+            text += ", slowest step {} ({:.1f}s): {}".format(slowest[0].number, slowest[0].duration,
+                                                            slowest[0].instruction[:60])
+        return text
+
+
+def get_report_path(image_tag: str) -> str:
+    """Method to get the timing report path for an image, set by GTM_BUILD_REPORT_FORMAT (json or csv)
+
+    Args:
+        image_tag(str): Image being built
+
+    Returns:
+        str
+    """
+    extension = 'csv' if os.environ.get('GTM_BUILD_REPORT_FORMAT', '').lower() == 'csv' else 'json'
+    repository, _ = split_image_reference(image_tag)
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", repository)
+    return os.path.join(get_cache_dir('build-reports'), "{}.{}".format(name, extension))
+
+
+def run_build(client, verbose: bool = False, prefix: str = '', **kwargs) -> BuildStreamParser:
+    """Method to run a docker build, displaying its output and writing a timing report
+
+    Args:
+        client(DockerClient): Docker client
+        verbose(bool): flag indicating if the build output should be printed
+        prefix(str): String prepended to each line of output
+        **kwargs: Arguments for `APIClient.build`, `tag` is required
+
+    Returns:
+        BuildStreamParser
+    """
+    parser = BuildStreamParser()
+    output = (lambda text: print(text, end='')) if verbose else None
+    try:
+        parser.consume(client.api.build(decode=True, **kwargs), output=output, prefix=prefix)
+    finally:
+        report_path = get_report_path(kwargs['tag'])
+        parser.write_report(report_path)
+        print("{}{} (timing report: {})".format(prefix, parser.summary(), report_path))
+    return parser
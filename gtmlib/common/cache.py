@@ -0,0 +1,102 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import tempfile
+import time
+import typing
+from contextlib import contextmanager
+
+
+def get_gtm_dir() -> str:
+    """Method to get the root gtm directory
+
+    Returns:
+        str
+    """
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_cache_dir(*parts: str) -> str:
+    """Method to get (and create) a directory for gtm's local build caches
+
+    The root defaults to `.gtm-cache` in the gtm directory and can be moved with the GTM_CACHE_DIR environment variable.
+
+    Args:
+        *parts(str): Sub-directories of the cache root
+
+    Returns:
+        str
+    """
+    root = os.environ.get('GTM_CACHE_DIR') or os.path.join(get_gtm_dir(), '.gtm-cache')
+    cache_dir = os.path.join(root, *parts)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Method to replace a file's contents atomically, so concurrent readers never see a partial file
+
+    Args:
+        path(str): File to write
+        data(bytes): New contents
+
+    Returns:
+        None
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path: str) -> typing.Iterator[None]:
+    """Context manager to hold an exclusive lock on a lock file, across threads and processes
+
+    Args:
+        path(str): Lock file, created if it doesn't exist
+    """
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,115 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import shutil
+import tempfile
+import time
+import typing
+
+from gtmlib.common.cache import get_cache_dir
+
+
+class DirectoryCache(object):
+    """Class to store directories (e.g. build outputs) in the gtm cache, addressed by a content key
+
+    Each entry is .gtm-cache/<name>/<key>/data plus a `.complete` marker whose mtime records when it was last used.
+    Only the `keep` most recently used entries are kept.
+    """
+    def __init__(self, name: str, keep: int = 5) -> None:
+        """Constructor
+
+        Args:
+            name(str): Sub-directory of the cache root
+            keep(int): Number of entries to keep
+        """
+        self.name = name
+        self.keep = keep
+
+    @property
+    def root(self) -> str:
+        return get_cache_dir(self.name)
+
+    def _marker(self, key: str) -> str:
+        return os.path.join(self.root, key, '.complete')
+
+    def get(self, key: str) -> typing.Optional[str]:
+        """Method to look up an entry, marking it as used
+
+        Args:
+            key(str): Content key
+
+        Returns:
+            str: the cached directory, or None
+        """
+        marker = self._marker(key)
+        if not os.path.isfile(marker):
+            return None
+        os.utime(marker)
+        return os.path.join(self.root, key, 'data')
+
+    def put(self, key: str, source_dir: str, metadata: typing.Optional[typing.Dict[str, typing.Any]] = None) -> str:
+        """Method to copy a directory into the cache and evict old entries
+
+        Args:
+            key(str): Content key
+            source_dir(str): Directory to store
+            metadata(dict): Optional information stored with the entry
+
+        Returns:
+            str: the cached directory
+        """
+        entry_dir = os.path.join(self.root, key)
+        temp_dir = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            shutil.copytree(source_dir, os.path.join(temp_dir, 'data'), symlinks=True)
+            with open(os.path.join(temp_dir, '.complete'), 'wt') as f:
+                json.dump(dict(metadata or {}, key=key, created=time.time()), f)
+
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(temp_dir, entry_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.evict(current=key)
+        return os.path.join(entry_dir, 'data')
+
+    def evict(self, current: str = None) -> typing.List[str]:
+        """Method to remove the least recently used entries beyond `keep`
+
+        Args:
+            current(str): Key that is never removed
+
+        Returns:
+            list: removed keys
+        """
+        entries = []
+        for key in os.listdir(self.root):
+            if key.startswith('.') or key == current:
+                continue
+            marker = self._marker(key)
+            entries.append((os.path.getmtime(marker) if os.path.isfile(marker) else 0, key))
+
+        removed = []
+        for _, key in sorted(entries, reverse=True)[max(0, self.keep - (1 if current else 0)):]:
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            removed.append(key)
+        return removed
@@ -0,0 +1,188 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import errno
+import fnmatch
+import hashlib
+import os
+import shutil
+import stat
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _scan(root: str, exclude: typing.List[str]) -> typing.Tuple[typing.Dict[str, os.stat_result], typing.List[str]]:
+    """Method to list the files (with their lstat results) and directories under a root, relative to it
+
+    Args:
+        root(str): Directory to scan
+        exclude(list): fnmatch patterns of relative paths that are skipped
+
+    Returns:
+        tuple: dict of file path -> stat result, list of directory paths
+    """
+    files = dict()
+    dirs = list()
+    if not os.path.isdir(root):
+        return files, dirs
+
+    for current, dir_names, file_names in os.walk(root):
+        rel_dir = os.path.relpath(current, root)
+        rel_dir = '' if rel_dir == '.' else rel_dir.replace(os.path.sep, '/') + '/'
+
+        kept = list()
+        for name in sorted(dir_names):
+            rel_path = rel_dir + name
+            if any(fnmatch.fnmatch(rel_path, pattern) for pattern in exclude):
+                continue
+            if os.path.islink(os.path.join(current, name)):
+                # Links to directories are synced as links
+                file_names.append(name)
+                continue
+            dirs.append(rel_path)
+            kept.append(name)
+        dir_names[:] = kept
+
+        for name in file_names:
+            rel_path = rel_dir + name
+            if not any(fnmatch.fnmatch(rel_path, pattern) for pattern in exclude):
+                files[rel_path] = os.lstat(os.path.join(current, name))
+
+    return files, dirs
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _is_unchanged(source: str, dest: str, source_stat: os.stat_result, dest_stat: os.stat_result) -> bool:
+    """Method to check if a destination file already matches its source, rsync-style
+
+    Files with a different type or size differ, files with the same size and mtime are the same. Otherwise the contents
+    are compared, and a match only needs its mtime updated.
+    """
+    if stat.S_IFMT(source_stat.st_mode) != stat.S_IFMT(dest_stat.st_mode):
+        return False
+    if stat.S_ISLNK(source_stat.st_mode):
+        return os.readlink(source) == os.readlink(dest)
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns and source_stat.st_mode == dest_stat.st_mode:
+        return True
+    if _hash_file(source) == _hash_file(dest):
+        shutil.copystat(source, dest)
+        return True
+    return False
+
+
+def sync_directory(source: str, dest: str, exclude: typing.Optional[typing.List[str]] = None,
+                   jobs: int = 8) -> typing.Dict[str, typing.Any]:
+    """Method to make a directory a copy of another, copying only new or changed files
+
+    Files and directories in `dest` that are not in `source` are removed. Excluded paths are neither copied nor
+    removed. Changed files are copied on a pool of threads, with their permissions and mtime.
+
+    Args:
+        source(str): Directory to copy from
+        dest(str): Directory to update
+        exclude(list): fnmatch patterns of paths relative to the roots, with '/' separators (e.g. '*/node_modules')
+        jobs(int): Number of threads used to copy files
+
+    Returns:
+        dict: lists of the `copied` and `removed` paths, and the number of `unchanged` files
+    """
+    exclude = exclude or list()
+    source_files, source_dirs = _scan(source, exclude)
+    dest_files, dest_dirs = _scan(dest, exclude)
+
+    to_copy = list()
+    unchanged = 0
+    for rel_path, source_stat in source_files.items():
+        dest_stat = dest_files.get(rel_path)
+        if dest_stat and _is_unchanged(os.path.join(source, rel_path), os.path.join(dest, rel_path),
+                                       source_stat, dest_stat):
+            unchanged += 1
+        else:
+            to_copy.append(rel_path)
+
+    # Remove what is no longer in the source, including files replaced by directories and vice versa
+    removed = sorted(set(dest_files) - set(source_files))
+    for rel_path in removed:
+        os.remove(os.path.join(dest, rel_path))
+    source_dir_set = set(source_dirs)
+    for rel_path in sorted(set(dest_dirs) - source_dir_set, reverse=True):
+        shutil.rmtree(os.path.join(dest, rel_path), ignore_errors=True)
+        removed.append(rel_path + '/')
+
+    os.makedirs(dest, exist_ok=True)
+    for rel_path in source_dirs:
+        os.makedirs(os.path.join(dest, rel_path), exist_ok=True)
+
+    def copy(rel_path: str) -> None:
+        dest_path = os.path.join(dest, rel_path)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        shutil.copy2(os.path.join(source, rel_path), dest_path, follow_symlinks=False)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        list(pool.map(copy, to_copy))
+
+    return {'copied': sorted(to_copy), 'removed': removed, 'unchanged': unchanged}
+
+
+def publish_directory(source: str, dest: str) -> None:
+    """Method to move a directory into place, replacing any existing one
+
+    The source is renamed next to the destination and then swapped in with two renames, so `dest` is never a
+    partially written directory. If the two are on different filesystems the source is copied next to the
+    destination first.
+
+    Args:
+        source(str): Directory to publish. It no longer exists afterwards
+        dest(str): Path to publish it to
+
+    Returns:
+        None
+    """
+    dest = os.path.abspath(dest)
+    parent, name = os.path.split(dest)
+    staged = os.path.join(parent, '.{}.new'.format(name))
+    previous = os.path.join(parent, '.{}.old'.format(name))
+    for path in [staged, previous]:
+        if os.path.lexists(path):
+            shutil.rmtree(path)
+
+    try:
+        os.rename(source, staged)
+    except OSError as err:
+        if err.errno != errno.EXDEV:
+            raise
+        shutil.copytree(source, staged, symlinks=True)
+        shutil.rmtree(source)
+
+    if os.path.lexists(dest):
+        os.rename(dest, previous)
+        os.rename(staged, dest)
+        shutil.rmtree(previous)
+    else:
+        os.rename(staged, dest)
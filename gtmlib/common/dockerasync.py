@@ -0,0 +1,383 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import asyncio
+import json
+import struct
+import typing
+import urllib.parse
+
+import docker
+
+from gtmlib.common.dockerclient import get_docker_host, get_server_api_version
+
+
+class AsyncDockerError(Exception):
+    """Raised when the daemon returns an error status or an error in a JSON stream"""
+    def __init__(self, message: str, status: typing.Optional[int] = None) -> None:
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def run_async(coroutine: typing.Awaitable) -> typing.Any:
+    """Helper to run a coroutine to completion from the synchronous builders
+
+    Args:
+        coroutine: Coroutine to run
+
+    Returns:
+        The coroutine's result
+    """
+    # Equivalent of asyncio.run, which needs Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        try:
+            # Cancel what the coroutine left running (e.g. server connection handlers), as asyncio.run does
+            # asyncio.all_tasks was added in 3.7, Task.all_tasks removed in 3.9
+            all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+            pending = [task for task in all_tasks(loop) if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def get_registry_auth_header(repository: str) -> str:
+    """Method to build the X-Registry-Auth header for a repository from the local docker login config
+
+    Args:
+        repository(str): Repository name, e.g. gigantum/labmanager
+
+    Returns:
+        str
+    """
+    registry, _ = docker.auth.resolve_repository_name(repository)
+    auth_config = docker.auth.resolve_authconfig(docker.auth.load_config(), registry)
+    return docker.auth.encode_header(auth_config or {}).decode()
+
+
+class _Response(object):
+    """An HTTP response whose body is read incrementally from the connection"""
+    def __init__(self, status: int, headers: typing.Dict[str, str], reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self.status = status
+        self.headers = headers
+        self._reader = reader
+        self._writer = writer
+
+    async def iter_body(self) -> typing.AsyncIterator[bytes]:
+        """Yield the body as it arrives, decoding chunked transfer encoding"""
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await self._reader.readline()
+                if not size_line:
+                    break
+                size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Trailer section ends with an empty line
+                    await self._reader.readline()
+                    break
+                data = await self._reader.readexactly(size)
+                await self._reader.readexactly(2)
+                yield data
+        elif 'content-length' in self.headers:
+            remaining = int(self.headers['content-length'])
+            while remaining > 0:
+                data = await self._reader.read(min(remaining, 65536))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        else:
+            # Hijacked/raw streams (e.g. exec) run until the daemon closes the connection
+            while True:
+                data = await self._reader.read(65536)
+                if not data:
+                    break
+                yield data
+
+    async def read(self) -> bytes:
+        """Read the full body"""
+        return b''.join([data async for data in self.iter_body()])
+
+    async def iter_json(self) -> typing.AsyncIterator[typing.Dict[str, typing.Any]]:
+        """Yield each JSON object of a streamed response. Objects may span or share body chunks."""
+        decoder = json.JSONDecoder()
+        buffer = ''
+        async for data in self.iter_body():
+            buffer += data.decode('utf-8', errors='replace')
+            while True:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    break
+                try:
+                    obj, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    # Incomplete object, wait for more data
+                    break
+                buffer = buffer[end:]
+                yield obj
+
+    async def iter_frames(self) -> typing.AsyncIterator[typing.Tuple[int, bytes]]:
+        """Yield (stream id, payload) from a multiplexed stdout/stderr stream"""
+        buffer = b''
+        async for data in self.iter_body():
+            buffer += data
+            while len(buffer) >= 8:
+                stream_id, size = struct.unpack('>BxxxL', buffer[:8])
+                if len(buffer) < 8 + size:
+                    break
+                yield stream_id, buffer[8:8 + size]
+                buffer = buffer[8 + size:]
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class AsyncDockerClient(object):
+    """Minimal asyncio client for the Docker Engine API
+
+    Every request uses its own connection to the daemon socket, so any number of operations can run concurrently
+    with asyncio.gather().
+    """
+    def __init__(self, api_version: typing.Optional[str] = None, docker_host: typing.Optional[str] = None) -> None:
+        if docker_host:
+            scheme, address = docker_host.split('://', 1)
+        else:
+            scheme, address = get_docker_host()
+        self.scheme = scheme
+        self.address = address
+
+        if api_version is None:
+            api_version = get_server_api_version()
+        self.api_version = api_version
+
+    def _url(self, path: str, params: typing.Optional[typing.Dict[str, typing.Any]] = None) -> str:
+        if self.api_version:
+            path = f"/v{self.api_version}{path}"
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+            path = f"{path}?{urllib.parse.urlencode(params)}"
+        return path
+
+    async def _connect(self) -> typing.Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self.scheme == 'unix':
+            return await asyncio.open_unix_connection(self.address, limit=2 ** 20)
+        host, port = self.address.rsplit(':', 1)
+        return await asyncio.open_connection(host, int(port), limit=2 ** 20)
+
+    async def request(self, method: str, path: str, params: typing.Optional[typing.Dict[str, typing.Any]] = None,
+                      body: typing.Union[None, bytes, typing.Iterable[bytes]] = None,
+                      headers: typing.Optional[typing.Dict[str, str]] = None) -> _Response:
+        """Method to send a request and return once the response headers arrive
+
+        Args:
+            method(str): HTTP method
+            path(str): API path without the version prefix
+            params(dict): Query parameters. None values are dropped
+            body: Request body. An iterable of bytes is streamed with chunked encoding
+            headers(dict): Extra headers
+
+        Returns:
+            _Response
+        """
+        reader, writer = await self._connect()
+
+        request_headers = {'Host': 'docker', 'Connection': 'close'}
+        if headers:
+            request_headers.update(headers)
+        if isinstance(body, (bytes, bytearray)):
+            request_headers['Content-Length'] = str(len(body))
+        elif body is not None:
+            request_headers['Transfer-Encoding'] = 'chunked'
+
+        head = f"{method} {self._url(path, params)} HTTP/1.1\r\n"
+        head += "".join([f"{k}: {v}\r\n" for k, v in request_headers.items()])
+        writer.write((head + "\r\n").encode())
+
+        if isinstance(body, (bytes, bytearray)):
+            writer.write(body)
+        elif body is not None:
+            for chunk in body:
+                if chunk:
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            writer.close()
+            raise AsyncDockerError("Docker daemon closed the connection without responding")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, value = line.decode().split(':', 1)
+            response_headers[key.strip().lower()] = value.strip()
+
+        response = _Response(status, response_headers, reader, writer)
+        if status >= 400:
+            try:
+                message = json.loads((await response.read()).decode()).get('message')
+            except ValueError:
+                message = None
+            finally:
+                response.close()
+            raise AsyncDockerError(message or f"Docker daemon returned {status} for {method} {path}", status=status)
+        return response
+
+    async def _request_json(self, method: str, path: str, **kwargs) -> typing.Any:
+        response = await self.request(method, path, **kwargs)
+        try:
+            data = await response.read()
+        finally:
+            response.close()
+        return json.loads(data.decode()) if data.strip() else None
+
+    async def _stream_json(self, method: str, path: str, **kwargs) -> typing.AsyncIterator[typing.Dict[str, typing.Any]]:
+        response = await self.request(method, path, **kwargs)
+        try:
+            async for obj in response.iter_json():
+                if 'error' in obj:
+                    raise AsyncDockerError(obj.get('errorDetail', {}).get('message') or obj['error'])
+                yield obj
+        finally:
+            response.close()
+
+    async def image_exists(self, name: str) -> bool:
+        """Method to check if an image exists locally"""
+        try:
+            await self._request_json('GET', f'/images/{name}/json')
+            return True
+        except AsyncDockerError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    async def volume_exists(self, name: str) -> bool:
+        """Method to check if a volume exists"""
+        try:
+            await self._request_json('GET', f'/volumes/{name}')
+            return True
+        except AsyncDockerError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    async def tag(self, image: str, repository: str, tag: str) -> None:
+        """Method to tag an image"""
+        await self._request_json('POST', f'/images/{image}/tag', params={'repo': repository, 'tag': tag})
+
+    def build(self, context: typing.Union[bytes, typing.Iterable[bytes]], tag: str,
+              dockerfile: str = 'Dockerfile', **params) -> typing.AsyncIterator[typing.Dict[str, typing.Any]]:
+        """Method to build an image, streaming the decoded build output
+
+        Args:
+            context: Tar archive of the build context, as bytes or an iterable of chunks
+            tag(str): Image tag
+            dockerfile(str): Dockerfile path within the context
+            **params: Extra /build query parameters (e.g. nocache, pull, rm, labels)
+
+        Returns:
+            async iterator of dicts
+        """
+        query = {'t': tag, 'dockerfile': dockerfile}
+        for key, value in params.items():
+            if isinstance(value, bool):
+                value = int(value)
+            elif isinstance(value, dict):
+                value = json.dumps(value)
+            query[key] = value
+        return self._stream_json('POST', '/build', params=query, body=context,
+                                 headers={'Content-Type': 'application/x-tar'})
+
+    def push(self, repository: str, tag: str,
+             auth_header: typing.Optional[str] = None) -> typing.AsyncIterator[typing.Dict[str, typing.Any]]:
+        """Method to push a tag, streaming the decoded progress messages
+
+        Args:
+            repository(str): Repository name
+            tag(str): Tag to push
+            auth_header(str): X-Registry-Auth value. Defaults to the local docker login config
+
+        Returns:
+            async iterator of dicts
+        """
+        if auth_header is None:
+            auth_header = get_registry_auth_header(repository)
+        return self._stream_json('POST', f'/images/{repository}/push', params={'tag': tag},
+                                 headers={'X-Registry-Auth': auth_header})
+
+    async def logs(self, container: str, follow: bool = True) -> typing.AsyncIterator[bytes]:
+        """Method to stream a container's combined stdout/stderr"""
+        params = {'stdout': 1, 'stderr': 1, 'follow': int(follow)}
+        response = await self.request('GET', f'/containers/{container}/logs', params=params)
+        try:
+            if response.headers.get('content-type') == 'application/vnd.docker.raw-stream':
+                async for _, payload in response.iter_frames():
+                    yield payload
+            else:
+                # TTY containers are not multiplexed
+                async for data in response.iter_body():
+                    yield data
+        finally:
+            response.close()
+
+    async def exec_create(self, container: str, cmd: typing.Union[str, typing.List[str]],
+                          environment: typing.Optional[typing.Dict[str, str]] = None) -> str:
+        """Method to create an exec instance in a running container
+
+        Returns:
+            str: The exec id
+        """
+        if isinstance(cmd, str):
+            cmd = ['/bin/sh', '-c', cmd]
+        config = {'AttachStdout': True, 'AttachStderr': True, 'Cmd': cmd}
+        if environment:
+            config['Env'] = [f"{k}={v}" for k, v in environment.items()]
+
+        result = await self._request_json('POST', f'/containers/{container}/exec', body=json.dumps(config).encode(),
+                                          headers={'Content-Type': 'application/json'})
+        return result['Id']
+
+    async def exec_start(self, exec_id: str) -> typing.AsyncIterator[bytes]:
+        """Method to start an exec instance, streaming its combined stdout/stderr"""
+        response = await self.request('POST', f'/exec/{exec_id}/start',
+                                      body=json.dumps({'Detach': False, 'Tty': False}).encode(),
+                                      headers={'Content-Type': 'application/json'})
+        try:
+            async for _, payload in response.iter_frames():
+                yield payload
+        finally:
+            response.close()
+
+    async def exec_exit_code(self, exec_id: str) -> typing.Optional[int]:
+        """Method to get the exit code of a finished exec"""
+        return (await self._request_json('GET', f'/exec/{exec_id}/json')).get('ExitCode')
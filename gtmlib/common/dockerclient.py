@@ -17,45 +17,336 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import http.client
 import socket
 import json
 import os
-import docker
+import threading
+import time
+import typing
 
+from gtmlib.common.cache import get_cache_dir, write_atomic
 
-def _get_docker_server_api_version() -> str:
-    """Retrieve the Docker server API version. """
+# docker is only imported once a client is created, so gtmlib.common can re-export get_docker_client without loading
+# it for the lightweight helpers
+if typing.TYPE_CHECKING:
+    import docker
+
+# Seconds a negotiated server API version is trusted before asking the daemon again
+API_VERSION_CACHE_TTL = 24 * 60 * 60
+
+# Process-wide registry of docker clients, keyed by the API version they were created with. Every module shares these
+# so the server version is negotiated once and the keep-alive HTTP connections of each client's pool are reused.
+_client_lock = threading.Lock()
+_clients = {}  # type: typing.Dict[str, docker.DockerClient]
+_server_api_version = None  # type: typing.Optional[str]
+_negotiation_error = None  # type: typing.Optional[ValueError]
+
+_stats_lock = threading.Lock()
+_stats = {"clients": 0, "negotiations": 0, "api_calls": 0, "api_errors": 0, "raw_connections": 0}
+
+
+def get_docker_host() -> typing.Tuple[str, str]:
+    """Method to resolve the daemon address the docker CLI would use
+
+    Returns:
+        tuple: ("unix", socket path) or ("tcp", "host:port")
+    """
+    docker_host = os.environ.get('DOCKER_HOST') or 'unix:///var/run/docker.sock'
+    if docker_host.startswith('unix://'):
+        return 'unix', docker_host[len('unix://'):]
+    elif docker_host.startswith('tcp://'):
+        if os.environ.get('DOCKER_TLS_VERIFY'):
+            raise ValueError('TLS docker hosts are not supported for version negotiation')
+        return 'tcp', docker_host[len('tcp://'):].rstrip('/')
+    else:
+        raise ValueError(f'Unsupported DOCKER_HOST: {docker_host}')
 
-    socket_path = '/var/run/docker.sock'
-    if not os.path.exists(socket_path):
-        raise ValueError('No docker.sock on machine (is a Docker server installed?)')
 
-    socket_connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    socket_connection.connect(socket_path)
-    socket_connection.send(b'GET http://*/version HTTP/1.1\r\nHost: *\r\n\r\n')
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a UNIX domain socket"""
+    def __init__(self, socket_path: str, timeout: float = 10) -> None:
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = socket_path
 
-    response_data = socket_connection.recv(4000)
-    content_lines = response_data.decode().split('\r\n')
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
 
-    version_dict = json.loads(content_lines[-1])
+
+def _docker_get(path: str) -> typing.Dict[str, typing.Any]:
+    """Method to issue a single GET against the daemon and decode the JSON body
+
+    http.client takes care of chunked transfer encoding and responses split over multiple reads.
+
+    Args:
+        path(str): API path, e.g. /version
+
+    Returns:
+        dict
+    """
+    scheme, address = get_docker_host()
+    if scheme == 'unix':
+        if not os.path.exists(address):
+            raise ValueError(f'No {address} on machine (is a Docker server installed?)')
+        connection = _UnixHTTPConnection(address)
+    else:
+        connection = http.client.HTTPConnection(address, timeout=10)
+
+    with _stats_lock:
+        _stats["raw_connections"] += 1
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise ValueError(f'Docker daemon returned {response.status} for {path}')
+        return json.loads(body.decode())
+    except (OSError, http.client.HTTPException, json.JSONDecodeError) as e:
+        raise ValueError(f'Failed to query Docker daemon: {e}')
+    finally:
+        connection.close()
+
+
+def _get_docker_server_api_version() -> str:
+    """Retrieve the Docker server API version. """
+    version_dict = _docker_get('/version')
     if 'ApiVersion' not in version_dict.keys():
         raise ValueError('ApiVersion not in Docker version config data')
     else:
         return version_dict['ApiVersion']
 
 
-def get_docker_client(check_server_version=True, fallback=True):
-    """Return a docker client with proper version to match server API. """
+def _get_api_version_cache_file() -> str:
+    """Method to get the path to the on-disk API version cache"""
+    return os.path.join(get_cache_dir(), 'docker-api-version.json')
+
+
+def _get_daemon_fingerprint() -> typing.Tuple[str, typing.Optional[str]]:
+    """Method to get a cheap identity for the daemon endpoint without talking to it
+
+    For UNIX sockets the socket file's inode and ctime are included, since the daemon recreates the socket whenever
+    it restarts (including upgrades).
 
-    if check_server_version:
+    Returns:
+        tuple: cache key for the endpoint, socket fingerprint (or None for TCP)
+    """
+    scheme, address = get_docker_host()
+    key = f"{scheme}://{address}"
+    if scheme == 'unix':
         try:
-            docker_server_api_version = _get_docker_server_api_version()
-            return docker.from_env(version=docker_server_api_version)
-        except ValueError as e:
-            if fallback:
-                return docker.from_env()
-            else:
-                raise e
+            socket_stat = os.stat(address)
+        except OSError:
+            raise ValueError(f'No {address} on machine (is a Docker server installed?)')
+        return key, f"{socket_stat.st_ino}:{socket_stat.st_ctime}"
+    return key, None
+
+
+def _load_api_version_cache() -> typing.Dict[str, typing.Any]:
+    """Method to load the API version cache, treating a missing or corrupt file as empty"""
+    try:
+        with open(_get_api_version_cache_file(), 'rt') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _get_cached_api_version(ttl: int = API_VERSION_CACHE_TTL) -> str:
+    """Method to get the server API version, using the on-disk cache when possible
+
+    Entries are stored per endpoint along with the socket fingerprint seen when they were negotiated, which stands in
+    for the daemon's identity without a round trip. An entry is only used if it is younger than `ttl` seconds and the
+    socket has not been recreated. TCP endpoints have no fingerprint and rely on the TTL and on version errors
+    invalidating the entry.
+
+    Args:
+        ttl(int): Maximum age of a cache entry in seconds
+
+    Returns:
+        str
+    """
+    key, fingerprint = _get_daemon_fingerprint()
+    cache = _load_api_version_cache()
+    entry = cache.get(key)
+    if entry and entry.get('fingerprint') == fingerprint and time.time() - entry.get('created', 0) < ttl:
+        return entry['api_version']
+
+    with _stats_lock:
+        _stats["negotiations"] += 1
+    api_version = _get_docker_server_api_version()
+
+    cache = _load_api_version_cache()
+    cache[key] = {'api_version': api_version, 'fingerprint': fingerprint, 'created': time.time()}
+    try:
+        write_atomic(_get_api_version_cache_file(), json.dumps(cache, indent=2).encode())
+    except OSError:
+        # The cache is an optimization only
+        pass
+    return api_version
+
+
+def invalidate_api_version_cache() -> None:
+    """Method to drop the cached API version for the current endpoint and renegotiate on the next client request
+
+    Returns:
+        None
+    """
+    global _server_api_version, _negotiation_error
+    try:
+        key, _ = _get_daemon_fingerprint()
+        cache = _load_api_version_cache()
+        if cache.pop(key, None) is not None:
+            write_atomic(_get_api_version_cache_file(), json.dumps(cache, indent=2).encode())
+    except (OSError, ValueError):
+        pass
+
+    with _client_lock:
+        if _server_api_version is not None:
+            # Stop handing out the mis-versioned client. It is not closed since a caller may still hold it.
+            _clients.pop(_server_api_version, None)
+        _server_api_version = None
+        _negotiation_error = None
+
+
+def _on_response(response, *args, **kwargs) -> None:
+    """Response hook installed on every pooled client to count API calls and catch API version errors"""
+    with _stats_lock:
+        _stats["api_calls"] += 1
+        if response.status_code >= 400:
+            _stats["api_errors"] += 1
+
+    # e.g. "client version 1.38 is too new. Maximum supported API version is 1.37"
+    if response.status_code == 400 and b'client version' in response.content.lower():
+        invalidate_api_version_cache()
+
+
+def _create_client(version: typing.Optional[str] = None) -> 'docker.DockerClient':
+    """Method to create a new client and register the API call counter on it
+
+    Args:
+        version(str): API version to use, or None for the docker-py default
+
+    Returns:
+        docker.DockerClient
+    """
+    import docker
+
+    if version:
+        client = docker.from_env(version=version)
     else:
-        return docker.from_env()
+        client = docker.from_env()
+    client.api.hooks['response'].append(_on_response)
+
+    with _stats_lock:
+        _stats["clients"] += 1
+    return client
+
+
+def _negotiate_server_api_version() -> str:
+    """Method to negotiate the server API version once per process (and once per TTL across processes)
+
+    Returns:
+        str
+    """
+    global _server_api_version, _negotiation_error
+    if _negotiation_error is not None:
+        # Don't retry a failed negotiation on every call
+        raise _negotiation_error
+
+    if _server_api_version is None:
+        try:
+            _server_api_version = _get_cached_api_version()
+        except ValueError as e:
+            _negotiation_error = e
+            raise
+    return _server_api_version
+
+
+def get_docker_client(check_server_version=True, fallback=True):
+    """Return a docker client with proper version to match server API.
+
+    Clients are pooled for the life of the process, so repeated calls return the same client (and its connections).
+    """
+    with _client_lock:
+        if check_server_version:
+            try:
+                key = _negotiate_server_api_version()
+            except ValueError as e:
+                if fallback:
+                    key = None
+                else:
+                    raise e
+        else:
+            key = None
+
+        registry_key = key or "default"
+        if registry_key not in _clients:
+            _clients[registry_key] = _create_client(key)
+        return _clients[registry_key]
+
+
+def get_server_api_version() -> typing.Optional[str]:
+    """Method to get the server API version negotiated for this process
+
+    Returns:
+        str: The version, or None if it could not be negotiated
+    """
+    with _client_lock:
+        try:
+            return _negotiate_server_api_version()
+        except ValueError:
+            return None
+
+
+def reset_docker_clients() -> None:
+    """Method to close all pooled clients and forget the negotiated server version
+
+    Returns:
+        None
+    """
+    global _server_api_version, _negotiation_error
+    with _client_lock:
+        for client in _clients.values():
+            # DockerClient.close() was added in docker-py 3.2
+            if hasattr(client, 'close'):
+                client.close()
+        _clients.clear()
+        _server_api_version = None
+        _negotiation_error = None
+
+
+def _iter_connection_pools(client: 'docker.DockerClient') -> typing.Iterator[typing.Any]:
+    """Helper to walk the urllib3 connection pools held by a client's transport adapters"""
+    for adapter in client.api.adapters.values():
+        pools = getattr(adapter, 'pools', None)
+        if pools is None and hasattr(adapter, 'poolmanager'):
+            pools = adapter.poolmanager.pools
+        if pools is None:
+            continue
+        # RecentlyUsedContainer does not support iteration, only keys()
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                yield pool
+
+
+def get_docker_stats() -> typing.Dict[str, int]:
+    """Method to report how much work the pooled docker clients have done in this process
+
+    Returns:
+        dict: number of clients created, version negotiations (cache misses), connections opened (pooled HTTP
+              connections plus those used for negotiation), and API calls made
+    """
+    with _client_lock:
+        clients = list(_clients.values())
+
+    connections = 0
+    for client in clients:
+        connections += sum([getattr(pool, 'num_connections', 0) for pool in _iter_connection_pools(client)])
 
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["connections"] = connections + stats.pop("raw_connections")
+    return stats
@@ -0,0 +1,122 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import re
+import typing
+
+
+def parse_dockerfile(dockerfile: str) -> typing.List[typing.Tuple[str, str]]:
+    """Method to split a Dockerfile into instructions
+
+    Comments are dropped and lines continued with the escape character are joined.
+
+    Args:
+        dockerfile(str): Path to the Dockerfile
+
+    Returns:
+        list: (INSTRUCTION, arguments) tuples, with the instruction upper-cased
+    """
+    with open(dockerfile, 'rt') as f:
+        lines = f.read().splitlines()
+
+    escape = '\\'
+    # Parser directives are only honoured before the first instruction
+    for line in lines:
+        match = re.match(r"^\s*#\s*escape\s*=\s*(\S)\s*$", line, re.IGNORECASE)
+        if match:
+            escape = match.group(1)
+            break
+        if line.strip() and not line.strip().startswith('#'):
+            break
+
+    instructions = []
+    current = ''
+    for line in lines:
+        stripped = line.strip()
+        if not current and (not stripped or stripped.startswith('#')):
+            continue
+        if current and stripped.startswith('#'):
+            # Comments are allowed inside a continued instruction
+            continue
+
+        if stripped.endswith(escape):
+            current += stripped[:-1] + ' '
+            continue
+
+        current += stripped
+        if current.strip():
+            parts = current.strip().split(None, 1)
+            instructions.append((parts[0].upper(), parts[1] if len(parts) > 1 else ''))
+        current = ''
+
+    if current.strip():
+        parts = current.strip().split(None, 1)
+        instructions.append((parts[0].upper(), parts[1] if len(parts) > 1 else ''))
+
+    return instructions
+
+
+def get_parent_images(dockerfile: str) -> typing.List[str]:
+    """Method to get the images a Dockerfile builds from
+
+    References to earlier build stages (FROM <stage>) are not included.
+
+    Args:
+        dockerfile(str): Path to the Dockerfile
+
+    Returns:
+        list: Image references in the order they appear
+    """
+    parents = []
+    stages = set()
+    for instruction, arguments in parse_dockerfile(dockerfile):
+        if instruction != 'FROM':
+            continue
+        tokens = [t for t in arguments.split() if not t.startswith('--')]
+        if not tokens:
+            continue
+
+        image = tokens[0]
+        if image.lower() not in stages and image not in parents:
+            parents.append(image)
+        if len(tokens) >= 3 and tokens[1].lower() == 'as':
+            stages.add(tokens[2].lower())
+
+    return parents
+
+
+def split_image_reference(image: str) -> typing.Tuple[str, typing.Optional[str]]:
+    """Method to split an image reference into its repository and tag (or digest)
+
+    Args:
+        image(str): e.g. gigantum/python3-minimal:latest
+
+    Returns:
+        tuple: repository, tag (None if not specified)
+    """
+    if '@' in image:
+        repository, digest = image.split('@', 1)
+        return repository, digest
+
+    # A colon after the last slash separates the tag, anything before it may be a registry port
+    last_part = image.rsplit('/', 1)[-1]
+    if ':' in last_part:
+        repository, tag = image.rsplit(':', 1)
+        return repository, tag
+    return image, None
@@ -17,19 +17,30 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import hashlib
+import json
+import os
+import time
 import typing
-import docker
-
-from docker.errors import NotFound
 
+# docker is imported where it's used, since gtmlib.common loads this module for the lightweight helpers too
 from gtmlib.common import get_docker_client
+from gtmlib.common.cache import get_cache_dir, write_atomic
+
+# Labels set on the volumes of a NodeVolumePool
+POOL_LABEL = 'io.gigantum.gtm.node-pool'
+LOCKFILE_HASH_LABEL = 'io.gigantum.gtm.lockfile-hash'
+
+# Files that determine the contents of node_modules
+NODE_LOCK_FILES = ['package.json', 'yarn.lock']
 
 
 class DockerVolume(object):
     """Class to manage docker volumes used within the build system
     """
-    def __init__(self, volume_name: str, client=None) -> None:
+    def __init__(self, volume_name: str, client=None, labels: typing.Optional[typing.Dict[str, str]] = None) -> None:
         self.volume_name = volume_name
+        self.labels = labels or dict()
 
         if not client:
             self.client = get_docker_client()
@@ -42,6 +53,8 @@ class DockerVolume(object):
         Returns:
             bool
         """
+        from docker.errors import NotFound
+
         try:
             self.client.volumes.get(self.volume_name)
             return True
@@ -54,7 +67,16 @@ class DockerVolume(object):
         Returns:
             None
         """
-        self.client.volumes.create(self.volume_name)
+        self.client.volumes.create(self.volume_name, labels=self.labels)
+
+    def get_labels(self) -> typing.Dict[str, str]:
+        """Get the labels of the existing volume
+
+        Returns:
+            dict
+        """
+        volume = self.client.volumes.get(self.volume_name)
+        return volume.attrs.get('Labels') or dict()
 
     def remove(self) -> None:
         """Remove the volume
@@ -64,3 +86,138 @@ class DockerVolume(object):
         """
         volume = self.client.volumes.get(self.volume_name)
         volume.remove()
+
+
+class NodeVolumePool(object):
+    """Class to manage a pool of node_modules volumes keyed by a hash of package.json and yarn.lock
+
+    A build mounts the volume matching its lock files, so packages are only installed when they change. Volume labels
+    record the pool and the hash. Since labels can't be updated, when each volume was last used and whether its
+    install finished is kept in .gtm-cache/node-volumes.json. Only the `keep` most recently used volumes are kept.
+    """
+    def __init__(self, prefix: str, keep: int = 3, client=None) -> None:
+        """Constructor
+
+        Args:
+            prefix(str): Name of the pool, used as the prefix of the volume names
+            keep(int): Number of volumes to keep
+            client: Docker client, defaults to the shared client
+        """
+        self.prefix = prefix
+        self.keep = keep
+        if not client:
+            client = get_docker_client()
+        self.client = client
+
+    @property
+    def state_file(self) -> str:
+        return os.path.join(get_cache_dir(), 'node-volumes.json')
+
+    def _load_state(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        try:
+            with open(self.state_file, 'rt') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def _update_state(self, volume_name: str, **values) -> None:
+        state = self._load_state()
+        if values:
+            state.setdefault(volume_name, dict()).update(values)
+        else:
+            state.pop(volume_name, None)
+        write_atomic(self.state_file, json.dumps(state, indent=2, sort_keys=True).encode())
+
+    @staticmethod
+    def get_key(package_dir: str) -> str:
+        """Method to hash the files that determine the contents of node_modules
+
+        Args:
+            package_dir(str): Directory containing package.json and yarn.lock
+
+        Returns:
+            str
+        """
+        h = hashlib.sha256()
+        for name in NODE_LOCK_FILES:
+            h.update(name.encode() + b'\0')
+            path = os.path.join(package_dir, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+            h.update(b'\0')
+        return h.hexdigest()[:16]
+
+    def get_volume(self, key: str) -> DockerVolume:
+        """Method to get the pool volume for a key, which may not exist yet
+
+        Args:
+            key(str): Hash of the lock files
+
+        Returns:
+            DockerVolume
+        """
+        return DockerVolume("{}_{}".format(self.prefix, key), client=self.client,
+                            labels={POOL_LABEL: self.prefix, LOCKFILE_HASH_LABEL: key})
+
+    def acquire(self, key: str, fresh: bool = False) -> typing.Tuple[DockerVolume, bool]:
+        """Method to get (or create) the volume for a key and mark it as used
+
+        Args:
+            key(str): Hash of the lock files
+            fresh(bool): flag indicating if an existing volume should be replaced by an empty one
+
+        Returns:
+            tuple: the volume, and True if its packages are already installed
+        """
+        volume = self.get_volume(key)
+        exists = volume.exists()
+        if exists and fresh:
+            volume.remove()
+            exists = False
+        if not exists:
+            volume.create()
+
+        installed = exists and self._load_state().get(volume.volume_name, dict()).get('installed', False)
+        self._update_state(volume.volume_name, key=key, last_used=time.time(), installed=installed)
+        self.evict(current=volume.volume_name)
+        return volume, installed
+
+    def mark_installed(self, volume: DockerVolume) -> None:
+        """Method to record that the packages have been installed into a volume
+
+        Args:
+            volume(DockerVolume): Volume returned by acquire
+
+        Returns:
+            None
+        """
+        self._update_state(volume.volume_name, installed=True, last_used=time.time())
+
+    def evict(self, current: typing.Optional[str] = None) -> typing.List[str]:
+        """Method to remove the least recently used volumes of the pool beyond `keep`
+
+        Volumes that are in use by a container are skipped.
+
+        Args:
+            current(str): Name of a volume that is never removed
+
+        Returns:
+            list: names of the removed volumes
+        """
+        from docker.errors import APIError
+
+        state = self._load_state()
+        volumes = self.client.volumes.list(filters={'label': '{}={}'.format(POOL_LABEL, self.prefix)})
+        candidates = sorted([v for v in volumes if v.name != current],
+                            key=lambda v: state.get(v.name, dict()).get('last_used', 0), reverse=True)
+
+        removed = list()
+        for volume in candidates[max(0, self.keep - (1 if current else 0)):]:
+            try:
+                volume.remove()
+            except APIError:
+                continue
+            self._update_state(volume.name)
+            removed.append(volume.name)
+        return removed
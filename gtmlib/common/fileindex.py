@@ -0,0 +1,155 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import json
+import os
+import stat
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from gtmlib.common.cache import file_lock, get_cache_dir, write_atomic
+
+# Files modified this recently may still change within the same mtime, so their hash isn't trusted next time
+RACY_SECONDS = 2.0
+
+
+class FileIndex(object):
+    """Class to cache content hashes of the files under a directory, keyed by their stat information
+
+    Like the git index, a file whose mtime, size and inode are unchanged is assumed unchanged and its hash is reused.
+    Only new or modified files are read, on a pool of threads. The index is stored in the gtm cache directory, and
+    saving merges this instance's changes into the file on disk, so concurrent builds sharing an index keep each
+    other's hashes.
+    """
+    def __init__(self, root: str, index_file: str = None, jobs: int = 8) -> None:
+        """Constructor
+
+        Args:
+            root(str): Directory the paths are relative to
+            index_file(str): Path to the index, defaults to one per root in .gtm-cache/file-index
+            jobs(int): Number of threads used to hash changed files
+        """
+        self.root = os.path.abspath(root)
+        if not index_file:
+            name = hashlib.sha1(self.root.encode()).hexdigest()[:16]
+            index_file = os.path.join(get_cache_dir('file-index'), '{}.json'.format(name))
+        self.index_file = index_file
+        self.jobs = jobs
+        self.entries = self._load()
+        self.changed = []  # type: typing.List[str]
+        # Entries set (or removed, as None) since the index was loaded
+        self._updates = {}  # type: typing.Dict[str, typing.Optional[typing.List[typing.Any]]]
+
+    def _load(self) -> typing.Dict[str, typing.List[typing.Any]]:
+        try:
+            with open(self.index_file, 'rt') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('root') != self.root:
+            return {}
+        return data.get('entries', {})
+
+    def save(self) -> None:
+        """Method to write the index, merged with entries saved by others since it was loaded"""
+        with file_lock(self.index_file + '.lock'):
+            entries = self._load()
+            for rel_path, entry in self._updates.items():
+                if entry is None:
+                    entries.pop(rel_path, None)
+                else:
+                    entries[rel_path] = entry
+            data = {'root': self.root, 'entries': entries}
+            write_atomic(self.index_file, json.dumps(data, sort_keys=True).encode())
+
+        self.entries = entries
+        self._updates = {}
+
+    @staticmethod
+    def _stat_key(st: os.stat_result) -> typing.List[int]:
+        return [st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode]
+
+    def _hash_file(self, rel_path: str) -> str:
+        """Method to hash one file's content (or a symlink's target path)"""
+        full_path = os.path.join(self.root, rel_path)
+        h = hashlib.sha256()
+        if os.path.islink(full_path):
+            h.update(os.readlink(full_path).encode())
+        else:
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def hash_files(self, rel_paths: typing.List[str]) -> typing.Dict[str, str]:
+        """Method to get the content hashes of files, re-hashing only those that changed
+
+        Args:
+            rel_paths(list): Paths relative to the root. Missing files are left out of the result
+
+        Returns:
+            dict: path -> sha256 hex digest
+        """
+        stats = {}
+        for rel_path in rel_paths:
+            try:
+                stats[rel_path] = os.lstat(os.path.join(self.root, rel_path))
+            except FileNotFoundError:
+                continue
+
+        hashes = {}
+        self.changed = []
+        for rel_path, st in stats.items():
+            entry = self.entries.get(rel_path)
+            if entry and entry[:4] == self._stat_key(st):
+                hashes[rel_path] = entry[4]
+            else:
+                self.changed.append(rel_path)
+
+        if self.changed:
+            with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as pool:
+                for rel_path, digest in zip(self.changed, pool.map(self._hash_file, self.changed)):
+                    hashes[rel_path] = digest
+
+            now = time.time()
+            for rel_path in self.changed:
+                st = stats[rel_path]
+                if now - st.st_mtime > RACY_SECONDS:
+                    self._updates[rel_path] = self._stat_key(st) + [hashes[rel_path]]
+                else:
+                    self._updates[rel_path] = None
+            self.save()
+
+        return hashes
+
+    def is_executable(self, rel_path: str) -> bool:
+        """Method to check the executable bit recorded for a file
+
+        Args:
+            rel_path(str): Path relative to the root
+
+        Returns:
+            bool
+        """
+        entry = self.entries.get(rel_path)
+        if entry:
+            return bool(entry[3] & stat.S_IXUSR)
+        return os.access(os.path.join(self.root, rel_path), os.X_OK)
@@ -0,0 +1,116 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+import typing
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class FileWatcher(object):
+    """Class to block until a file may have changed
+
+    On Linux this waits on inotify events for the file's directory, so it also wakes when the file is rotated
+    (renamed, deleted or re-created). Elsewhere, or if inotify is unavailable, it falls back to sleeping for a short
+    poll interval.
+    """
+    def __init__(self, path: str, poll_interval: float = 0.25, max_wait: float = 5.0) -> None:
+        """Constructor
+
+        Args:
+            path(str): File to watch
+            poll_interval(float): Seconds to sleep per wait when polling
+            max_wait(float): Upper bound on a single inotify wait, as a safety net for missed events
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._fd = None  # type: typing.Optional[int]
+
+        if sys.platform.startswith('linux'):
+            try:
+                self._fd = self._init_inotify(os.path.dirname(os.path.abspath(path)))
+            except (OSError, AttributeError):
+                self._fd = None
+
+    @staticmethod
+    def _init_inotify(directory: str) -> int:
+        """Method to create an inotify instance watching a directory
+
+        Returns:
+            int: inotify file descriptor
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        if libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, "inotify_add_watch failed")
+        return fd
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def wait(self, timeout: typing.Optional[float] = None) -> None:
+        """Method to block until the watched file may have changed, or the timeout expires
+
+        Args:
+            timeout(float): Maximum seconds to wait
+
+        Returns:
+            None
+        """
+        if self._fd is None:
+            time.sleep(self.poll_interval if timeout is None else min(timeout, self.poll_interval))
+            return
+
+        timeout = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            # Drain the queued events. Any event in the directory is treated as a possible change.
+            try:
+                while os.read(self._fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
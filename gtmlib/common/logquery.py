@@ -0,0 +1,281 @@
+import bisect
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import typing
+
+from gtmlib.common.logreader import LOG_PATH, format_record
+
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+# Timestamps are pulled out of the raw bytes, so only records that pass every cheap check get a json.loads
+_TIMESTAMP_RE = re.compile(rb'"asctime":\s*"([^"]+)"')
+_TIMESTAMP_FORMATS = ["%Y-%m-%d %H:%M:%S,%f", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S.%f",
+                      "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+
+def parse_timestamp(value: str) -> typing.Optional[float]:
+    """Method to convert a log or command line timestamp to seconds since the epoch
+
+    Times of day without a date (e.g. 14:02) are taken to be today.
+
+    Args:
+        value(str): Timestamp string
+
+    Returns:
+        float, or None if the value cannot be parsed
+    """
+    value = value.strip()
+    if re.match(r"^\d{1,2}:\d{2}(:\d{2})?$", value):
+        if value.count(":") == 1:
+            value += ":00"
+        value = f"{datetime.date.today()} {value}"
+
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def _record_timestamp(line: bytes) -> typing.Optional[float]:
+    """Helper to get a record's timestamp without decoding the record"""
+    match = _TIMESTAMP_RE.search(line)
+    if not match:
+        return None
+    return parse_timestamp(match.group(1).decode('utf-8', errors='replace'))
+
+
+class LogIndex(object):
+    """Sparse offset index for a JSON log, stored in a sidecar file next to the log
+
+    A checkpoint (offset of a record start, timestamp of that record) is kept roughly every `interval` bytes. The index
+    is extended incrementally as the log grows, and rebuilt if the log is rotated or truncated.
+    """
+    VERSION = 1
+
+    def __init__(self, logpath: str, interval: int = 256 * 1024) -> None:
+        self.logpath = logpath
+        self.index_path = logpath + '.idx'
+        self.interval = interval
+        self.offsets = []  # type: typing.List[int]
+        self.timestamps = []  # type: typing.List[float]
+        self._indexed_size = 0
+        self._next_target = 0
+
+    @staticmethod
+    def _fingerprint(mm: mmap.mmap, inode: int) -> str:
+        return f"{inode}:{hashlib.sha1(mm[:256]).hexdigest()}"
+
+    def _load(self, fingerprint: str, size: int) -> None:
+        try:
+            with open(self.index_path, 'rt') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') != self.VERSION or data.get('fingerprint') != fingerprint or \
+                data.get('interval') != self.interval or data.get('indexed_size', 0) > size:
+            return
+
+        self.offsets = [c[0] for c in data['checkpoints']]
+        self.timestamps = [c[1] for c in data['checkpoints']]
+        self._indexed_size = data['indexed_size']
+        self._next_target = data['next_target']
+
+    def _save(self, fingerprint: str) -> None:
+        data = {'version': self.VERSION, 'fingerprint': fingerprint, 'interval': self.interval,
+                'indexed_size': self._indexed_size, 'next_target': self._next_target,
+                'checkpoints': [[o, t] for o, t in zip(self.offsets, self.timestamps)]}
+        try:
+            with open(self.index_path, 'wt') as f:
+                json.dump(data, f)
+        except OSError:
+            # Read-only log directory, the in-memory index is still used for this query
+            pass
+
+    def update(self, mm: mmap.mmap, inode: int) -> None:
+        """Method to bring the index up to date with the mapped log
+
+        Only the region added since the last update is visited, one record per checkpoint interval.
+
+        Args:
+            mm(mmap): The mapped log
+            inode(int): The log's inode
+
+        Returns:
+            None
+        """
+        size = len(mm)
+        fingerprint = self._fingerprint(mm, inode)
+        self._load(fingerprint, size)
+        if self._indexed_size == size:
+            return
+
+        while self._next_target < size:
+            # Find the first record starting at or after the target
+            start = 0 if self._next_target == 0 else mm.find(b'\n', self._next_target - 1) + 1
+            if start <= 0 and self._next_target != 0:
+                break
+
+            # Use the first complete record with a timestamp
+            pos = start
+            timestamp = None
+            while timestamp is None:
+                end = mm.find(b'\n', pos)
+                if end == -1:
+                    break
+                timestamp = _record_timestamp(mm[pos:end])
+                if timestamp is None:
+                    pos = end + 1
+            if timestamp is None:
+                # Reached the incomplete tail, try again next time
+                break
+
+            self.offsets.append(pos)
+            self.timestamps.append(timestamp)
+            self._next_target = max(pos + 1, start + self.interval)
+
+        self._indexed_size = size
+        self._save(fingerprint)
+
+    def start_offset(self, since: float) -> int:
+        """Method to get an offset at or before the first record logged at or after `since`
+
+        Returns:
+            int
+        """
+        position = bisect.bisect_left(self.timestamps, since)
+        return self.offsets[position - 1] if position > 0 else 0
+
+    def end_offset(self, until: float) -> typing.Optional[int]:
+        """Method to get an offset after the last record logged at or before `until`
+
+        Several processes write the log, so timestamps are only roughly in order. The scan continues through the whole
+        block that starts past `until`, which catches records written slightly out of order around it.
+
+        Returns:
+            int, or None if the scan has to continue to the end of the log
+        """
+        position = bisect.bisect_right(self.timestamps, until)
+        return self.offsets[position + 1] if position + 1 < len(self.offsets) else None
+
+
+def query_records(logpath: str, since: typing.Optional[float] = None, until: typing.Optional[float] = None,
+                  level: typing.Optional[str] = None, filename: typing.Optional[str] = None,
+                  func: typing.Optional[str] = None) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """Method to find the records of a JSON log matching a time range and field filters
+
+    Args:
+        logpath(str): Log file
+        since(float): Earliest timestamp (epoch seconds)
+        until(float): Latest timestamp (epoch seconds)
+        level(str): Minimum level, e.g. WARNING
+        filename(str): Only records logged from this file
+        func(str): Only records logged from this function
+
+    Returns:
+        iterator of decoded records
+    """
+    levels = None
+    if level:
+        level = level.upper()
+        if level not in LEVELS:
+            raise ValueError(f"Unsupported level `{level}`. Use one of {', '.join(LEVELS)}")
+        levels = set(LEVELS[LEVELS.index(level):])
+
+    # Substrings every matching record must contain, checked before decoding
+    required = [json.dumps(x).encode() for x in (filename, func) if x]
+    level_needles = [json.dumps(x).encode() for x in levels] if levels else []
+
+    with open(logpath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            stop = len(mm)
+            if since is not None or until is not None:
+                index = LogIndex(logpath)
+                index.update(mm, os.fstat(f.fileno()).st_ino)
+                if since is not None:
+                    start = index.start_offset(since)
+                if until is not None:
+                    stop = index.end_offset(until) or stop
+
+            size = len(mm)
+            pos = start
+            while pos < stop:
+                end = mm.find(b'\n', pos)
+                if end == -1:
+                    end = size
+                line = mm[pos:end]
+                pos = end + 1
+
+                if since is not None or until is not None:
+                    timestamp = _record_timestamp(line)
+                    if timestamp is None:
+                        continue
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        # Not the end yet, a record written slightly earlier by another process may follow
+                        continue
+
+                if any(needle not in line for needle in required):
+                    continue
+                if level_needles and not any(needle in line for needle in level_needles):
+                    continue
+
+                try:
+                    record = json.loads(line.decode('utf-8', errors='replace'))
+                except ValueError:
+                    continue
+
+                if levels and record.get('levelname') not in levels:
+                    continue
+                if filename and record.get('filename') != filename:
+                    continue
+                if func and record.get('funcName') != func:
+                    continue
+                yield record
+
+
+def show_log_query(since: typing.Optional[str] = None, until: typing.Optional[str] = None,
+                   level: typing.Optional[str] = None, filename: typing.Optional[str] = None,
+                   func: typing.Optional[str] = None) -> None:
+    """Helper method to print the gigantum log records matching a query
+
+    Args:
+        since(str): Earliest time, e.g. "14:02" or "2018-07-25 14:02"
+        until(str): Latest time
+        level(str): Minimum level
+        filename(str): Source file name
+        func(str): Function name
+
+    Returns:
+        None
+    """
+    times = {}
+    for name, value in (('since', since), ('until', until)):
+        if value:
+            times[name] = parse_timestamp(value)
+            if times[name] is None:
+                raise ValueError(f"Could not parse --{name} value `{value}`")
+
+    count = 0
+    batch = []
+    for record in query_records(os.path.expanduser(LOG_PATH), since=times.get('since'), until=times.get('until'),
+                                level=level, filename=filename, func=func):
+        batch.append(format_record(record))
+        count += 1
+        if len(batch) >= 1000:
+            sys.stdout.write("\n".join(batch) + "\n")
+            batch = []
+    if batch:
+        sys.stdout.write("\n".join(batch) + "\n")
+    print(f"Matched {count} records.")
@@ -1,23 +1,176 @@
 import json
 import io
 import os
-import time
+import sys
+import typing
 
+from gtmlib.common.filewatch import FileWatcher
 
-def show_log():
-    """Helper method to show the gigantum log cleanly"""
-    ffwd = 0
-    logpath = os.path.expanduser('~/gigantum/.labmanager/logs/labmanager.log')
 
-    with io.open(logpath, buffering=1) as f:
-        while f.readline() != "":
-            ffwd += 1
-        print(f"Skipped {ffwd} records.")
+LOG_PATH = '~/gigantum/.labmanager/logs/labmanager.log'
+
+
+def format_record(d: typing.Dict[str, typing.Any]) -> str:
+    """Helper to format a decoded log record for display"""
+    return f"{d.get('levelname')} -- {d.get('filename')}::{d.get('funcName')}.{d.get('lineno')} -- {d.get('message')}"
+
+
+def _format_record(line: bytes) -> str:
+    """Helper to format a single JSON log record for display"""
+    return format_record(json.loads(line.decode('utf-8', errors='replace')))
+
+
+def seek_tail(f: io.BufferedReader, lines: int = 0, block_size: int = 65536) -> int:
+    """Position a binary file at the start of its last `lines` records without reading the rest of the file
+
+    The file is scanned backwards a block at a time, so the cost depends on `lines`, not on the size of the log.
+
+    Args:
+        f(BufferedReader): Log file opened in binary mode
+        lines(int): Number of trailing records to keep. 0 seeks to the end
+        block_size(int): Bytes to read per step of the reverse scan
+
+    Returns:
+        int: Offset of the first record that will be read
+    """
+    end = f.seek(0, os.SEEK_END)
+    if lines <= 0 or end == 0:
+        return end
+
+    # A trailing newline terminates the last record rather than starting a new one
+    f.seek(end - 1)
+    newlines_needed = lines + 1 if f.read(1) == b'\n' else lines
+
+    pos = end
+    while pos > 0:
+        read_size = min(block_size, pos)
+        pos -= read_size
+        f.seek(pos)
+        block = f.read(read_size)
+
+        idx = len(block)
+        while True:
+            idx = block.rfind(b'\n', 0, idx)
+            if idx == -1:
+                break
+            newlines_needed -= 1
+            if newlines_needed == 0:
+                return f.seek(pos + idx + 1)
+
+    # Fewer records than requested, show them all
+    return f.seek(0)
+
+
+class LogFollower(object):
+    """Class to follow a log file like `tail -F`
+
+    Records are returned in batches of complete lines. Truncation (the file shrinking) and rotation (the path pointing
+    at a new inode) are detected, and a rotated file is drained before switching to its replacement so no records are
+    lost.
+    """
+    def __init__(self, logpath: str, lines: int = 0, poll_interval: float = 0.25,
+                 read_size: int = 1 << 20) -> None:
+        """Constructor
+
+        Args:
+            logpath(str): Log file to follow
+            lines(int): Number of existing records to return before new ones
+            poll_interval(float): Seconds between checks when inotify is unavailable
+            read_size(int): Maximum bytes read per batch
+        """
+        self.logpath = logpath
+        self.read_size = read_size
+        self.rotations = 0
+        self._file = open(logpath, 'rb')
+        self._partial = b''
+        self.skipped = seek_tail(self._file, lines)
+        self._watcher = FileWatcher(logpath, poll_interval=poll_interval)
+
+    def _read_records(self) -> typing.List[bytes]:
+        """Read the complete records currently available in the open file"""
+        data = self._file.read(self.read_size)
+        if not data:
+            return []
+
+        data = self._partial + data
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        return data[:end].splitlines()
+
+    def read_batch(self) -> typing.List[bytes]:
+        """Method to read the records available now, without blocking
+
+        Returns:
+            list: Raw record lines (without newlines)
+        """
+        records = self._read_records()
+        if records:
+            return records
+
+        try:
+            path_stat = os.stat(self.logpath)
+        except FileNotFoundError:
+            # Mid-rotation, the new file hasn't been created yet
+            return []
+
+        if path_stat.st_ino != os.fstat(self._file.fileno()).st_ino:
+            # Rotated. Catch anything written to the old file after the last read, then switch.
+            records = self._read_records()
+            if self._partial:
+                records.append(self._partial)
+            self._file.close()
+            self._file = open(self.logpath, 'rb')
+            self._partial = b''
+            self.rotations += 1
+            return records + self._read_records()
+
+        if path_stat.st_size < self._file.tell():
+            # Truncated in place, start over from the beginning
+            self._file.seek(0)
+            self._partial = b''
+            return self._read_records()
+
+        return []
+
+    def wait(self, timeout: typing.Optional[float] = None) -> None:
+        """Method to block until the log may have changed"""
+        self._watcher.wait(timeout)
+
+    def __iter__(self) -> typing.Iterator[typing.List[bytes]]:
         while True:
-            l = f.readline()
-            if l:
-                d = json.loads(l)
-                print(f"{d.get('levelname')} -- {d.get('filename')}::{d.get('funcName')}.{d.get('lineno')} -- {d.get('message')}")
+            batch = self.read_batch()
+            if batch:
+                yield batch
             else:
-                time.sleep(2)
+                self.wait()
+
+    def close(self) -> None:
+        self._watcher.close()
+        self._file.close()
+
+
+def show_log(lines: int = 0):
+    """Helper method to show the gigantum log cleanly
+
+    Args:
+        lines(int): Number of existing records to show before following, like `tail -n`
+    """
+    follower = LogFollower(os.path.expanduser(LOG_PATH), lines=lines)
+    print(f"Skipped {follower.skipped / 1e6:.1f} MB of earlier records.", flush=True)
 
+    try:
+        for batch in follower:
+            # Write each batch in one call instead of a print per record
+            formatted = []
+            for line in batch:
+                if not line.strip():
+                    continue
+                try:
+                    formatted.append(_format_record(line))
+                except ValueError:
+                    formatted.append(line.decode('utf-8', errors='replace'))
+            if formatted:
+                sys.stdout.write("\n".join(formatted) + "\n")
+                sys.stdout.flush()
+    finally:
+        follower.close()
@@ -0,0 +1,204 @@
+import collections
+import glob
+import gzip
+import heapq
+import json
+import os
+import re
+import typing
+
+from gtmlib.common.logreader import LOG_PATH
+
+ERROR_LEVELS = ('ERROR', 'CRITICAL')
+
+
+class LogStats(object):
+    """Class to aggregate statistics over a stream of log records in bounded memory
+
+    Sources are tracked with the Space-Saving heavy hitters algorithm, so at most `capacity` counters are kept no matter
+    how many distinct `filename::funcName` values appear. Counts for sources that were evicted and re-added can be
+    over-estimated by at most the reported error. The smallest counter is found through a lazily updated min-heap, so
+    an eviction costs O(log capacity). Per-minute counts are kept for the most recent `max_minutes`.
+    """
+    def __init__(self, capacity: int = 1000, max_minutes: int = 7 * 24 * 60) -> None:
+        self.capacity = capacity
+        self.max_minutes = max_minutes
+
+        self.records = 0
+        self.invalid = 0
+        self.levels = collections.Counter()  # type: typing.Counter[str]
+        self._sources = {}  # type: typing.Dict[str, typing.List[int]]
+        # One (count, source) entry per tracked source. Counts are only refreshed when the entry reaches the top.
+        self._heap = []  # type: typing.List[typing.Tuple[int, str]]
+        self._minutes = collections.OrderedDict()  # type: typing.Dict[str, typing.List[int]]
+
+    def _add_source(self, source: str) -> None:
+        counter = self._sources.get(source)
+        if counter is not None:
+            counter[0] += 1
+        elif len(self._sources) < self.capacity:
+            self._sources[source] = [1, 0]
+            heapq.heappush(self._heap, (1, source))
+        else:
+            # Heap counts never exceed the real ones, so an up-to-date top entry is the smallest counter
+            count, smallest = self._heap[0]
+            while self._sources[smallest][0] != count:
+                heapq.heapreplace(self._heap, (self._sources[smallest][0], smallest))
+                count, smallest = self._heap[0]
+
+            # Replace the smallest counter, inheriting its count as the error bound
+            del self._sources[smallest]
+            self._sources[source] = [count + 1, count]
+            heapq.heapreplace(self._heap, (count + 1, source))
+
+    def _add_minute(self, minute: str, is_error: bool) -> None:
+        counts = self._minutes.get(minute)
+        if counts is None:
+            counts = self._minutes[minute] = [0, 0]
+            if len(self._minutes) > self.max_minutes:
+                self._minutes.popitem(last=False)
+        counts[0] += 1
+        if is_error:
+            counts[1] += 1
+
+    def add(self, record: typing.Dict[str, typing.Any]) -> None:
+        """Method to add a decoded record
+
+        Args:
+            record(dict): Log record
+
+        Returns:
+            None
+        """
+        self.records += 1
+        level = record.get('levelname')
+        self.levels[level] += 1
+        self._add_source(f"{record.get('filename')}::{record.get('funcName')}")
+
+        timestamp = record.get('asctime')
+        if timestamp:
+            # "YYYY-MM-DD HH:MM" prefix, no parsing needed
+            self._add_minute(str(timestamp)[:16], level in ERROR_LEVELS)
+
+    def add_line(self, line: bytes) -> None:
+        """Method to add a raw JSON line, counting it as invalid if it cannot be decoded"""
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line.decode('utf-8', errors='replace'))
+        except ValueError:
+            self.invalid += 1
+            return
+        if isinstance(record, dict):
+            self.add(record)
+        else:
+            self.invalid += 1
+
+    def top_sources(self, n: int = 10) -> typing.List[typing.Tuple[str, int, int]]:
+        """Method to get the most frequent sources
+
+        Returns:
+            list: (source, count, maximum over-count) tuples
+        """
+        ranked = sorted(self._sources.items(), key=lambda x: x[1][0], reverse=True)[:n]
+        return [(source, counts[0], counts[1]) for source, counts in ranked]
+
+    def error_minutes(self) -> typing.List[typing.Tuple[str, int, int]]:
+        """Method to get the per-minute record and error counts, oldest first
+
+        Returns:
+            list: (minute, records, errors) tuples
+        """
+        return [(minute, counts[0], counts[1]) for minute, counts in self._minutes.items()]
+
+    def report(self, top: int = 10) -> str:
+        """Method to format the statistics for display
+
+        Args:
+            top(int): Number of sources and peak minutes to show
+
+        Returns:
+            str
+        """
+        lines = [f"Records: {self.records} ({self.invalid} unparseable)", "", "Records per level:"]
+        for level, count in self.levels.most_common():
+            lines.append(f"  {str(level):<10} {count:>10}  {100 * count / max(self.records, 1):5.1f}%")
+
+        lines += ["", f"Top {top} sources:"]
+        for source, count, error in self.top_sources(top):
+            bound = f" (+/- {error})" if error else ""
+            lines.append(f"  {count:>10}{bound}  {source}")
+
+        minutes = self.error_minutes()
+        if minutes:
+            total_errors = sum([m[2] for m in minutes])
+            lines += ["", f"Errors per minute: {total_errors / len(minutes):.2f} average over {len(minutes)} minutes",
+                      "Peak error minutes:"]
+            peaks = sorted([m for m in minutes if m[2]], key=lambda m: m[2], reverse=True)[:top]
+            for minute, count, errors in peaks:
+                lines.append(f"  {minute}  {errors:>6} errors / {count:>6} records ({100 * errors / count:5.1f}%)")
+
+        return "\n".join(lines)
+
+
+def find_log_files(logpath: str) -> typing.List[str]:
+    """Method to find a log and its rotated (optionally gzip compressed) predecessors, oldest first
+
+    Args:
+        logpath(str): Path of the live log
+
+    Returns:
+        list
+    """
+    def rotation_number(path: str) -> int:
+        match = re.match(r"^\.(\d+)(\.gz)?$", path[len(logpath):])
+        return int(match.group(1)) if match else -1
+
+    rotated = [p for p in glob.glob(glob.escape(logpath) + ".*") if rotation_number(p) >= 0]
+    files = sorted(rotated, key=rotation_number, reverse=True)
+    if os.path.exists(logpath):
+        files.append(logpath)
+    return files
+
+
+def iter_log_lines(path: str) -> typing.Iterator[bytes]:
+    """Method to stream the raw lines of a plain or gzip compressed log
+
+    For a live log only the bytes present when reading started are streamed.
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            yield from f
+    else:
+        with open(path, 'rb') as f:
+            remaining = os.fstat(f.fileno()).st_size
+            for line in f:
+                remaining -= len(line)
+                if remaining < 0:
+                    break
+                yield line
+
+
+def show_log_stats(top: int = 10, paths: typing.Optional[typing.List[str]] = None) -> None:
+    """Helper method to print statistics for the gigantum log and its rotated files
+
+    Args:
+        top(int): Number of sources and peak minutes to show
+        paths(list): Log files to read. Defaults to the client log and its rotations
+
+    Returns:
+        None
+    """
+    if not paths:
+        paths = find_log_files(os.path.expanduser(LOG_PATH))
+    if not paths:
+        raise ValueError("No log files found")
+
+    stats = LogStats()
+    for path in paths:
+        print(f"Reading {path}")
+        for line in iter_log_lines(path):
+            stats.add_line(line)
+
+    print("")
+    print(stats.report(top=top))
@@ -0,0 +1,151 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import gzip
+import io
+import os
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    # Optional, .br variants are only written if it is installed
+    brotli = None
+
+# File types worth compressing. Images and fonts other than svg are already compressed
+COMPRESSIBLE_EXTENSIONS = ['.css', '.html', '.js', '.json', '.map', '.svg', '.txt', '.xml']
+
+# Files smaller than this fit in a packet or two, so compressing them doesn't help
+MIN_SIZE = 1024
+
+
+def _gzip(data: bytes) -> bytes:
+    # Fixed mtime, so identical input gives identical output and docker layers stay cached
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=11)
+
+
+def get_encoders() -> typing.Dict[str, typing.Callable[[bytes], bytes]]:
+    """Method to get the available encoders, by the extension of the files they write
+
+    Returns:
+        dict
+    """
+    encoders = {'.gz': _gzip}
+    if brotli is not None:
+        encoders['.br'] = _brotli
+    return encoders
+
+
+def _compress_file(path: str, encoders: typing.Dict[str, typing.Callable[[bytes], bytes]]) -> typing.Dict[str, int]:
+    """Method to write the compressed variants of a file next to it
+
+    A variant newer than the file is reused. A variant that isn't smaller than the file is not kept, so nginx serves
+    the original.
+
+    Args:
+        path(str): File to compress
+        encoders(dict): Extension -> encoder
+
+    Returns:
+        dict: size of the file (`original`) and of each kept variant by extension
+    """
+    st = os.stat(path)
+    sizes = {'original': st.st_size}
+    data = None
+    for extension, encode in encoders.items():
+        variant = path + extension
+        if os.path.isfile(variant) and os.stat(variant).st_mtime >= st.st_mtime:
+            sizes[extension] = os.path.getsize(variant)
+            continue
+
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = encode(data)
+        if len(compressed) < len(data):
+            with open(variant, 'wb') as f:
+                f.write(compressed)
+            sizes[extension] = len(compressed)
+        elif os.path.exists(variant):
+            os.remove(variant)
+    return sizes
+
+
+def precompress_directory(root: str, min_size: int = MIN_SIZE, jobs: int = 8) -> typing.Dict[str, typing.Any]:
+    """Method to write .gz (and .br if brotli is installed) variants of the static files in a directory
+
+    nginx serves the variants with `gzip_static`, so nothing is compressed per request.
+
+    Args:
+        root(str): Directory to compress, e.g. the compiled frontend
+        min_size(int): Smallest file to compress
+        jobs(int): Number of threads used to compress files
+
+    Returns:
+        dict: per-file sizes under `files`, and totals under `original` and each variant extension
+    """
+    encoders = get_encoders()
+    paths = list()
+    for current, _, file_names in os.walk(root):
+        for name in sorted(file_names):
+            path = os.path.join(current, name)
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and os.path.getsize(path) >= min_size:
+                paths.append(path)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        sizes = list(pool.map(lambda p: _compress_file(p, encoders), paths))
+
+    report = {'files': dict(), 'original': 0}  # type: typing.Dict[str, typing.Any]
+    for extension in encoders:
+        report[extension] = 0
+    for path, file_sizes in zip(paths, sizes):
+        report['files'][os.path.relpath(path, root)] = file_sizes
+        report['original'] += file_sizes['original']
+        for extension in encoders:
+            # Files whose variant was not kept are served uncompressed
+            report[extension] += file_sizes.get(extension, file_sizes['original'])
+    return report
+
+
+def format_report(report: typing.Dict[str, typing.Any]) -> str:
+    """Method to describe the bytes saved by each variant
+
+    Args:
+        report(dict): Result of precompress_directory
+
+    Returns:
+        str
+    """
+    lines = ["Precompressed {} files, {:.1f} KB".format(len(report['files']), report['original'] / 1024)]
+    for extension in ['.gz', '.br']:
+        if extension not in report:
+            continue
+        saved = report['original'] - report[extension]
+        percent = 100.0 * saved / report['original'] if report['original'] else 0.0
+        lines.append("  {}: {:.1f} KB, {:.1f} KB saved ({:.0f}%)".format(extension, report[extension] / 1024,
+                                                                         saved / 1024, percent))
+    return "\n".join(lines)
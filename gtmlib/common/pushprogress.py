@@ -0,0 +1,120 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import threading
+import time
+import typing
+
+
+class PushProgress(object):
+    """Class to aggregate the progress of several concurrent image pushes into one per-layer view
+
+    Layers are keyed by their id, so a layer shared by several images is only counted once. Layers the registry
+    already had (or mounted from another repository) are reported as skipped bytes.
+    """
+    def __init__(self, total_images: int, interval: float = 2.0,
+                 output: typing.Callable[[str], None] = print) -> None:
+        """Constructor
+
+        Args:
+            total_images(int): Number of images being pushed
+            interval(float): Minimum seconds between printed summaries
+            output(callable): Function used to print summaries
+        """
+        self.total_images = total_images
+        self.interval = interval
+        self.output = output
+
+        self.layers = {}  # type: typing.Dict[str, typing.Dict[str, typing.Any]]
+        self.digests = {}  # type: typing.Dict[str, str]
+        self.running = set()  # type: typing.Set[str]
+        self.finished = 0
+        self._lock = threading.Lock()
+        self._last_print = 0.0
+
+    def start(self, image: str) -> None:
+        with self._lock:
+            self.running.add(image)
+
+    def finish(self, image: str) -> None:
+        with self._lock:
+            self.running.discard(image)
+            self.finished += 1
+        self.print_summary(force=True)
+
+    def update(self, image: str, event: typing.Dict[str, typing.Any]) -> None:
+        """Method to record one decoded push stream event
+
+        Args:
+            image(str): Image the event belongs to
+            event(dict): Decoded push stream message
+
+        Returns:
+            None
+        """
+        with self._lock:
+            aux = event.get('aux')
+            if isinstance(aux, dict) and aux.get('Digest'):
+                self.digests[image] = aux['Digest']
+
+            layer_id = event.get('id')
+            status = event.get('status', '')
+            if not layer_id or not status or ' ' in layer_id:
+                return
+
+            layer = self.layers.setdefault(layer_id, {'current': 0, 'total': 0, 'state': 'waiting'})
+            detail = event.get('progressDetail') or {}
+            if status == 'Pushing' and detail.get('total'):
+                layer['state'] = 'pushing'
+                layer['total'] = max(layer['total'], detail['total'])
+                layer['current'] = max(layer['current'], detail.get('current', 0))
+            elif status == 'Pushed':
+                layer['state'] = 'pushed'
+                layer['current'] = layer['total']
+            elif status == 'Layer already exists' or status.startswith('Mounted from'):
+                # Don't downgrade a layer this run uploaded for another image
+                if layer['state'] != 'pushed':
+                    layer['state'] = 'skipped'
+
+        self.print_summary()
+
+    def summary(self) -> str:
+        """Method to format the aggregated progress
+
+        Returns:
+            str
+        """
+        with self._lock:
+            states = [layer['state'] for layer in self.layers.values()]
+            uploaded = sum([layer['current'] for layer in self.layers.values() if layer['state'] != 'skipped'])
+            total = sum([layer['total'] for layer in self.layers.values() if layer['state'] != 'skipped'])
+            return ("[push] images: {} running, {}/{} done | layers: {} pushed, {} uploading, {} already in registry, "
+                    "{} waiting | {:.1f}/{:.1f} MB".format(len(self.running), self.finished, self.total_images,
+                                                           states.count('pushed'), states.count('pushing'),
+                                                           states.count('skipped'), states.count('waiting'),
+                                                           uploaded / 1e6, total / 1e6))
+
+    def print_summary(self, force: bool = False) -> None:
+        """Method to print the summary, at most once per interval unless forced"""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_print < self.interval:
+                return
+            self._last_print = now
+        self.output(self.summary())
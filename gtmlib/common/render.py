@@ -0,0 +1,415 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import datetime
+import os
+import re
+import typing
+
+import yaml
+
+# Written into the rendered config and replaced by the last layer of the image, see Dockerfile_labmanager
+BUILD_DATE_PLACEHOLDER = '@BUILD_DATE@'
+BUILD_REVISION_PLACEHOLDER = '@BUILD_REVISION@'
+
+# Paths of the UI that must always be revalidated: the app shell and the service worker, for offline-first updates
+UI_NO_CACHE_PATHS = ['/index.html', '/service-worker.js', '/sw.js']
+
+# Compiled assets with a content hash in their name, which never change
+UI_HASHED_ASSET_PATTERN = r'\.[0-9a-f]{8,}\.(?:chunk\.)?(?:css|js|svg|png|jpe?g|gif|ico|woff2?|ttf|eot)(?:\.map)?$'
+
+# Default performance profiles, which the `performance` section of a config override can change or extend
+PERFORMANCE_PROFILES = {'laptop': {'uwsgi_processes': 4, 'uwsgi_threads': 2, 'uwsgi_listen': 128,
+                                   'rq_workers': 8, 'redis_maxmemory': '512mb', 'redis_tcp_backlog': 128,
+                                   'nginx_uwsgi_buffer_size': '8k',
+                                   'nginx_uwsgi_buffers': '8 16k', 'nginx_uwsgi_busy_buffers_size': '32k',
+                                   'nginx_client_body_buffer_size': '1m'},
+                        'workstation': {'uwsgi_processes': 6, 'uwsgi_threads': 2, 'uwsgi_listen': 256,
+                                        'rq_workers': 15, 'redis_maxmemory': '2gb', 'redis_tcp_backlog': 511,
+                                        'nginx_uwsgi_buffer_size': '16k',
+                                        'nginx_uwsgi_buffers': '16 16k', 'nginx_uwsgi_busy_buffers_size': '32k',
+                                        'nginx_client_body_buffer_size': '8m'},
+                        'server': {'uwsgi_processes': 10, 'uwsgi_threads': 4, 'uwsgi_listen': 1024,
+                                   'rq_workers': 25, 'redis_maxmemory': '4gb', 'redis_tcp_backlog': 1024,
+                                   'nginx_uwsgi_buffer_size': '16k',
+                                   'nginx_uwsgi_buffers': '32 16k', 'nginx_uwsgi_busy_buffers_size': '64k',
+                                   'nginx_client_body_buffer_size': '16m'}}
+
+# Profiles picked by `auto`, the first one whose CPU count or memory (GB) limit the host does not exceed
+AUTO_PROFILE_LIMITS = [('laptop', 4, 8), ('workstation', 16, 32)]
+AUTO_PROFILE_FALLBACK = 'server'
+
+# Environment variables the supervisor configs read each profile setting from, e.g. %(ENV_GTM_UWSGI_PROCESSES)s
+PROFILE_ENV_VARS = {'uwsgi_processes': 'GTM_UWSGI_PROCESSES',
+                    'uwsgi_threads': 'GTM_UWSGI_THREADS',
+                    'uwsgi_listen': 'GTM_UWSGI_LISTEN',
+                    'rq_workers': 'GTM_RQ_WORKERS',
+                    'redis_maxmemory': 'GTM_REDIS_MAXMEMORY',
+                    'redis_tcp_backlog': 'GTM_REDIS_TCP_BACKLOG'}
+
+# Profile settings rendered into the nginx API config, one file per profile that the entrypoint links into place
+NGINX_API_SETTINGS = ['nginx_uwsgi_buffer_size', 'nginx_uwsgi_buffers', 'nginx_uwsgi_busy_buffers_size',
+                      'nginx_client_body_buffer_size']
+
+
+def render_config(base_config_file: str, override_config_file: str) -> typing.Tuple[str, typing.Dict[str, typing.Any]]:
+    """Method to merge a config override into the default LabManager config
+
+    The output only depends on the two input files. Build metadata (date and revision) is left as placeholders that
+    the final image layer fills in, so the file and every layer after the one that copies it stay cached between builds.
+
+    Args:
+        base_config_file(str): Default config, e.g. labmanager.yaml.default
+        override_config_file(str): Override config
+
+    Returns:
+        tuple: rendered YAML text, merged config data
+    """
+    with open(base_config_file, "rt") as cf:
+        base_data = yaml.safe_load(cf)
+    with open(override_config_file, "rt") as cf:
+        overwrite_data = yaml.safe_load(cf)
+
+    # Merge sub-sections together
+    for key in base_data:
+        if key in overwrite_data:
+            base_data[key].update(overwrite_data[key])
+
+    # Add Build Info
+    base_data['build_info'] = {'application': "LabManager",
+                               'built_on': BUILD_DATE_PLACEHOLDER,
+                               'revision': BUILD_REVISION_PLACEHOLDER}
+
+    return yaml.safe_dump(base_data, default_flow_style=False), base_data
+
+
+def render_supervisor(base_supervisor_file: str, config: typing.Dict[str, typing.Any]) -> str:
+    """Method to add the configurable-http-proxy program to a supervisor config
+
+    Args:
+        base_supervisor_file(str): Supervisor config to extend
+        config(dict): Merged LabManager config, for the proxy ports
+
+    Returns:
+        str
+    """
+    with open(base_supervisor_file, 'rt') as source:
+        supervisor_data = source.read()
+
+    ext_proxy_port = config['proxy']["external_proxy_port"]
+    api_port = config['proxy']['api_port']
+
+    return f"""{supervisor_data}\n\n
+[program:chp]
+command=configurable-http-proxy --ip=0.0.0.0 --port={ext_proxy_port} --api-port={api_port} --default-target='http://localhost:10002'
+autostart=true
+autorestart=true
+priority=0"""
+
+
+def render_nginx_ui(port: int = 10002, root: str = '/var/www/') -> str:
+    """Method to render the nginx config that serves the compiled frontend
+
+    The .gz files written by precompress_directory are served with `gzip_static`. Hashed assets are cached forever
+    and the paths in UI_NO_CACHE_PATHS are never cached.
+
+    Args:
+        port(int): Port to listen on
+        root(str): Directory of the compiled frontend in the image
+
+    Returns:
+        str
+    """
+    no_cache = "\n".join(["""
+  location = {} {{
+    add_header Cache-Control "no-cache";
+    expires off;
+    access_log off;
+  }}""".format(path) for path in UI_NO_CACHE_PATHS])
+
+    return f"""server {{
+  listen {port};
+  client_max_body_size 100m;
+  server_name localhost;
+  keepalive_timeout 60;
+  root {root};
+
+  # Serve the .gz variants written at build time instead of compressing each response
+  gzip_static on;
+  gzip_vary on;
+
+  # Always serve index.html for any request
+  location / {{
+    try_files $uri /index.html;
+  }}
+
+  # Files with a content hash in their name never change
+  location ~* "{UI_HASHED_ASSET_PATTERN}" {{
+    add_header Cache-Control "public, max-age=31536000, immutable";
+    access_log off;
+  }}
+
+  # Do not cache the app shell or service worker, required for offline-first updates{no_cache}
+}}
+"""
+
+
+def render_nginx_api(settings: typing.Dict[str, typing.Any], port: int = 10001,
+                     socket: str = '/tmp/labmanager.sock', uwsgi_params: str = 'uwsgi_params') -> str:
+    """Method to render the nginx config that proxies the API to uwsgi, for one performance profile
+
+    Request bodies up to `nginx_client_body_buffer_size` stay in memory and larger labbook uploads are written to a
+    temp file, instead of every request reserving a fixed 64 MB buffer. Responses are buffered in
+    `nginx_uwsgi_buffers`, so a uwsgi worker is released as soon as it has written a response to nginx.
+
+    Args:
+        settings(dict): Profile settings, see PERFORMANCE_PROFILES
+        port(int): Port to listen on
+        socket(str): uwsgi socket
+        uwsgi_params(str): uwsgi_params file to include
+
+    Returns:
+        str
+    """
+    return f"""server {{
+  listen {port};
+  server_name localhost;
+
+  # Larger request bodies (e.g. labbook uploads) are buffered in a temp file
+  client_body_buffer_size {settings['nginx_client_body_buffer_size']};
+  client_header_buffer_size 1k;
+  client_max_body_size 100m;
+  large_client_header_buffers 4 4k;
+
+  client_header_timeout 300s;
+  client_body_timeout 300s;
+  send_timeout 300s;
+  keepalive_timeout 60;
+
+  location / {{
+      include {uwsgi_params};
+      uwsgi_read_timeout 300s;
+      uwsgi_send_timeout 300s;
+      uwsgi_connect_timeout 60;
+
+      uwsgi_buffering on;
+      uwsgi_buffer_size {settings['nginx_uwsgi_buffer_size']};
+      uwsgi_buffers {settings['nginx_uwsgi_buffers']};
+      uwsgi_busy_buffers_size {settings['nginx_uwsgi_busy_buffers_size']};
+      uwsgi_pass unix://{socket};
+  }}
+}}
+"""
+
+
+def render_nginx_api_profiles(override_config_file: str) -> typing.Dict[str, str]:
+    """Method to render the nginx API config of every performance profile
+
+    Args:
+        override_config_file(str): Config override
+
+    Returns:
+        dict: file name (<profile>.conf) -> config
+    """
+    _, profiles = get_performance_profiles(override_config_file)
+    return {"{}.conf".format(name): render_nginx_api(settings) for name, settings in profiles.items()}
+
+
+def _parse_nginx_size(value: typing.Any) -> int:
+    """Method to convert an nginx size (e.g. 16k or 8m) to bytes, raising ValueError if it isn't one"""
+    match = re.match(r'^([0-9]+)([kKmM]?)$', str(value))
+    if not match:
+        raise ValueError("Invalid nginx size `{}`".format(value))
+    return int(match.group(1)) * {'': 1, 'k': 1024, 'm': 1024 ** 2}[match.group(2).lower()]
+
+
+def _check_nginx_api_settings(name: str, settings: typing.Dict[str, typing.Any]) -> None:
+    """Method to check a profile's nginx buffer settings with the same rules nginx applies when it starts
+
+    Args:
+        name(str): Profile name, for the error message
+        settings(dict): Profile settings
+
+    Returns:
+        None
+    """
+    try:
+        buffer_size = _parse_nginx_size(settings['nginx_uwsgi_buffer_size'])
+        busy_buffers_size = _parse_nginx_size(settings['nginx_uwsgi_busy_buffers_size'])
+        _parse_nginx_size(settings['nginx_client_body_buffer_size'])
+        buffers = str(settings['nginx_uwsgi_buffers']).split()
+        if len(buffers) != 2 or not buffers[0].isdigit():
+            raise ValueError("Invalid uwsgi_buffers `{}`, expected `<number> <size>`".format(
+                settings['nginx_uwsgi_buffers']))
+        num_buffers, buffers_size = int(buffers[0]), _parse_nginx_size(buffers[1])
+
+        if num_buffers < 2:
+            raise ValueError("uwsgi_buffers needs at least 2 buffers")
+        if busy_buffers_size < max(buffer_size, buffers_size):
+            raise ValueError("uwsgi_busy_buffers_size must be at least uwsgi_buffer_size and one of uwsgi_buffers")
+        if busy_buffers_size > (num_buffers - 1) * buffers_size:
+            raise ValueError("uwsgi_busy_buffers_size must be less than all uwsgi_buffers minus one buffer")
+    except ValueError as e:
+        raise ValueError("Invalid nginx settings in performance profile `{}`: {}".format(name, e))
+
+
+def get_performance_profiles(override_config_file: str) -> typing.Tuple[str, typing.Dict[str, typing.Dict[str,
+                                                                                                   typing.Any]]]:
+    """Method to load the performance profiles, merging the `performance` section of a config override into the defaults
+
+    The section selects a profile (`auto` by default) and may change settings of the built-in profiles or add new ones:
+
+        performance:
+          profile: workstation
+          profiles:
+            workstation:
+              rq_workers: 20
+
+    Args:
+        override_config_file(str): Config override
+
+    Returns:
+        tuple: selected profile name, dict of profile name -> settings
+    """
+    with open(override_config_file, "rt") as cf:
+        performance = (yaml.safe_load(cf) or dict()).get('performance') or dict()
+
+    profiles = {name: dict(settings) for name, settings in PERFORMANCE_PROFILES.items()}
+    for name, settings in (performance.get('profiles') or dict()).items():
+        if not re.match(r'^[a-z0-9_-]+$', name) or name == 'auto':
+            raise ValueError("Invalid performance profile name `{}`".format(name))
+        unknown = set(settings) - set(PROFILE_ENV_VARS) - set(NGINX_API_SETTINGS)
+        if unknown:
+            raise ValueError("Unknown setting(s) in performance profile `{}`: {}".format(name,
+                                                                                        ", ".join(sorted(unknown))))
+        profiles.setdefault(name, dict(PERFORMANCE_PROFILES['workstation'])).update(settings)
+        _check_nginx_api_settings(name, profiles[name])
+
+    profile = performance.get('profile', 'auto')
+    if profile != 'auto' and profile not in profiles:
+        raise ValueError("Unknown performance profile `{}`".format(profile))
+
+    return profile, profiles
+
+
+def render_performance_profiles(override_config_file: str) -> str:
+    """Method to render the shell script the container entrypoint sources to apply a performance profile
+
+    The script exports the settings of the profile selected in the config override as the environment variables in
+    PROFILE_ENV_VARS, which supervisor passes to uwsgi, the rq workers and redis. GTM_PERFORMANCE_PROFILE overrides the
+    selection when the container starts. `auto` picks a profile from the CPU and memory limits of the container's
+    cgroup (v2 `cpu.max`/`memory.max`, or the v1 CFS quota and `memory.limit_in_bytes`), falling back to the CPU count
+    and memory of the host when no limit is set. Listen backlogs are capped at net.core.somaxconn, since uwsgi won't
+    start with a larger one.
+
+    Args:
+        override_config_file(str): Config override
+
+    Returns:
+        str
+    """
+    profile, profiles = get_performance_profiles(override_config_file)
+
+    lines = ["# Generated by gtm from the `performance` section of the config override, do not edit",
+             'GTM_PERFORMANCE_PROFILE="${{GTM_PERFORMANCE_PROFILE:-{}}}"'.format(profile),
+             'if [ "$GTM_PERFORMANCE_PROFILE" = "auto" ]; then',
+             '    GTM_CGROUP_ROOT="${GTM_CGROUP_ROOT:-/sys/fs/cgroup}"',
+             '    GTM_CPUS=$(nproc)',
+             "    GTM_MEMORY_KB=$(awk '/MemTotal/ {print $2}' /proc/meminfo)",
+             '    if [ -r "$GTM_CGROUP_ROOT/cpu.max" ]; then',
+             '        read GTM_CPU_QUOTA GTM_CPU_PERIOD < "$GTM_CGROUP_ROOT/cpu.max"',
+             '    elif [ -r "$GTM_CGROUP_ROOT/cpu/cpu.cfs_quota_us" ]; then',
+             '        GTM_CPU_QUOTA=$(cat "$GTM_CGROUP_ROOT/cpu/cpu.cfs_quota_us")',
+             '        GTM_CPU_PERIOD=$(cat "$GTM_CGROUP_ROOT/cpu/cpu.cfs_period_us")',
+             '    fi',
+             '    if [ -n "$GTM_CPU_QUOTA" ] && [ "$GTM_CPU_QUOTA" != "max" ] && [ "$GTM_CPU_QUOTA" -gt 0 ]; then',
+             '        GTM_CPU_LIMIT=$(( (GTM_CPU_QUOTA + GTM_CPU_PERIOD - 1) / GTM_CPU_PERIOD ))',
+             '        [ "$GTM_CPU_LIMIT" -lt "$GTM_CPUS" ] && GTM_CPUS=$GTM_CPU_LIMIT',
+             '    fi',
+             '    if [ -r "$GTM_CGROUP_ROOT/memory.max" ]; then',
+             '        GTM_MEMORY_LIMIT=$(cat "$GTM_CGROUP_ROOT/memory.max")',
+             '    elif [ -r "$GTM_CGROUP_ROOT/memory/memory.limit_in_bytes" ]; then',
+             '        GTM_MEMORY_LIMIT=$(cat "$GTM_CGROUP_ROOT/memory/memory.limit_in_bytes")',
+             '    fi',
+             '    if [ -n "$GTM_MEMORY_LIMIT" ] && [ "$GTM_MEMORY_LIMIT" != "max" ] && '
+             '[ $(( GTM_MEMORY_LIMIT / 1024 )) -lt "$GTM_MEMORY_KB" ]; then',
+             '        GTM_MEMORY_KB=$(( GTM_MEMORY_LIMIT / 1024 ))',
+             '    fi',
+             '    GTM_MEMORY_GB=$(( GTM_MEMORY_KB / 1048576 ))']
+    for index, (name, cpus, memory_gb) in enumerate(AUTO_PROFILE_LIMITS):
+        lines.append('    {} [ "$GTM_CPUS" -le {} ] || [ "$GTM_MEMORY_GB" -lt {} ]; then'.format(
+            'if' if index == 0 else 'elif', cpus, memory_gb))
+        lines.append('        GTM_PERFORMANCE_PROFILE={}'.format(name))
+    lines.extend(['    else',
+                  '        GTM_PERFORMANCE_PROFILE={}'.format(AUTO_PROFILE_FALLBACK),
+                  '    fi',
+                  'fi',
+                  '',
+                  'case "$GTM_PERFORMANCE_PROFILE" in'])
+    for name in sorted(profiles):
+        lines.append('    {})'.format(name))
+        for setting, env_var in sorted(PROFILE_ENV_VARS.items()):
+            lines.append('        export {}={}'.format(env_var, profiles[name][setting]))
+        lines.append('        ;;')
+    lines.extend(['    *)',
+                  '        echo "Unknown performance profile: $GTM_PERFORMANCE_PROFILE"',
+                  '        exit 1',
+                  '        ;;',
+                  'esac',
+                  '',
+                  'GTM_SOMAXCONN=$(cat /proc/sys/net/core/somaxconn 2>/dev/null || echo 128)',
+                  '[ "$GTM_UWSGI_LISTEN" -gt "$GTM_SOMAXCONN" ] && export GTM_UWSGI_LISTEN=$GTM_SOMAXCONN',
+                  '[ "$GTM_REDIS_TCP_BACKLOG" -gt "$GTM_SOMAXCONN" ] && export GTM_REDIS_TCP_BACKLOG=$GTM_SOMAXCONN',
+                  'export GTM_PERFORMANCE_PROFILE',
+                  'echo "Performance profile: $GTM_PERFORMANCE_PROFILE ($GTM_UWSGI_PROCESSES uwsgi processes,'
+                  ' $GTM_RQ_WORKERS rq workers)"',
+                  ''])
+    return "\n".join(lines)
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """Method to write a file only if its content would change, so its mtime and the docker cache are preserved
+
+    Args:
+        path(str): File to write
+        text(str): New content
+
+    Returns:
+        bool: True if the file was written
+    """
+    if os.path.isfile(path):
+        with open(path, 'rt') as f:
+            if f.read() == text:
+                return False
+
+    with open(path, 'wt') as f:
+        f.write(text)
+    return True
+
+
+def get_build_info(revision: str) -> typing.Dict[str, str]:
+    """Method to get the volatile build metadata
+
+    Args:
+        revision(str): gtm commit hash
+
+    Returns:
+        dict: build args for the final image layer
+    """
+    return {'BUILD_DATE': str(datetime.datetime.utcnow()), 'BUILD_REVISION': revision}
@@ -24,7 +24,6 @@ import uuid
 import shutil
 import zipfile
 import subprocess
-import datetime
 import time
 import typing
 
@@ -32,7 +31,9 @@ import docker
 from docker.errors import NotFound
 import yaml
 
-from gtmlib.common import ask_question, dockerize_windows_path, get_docker_client, DockerVolume
+from gtmlib.common import ask_question, dockerize_windows_path, DockerVolume
+from gtmlib.common.dockervolume import NodeVolumePool
+from gtmlib.common.render import get_build_info, render_config, render_supervisor, write_if_changed
 from gtmlib.labmanager.build import LabManagerBuilder
 
 
@@ -56,9 +57,13 @@ class LabManagerDevBuilder(LabManagerBuilder):
         else:
             self.dkr_vol_path = self.ui_app_dir
 
-        self.docker_client = get_docker_client()
         self.share_volume = DockerVolume("labmanager_share_vol", client=self.docker_client)
-        self.node_volume = DockerVolume("labmanager_dev_node_build_vol", client=self.docker_client)
+        self.node_volume_pool = NodeVolumePool("labmanager_dev_node_build_vol", client=self.docker_client)
+
+    @property
+    def node_volume(self) -> DockerVolume:
+        """The node_modules volume matching the current package.json and yarn.lock"""
+        return self.node_volume_pool.get_volume(NodeVolumePool.get_key(self.ui_app_dir))
 
     def _generate_image_name(self) -> str:
         """Method to generate a name for the Docker Image
@@ -102,42 +107,13 @@ class LabManagerDevBuilder(LabManagerBuilder):
                                              'labmanager-config-override.yaml')
         final_config_file = os.path.join(self.docker_build_dir, 'developer_resources', 'labmanager-config.yaml')
 
-        with open(base_config_file, "rt") as cf:
-            base_data = yaml.load(cf)
-        with open(overwrite_config_file, "rt") as cf:
-            overwrite_data = yaml.load(cf)
-
-        # Merge sub-sections together
-        for key in base_data:
-            if key in overwrite_data:
-                base_data[key].update(overwrite_data[key])
-
-        # Add Build Info
-        base_data['build_info'] = {'application': "LabManager",
-                                   'built_on': str(datetime.datetime.utcnow()),
-                                   'revision': self._get_current_commit_hash()}
-
-        # Write out updated config file
-        with open(final_config_file, "wt") as cf:
-            cf.write(yaml.dump(base_data, default_flow_style=False))
-
-            # Write final supervisor file to set CHP parameters
-            base_supervisor = os.path.join(self.docker_build_dir, "developer_resources", 'supervisord.conf')
-            final_supervisor = os.path.join(self.docker_build_dir, "developer_resources", 'supervisord-configured.conf')
-
-            with open(base_supervisor, 'rt') as source:
-                with open(final_supervisor, 'wt') as dest:
-                    supervisor_data = source.read()
+        config_text, base_data = render_config(base_config_file, overwrite_config_file)
+        write_if_changed(final_config_file, config_text)
 
-                    ext_proxy_port = base_data['proxy']["external_proxy_port"]
-                    api_port = base_data['proxy']['api_port']
-
-                    dest.write(f"""{supervisor_data}\n\n
-[program:chp]
-command=configurable-http-proxy --ip=0.0.0.0 --port={ext_proxy_port} --api-port={api_port} --default-target='http://localhost:10002'
-autostart=true
-autorestart=true
-priority=0""")
+        # Write final supervisor file to set CHP parameters
+        base_supervisor = os.path.join(self.docker_build_dir, "developer_resources", 'supervisord.conf')
+        final_supervisor = os.path.join(self.docker_build_dir, "developer_resources", 'supervisord-configured.conf')
+        write_if_changed(final_supervisor, render_supervisor(base_supervisor, base_data))
 
     @staticmethod
     def _get_docker_run_env_vars() -> typing.Dict[str, typing.Any]:
@@ -195,68 +171,15 @@ priority=0""")
             relay_container.stop(timeout=10)
             relay_container.remove()
 
-    def build_image(self, show_output: bool=False, no_cache: bool=False) -> None:
-        """Method to build the LabManager Dev Docker Image
+    def _install_node_packages(self, show_output: bool = False) -> bool:
+        """Method to run `yarn install` into the node_build volume
+
+        Args:
+            show_output(bool): flag indicating if the install output should be printed
 
         Returns:
-            None
+            bool: True if the install succeeded
         """
-        # Check if image exists
-        named_image = "{}:{}".format(self.image_name, self.get_image_tag())
-        if self.image_exists(named_image):
-            if ask_question("\nImage `{}` already exists. Do you wish to rebuild it?".format(named_image)):
-                # Image found. Make sure container isn't running.
-                self.prune_container(named_image)
-                pass
-            else:
-                # User said no
-                raise ValueError("User aborted build due to duplicate image name.")
-
-        # Check if the share volume exists
-        if not self.share_volume.exists():
-            self.share_volume.create()
-
-        # Check if the node_build volume exists
-        if self.node_volume.exists():
-            # If the node_modules volume exists, check if you want to rebuild
-            reinstall_node = ask_question("\nDo you wish to re-install node packages from scratch?")
-
-            if reinstall_node:
-                # Re-create the node_volume so it is empty
-                self.node_volume.remove()
-                self.node_volume.create()
-        else:
-            self.node_volume.create()
-
-        # Delete node_packages directory because it hoses docker file share on mac
-        self._remove_node_modules()
-
-        # Build LabManager container
-        # Write updated config file
-        self._generate_config_file()
-
-        # Image Labels
-        labels = {'io.gigantum.app': 'labmanager-dev',
-                  'io.gigantum.maintainer.email': 'hello@gigantum.io'}
-
-        # Build image
-        print(" - Building LabManager image `{}`, please wait...".format(self.image_name))
-        if show_output:
-            [print("    - {}".format(ln[list(ln.keys())[0]]),
-                   end='') for ln in self.docker_client.api.build(path=self.docker_build_dir,
-                                                                  dockerfile='Dockerfile_developer',
-                                                                  tag=named_image,
-                                                                  labels=labels, nocache=no_cache,
-                                                                  pull=True, rm=True,
-                                                                  decode=True)]
-        else:
-            self.docker_client.images.build(path=self.docker_build_dir, dockerfile='Dockerfile_developer',
-                                            tag=named_image, nocache=no_cache,
-                                            pull=True, labels=labels)
-
-        # Tag with `latest` for auto-detection of image on launch
-        self.docker_client.api.tag(named_image, self._generate_image_name(), 'latest')
-
         # Use container to run npm install into the labmanager-ui repo
         print(" - Installing node packages to run UI in debug mode...this may take awhile...")
 
@@ -302,8 +225,68 @@ priority=0""")
 
         # Remove container (to be sure to release the volume)
         build_container.stop()
+        build_container.reload()
+        exit_code = build_container.attrs['State']['ExitCode']
         build_container.remove()
 
+        if exit_code != 0:
+            print(" - Warning: `yarn install` exited with code {}".format(exit_code))
+        return exit_code == 0
+
+    def build_image(self, show_output: bool=False, no_cache: bool=False) -> None:
+        """Method to build the LabManager Dev Docker Image
+
+        Returns:
+            None
+        """
+        # Check the image and the share volume concurrently
+        named_image = "{}:{}".format(self.image_name, self.get_image_tag())
+        (named_image_exists,), (share_volume_exists,) = self._check_build_state([named_image], [self.share_volume])
+
+        if named_image_exists:
+            if ask_question("\nImage `{}` already exists. Do you wish to rebuild it?".format(named_image)):
+                # Image found. Make sure container isn't running.
+                self.prune_container(named_image)
+                pass
+            else:
+                # User said no
+                raise ValueError("User aborted build due to duplicate image name.")
+
+        # Check if the share volume exists
+        if not share_volume_exists:
+            self.share_volume.create()
+
+        # Mount the node_build volume matching package.json and yarn.lock, packages are only installed if it is new
+        node_volume, node_installed = self.node_volume_pool.acquire(NodeVolumePool.get_key(self.ui_app_dir),
+                                                                    fresh=no_cache)
+
+        # Delete node_packages directory because it hoses docker file share on mac
+        self._remove_node_modules()
+
+        # Build LabManager container
+        # Write updated config file
+        self._generate_config_file()
+
+        # Image Labels
+        build_info = get_build_info(self._get_current_commit_hash())
+        labels = {'io.gigantum.app': 'labmanager-dev',
+                  'io.gigantum.maintainer.email': 'hello@gigantum.io',
+                  'io.gigantum.build.date': build_info['BUILD_DATE'],
+                  'io.gigantum.build.revision': build_info['BUILD_REVISION']}
+
+        # Build image
+        print(" - Building LabManager image `{}`, please wait...".format(self.image_name))
+        self._build_or_reuse(self.docker_build_dir, 'Dockerfile_developer', named_image, build_info, labels,
+                             show_output=show_output, no_cache=no_cache, prefix="    - ")
+
+        # Tag with `latest` for auto-detection of image on launch
+        self.docker_client.api.tag(named_image, self._generate_image_name(), 'latest')
+
+        if node_installed:
+            print(" - Node packages unchanged, reusing volume `{}`".format(node_volume.volume_name))
+        elif self._install_node_packages(show_output):
+            self.node_volume_pool.mark_installed(node_volume)
+
         print(" - Copying node modules to host machine...")
         node_container = None
         try:
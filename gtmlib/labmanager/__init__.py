@@ -1,3 +1,4 @@
 from gtmlib.labmanager.build import LabManagerBuilder
+from gtmlib.labmanager.readiness import ReadinessTracker, format_timeline
 from gtmlib.labmanager.run import LabManagerRunner
 from gtmlib.labmanager.test import LabManagerTester
\ No newline at end of file
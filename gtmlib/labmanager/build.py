@@ -17,20 +17,36 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import asyncio
+import hashlib
 import os
 import re
+import typing
 from pkg_resources import resource_filename
 import platform
 import shutil
-import glob
-import datetime
 import sys
 
 from git import Repo
-from docker.errors import ImageNotFound, NotFound, APIError
-import yaml
+from docker.errors import ImageNotFound, NotFound, APIError, ContainerError
 
 from gtmlib.common import ask_question, dockerize_windows_path, get_docker_client, DockerVolume
+from gtmlib.common.buildcontext import get_build_context
+from gtmlib.common.buildmanifest import BuildManifest, hash_build_context, resolve_parent_digests
+from gtmlib.common.buildstream import run_build
+from gtmlib.common.cache import get_cache_dir
+from gtmlib.common.dircache import DirectoryCache
+from gtmlib.common.dirsync import publish_directory, sync_directory
+from gtmlib.common.dockerasync import AsyncDockerClient, get_registry_auth_header, run_async
+from gtmlib.common.dockervolume import NodeVolumePool
+from gtmlib.common.fileindex import FileIndex
+from gtmlib.common.precompress import format_report, precompress_directory
+from gtmlib.common.render import get_build_info, render_config, render_nginx_api_profiles, render_nginx_ui, \
+    render_performance_profiles, render_supervisor, write_if_changed
+from gtmlib.wheelhouse import WheelhouseBuilder
+
+# Paths in labmanager-ui that are not copied into the frontend build workspace
+UI_WORKSPACE_EXCLUDES = ['build', 'node_modules', '*/node_modules', '.git', '*/.git']
 
 
 class LabManagerBuilder(object):
@@ -43,7 +59,9 @@ class LabManagerBuilder(object):
         self._ui_build_image_name = "gigantum/labmanager-ui-builder"
         self.docker_client = get_docker_client()
 
-        self.node_volume = DockerVolume("labmanager_prod_node_build_vol", client=self.docker_client)
+        self.node_volume_pool = NodeVolumePool("labmanager_prod_node_build_vol", client=self.docker_client)
+        self.ui_bundle_cache = DirectoryCache('ui-bundles')
+        self.manifest = BuildManifest()
 
     def _get_current_commit_hash(self) -> str:
         """Method to get the current commit hash of the gtm repository
@@ -65,17 +83,77 @@ class LabManagerBuilder(object):
         """
         return "gigantum/labmanager"
 
-    def _remove_pyc(self, directory: str) -> None:
-        """Method to remove all pyc files recursively
+    def _measure_import_time(self, image: str) -> typing.Dict[str, typing.Optional[float]]:
+        """Method to measure the cold-start import time of the API (`service:app`) in a new container
+
+        It is measured once with the bytecode compiled into the image and once with it deleted first, which is how
+        each worker started before the image shipped bytecode.
 
         Args:
-            directory(str) Root directory to walk
+            image(str): LabManager image
 
         Returns:
+            dict: seconds `with_bytecode` and `without_bytecode`, None if the import failed
+        """
+        timer = "import time; start = time.perf_counter(); import service; print(time.perf_counter() - start)"
+        site_packages = "$(python3 -c 'import site; print(*site.getsitepackages())')"
+        delete_pyc = "find /opt/labmanager-service-labbook {} -name '*.pyc' -delete 2>/dev/null; ".format(site_packages)
+
+        results = dict()
+        for label, prefix in [('without_bytecode', delete_pyc), ('with_bytecode', '')]:
+            command = '{}cd /opt/labmanager-service-labbook && python3 -B -c "{}"'.format(prefix, timer)
+            try:
+                output = self.docker_client.containers.run(image, ["-c", command], entrypoint="/bin/sh",
+                                                           remove=True, stdout=True, stderr=False)
+                results[label] = float(output.decode().strip().splitlines()[-1])
+            except (APIError, ContainerError, ValueError, IndexError):
+                results[label] = None
+        return results
+
+    def _build_or_reuse(self, docker_build_dir: str, dockerfile: str, named_image: str,
+                        build_info: typing.Dict[str, str], labels: typing.Dict[str, str], show_output: bool = False,
+                        no_cache: bool = False, prefix: str = "") -> None:
+        """Method to build an image from a streamed context, unless the build manifest shows its context is unchanged
+
+        The context is hashed through the FileIndex, so an unchanged context costs a stat per file and is never tarred
+        or sent to the daemon. The build date is left out of the hash, since it changes every build.
+
+        Args:
+            docker_build_dir(str): Build context directory
+            dockerfile(str): Dockerfile name, relative to the context directory
+            named_image(str): Full tag to build
+            build_info(dict): Build args, see get_build_info()
+            labels(dict): Image labels
+            show_output(bool): flag indicating if build output should be printed
+            no_cache(bool): flag indicating if the docker cache (and the manifest) should be ignored
+            prefix(str): Prefix for the build output lines
 
+        Returns:
+            None
         """
-        for filename in glob.glob('{}/**/*.pyc'.format(directory), recursive=True):
-                os.remove(filename)
+        # Python dependencies are installed offline from the wheelhouse
+        wheelhouse = WheelhouseBuilder()
+
+        context_hash = None
+        if not no_cache:
+            dockerfile_path = os.path.join(docker_build_dir, dockerfile)
+            parent_digests = resolve_parent_digests(self.docker_client, dockerfile_path, pull=True)
+            if parent_digests is not None:
+                context_hash = hash_build_context(dockerfile_path, docker_build_dir, parent_digests,
+                                                  build_args={'wheelhouse': wheelhouse.get_key(),
+                                                              'BUILD_REVISION': build_info['BUILD_REVISION']})
+                if self.manifest.reuse(self.docker_client, self.image_name, context_hash, named_image):
+                    print("{}Build context unchanged, reusing last build as {}".format(prefix, named_image))
+                    return
+
+        wheelhouse_dir = wheelhouse.build(verbose=show_output)
+        build_context = get_build_context(docker_build_dir, dockerfile, extra_dirs={'wheelhouse': wheelhouse_dir})
+        run_build(self.docker_client, verbose=show_output, prefix=prefix, **build_context, tag=named_image,
+                  labels=labels, buildargs=build_info, nocache=no_cache, pull=True, rm=True)
+
+        if context_hash:
+            self.manifest.record(self.image_name, context_hash, named_image,
+                                 self.docker_client.images.get(named_image).id)
 
     def get_image_tag(self) -> str:
         """Method to generate a named tag for the Docker Image
@@ -144,6 +222,92 @@ class LabManagerBuilder(object):
         except ImageNotFound:
             return False
 
+    def _check_build_state(self, image_names: typing.List[str],
+                           volumes: typing.List[DockerVolume]) -> typing.Tuple[typing.List[bool], typing.List[bool]]:
+        """Method to check if several images and volumes exist, with all the checks running concurrently
+
+        Args:
+            image_names(list): Images to check
+            volumes(list): Volumes to check
+
+        Returns:
+            tuple: list of image exists flags, list of volume exists flags
+        """
+        try:
+            client = AsyncDockerClient()
+        except ValueError:
+            # Endpoint not supported by the async client (e.g. TLS), check one at a time
+            return [self.image_exists(x) for x in image_names], [v.exists() for v in volumes]
+
+        async def check():
+            return await asyncio.gather(*[client.image_exists(x) for x in image_names],
+                                        *[client.volume_exists(v.volume_name) for v in volumes])
+
+        results = run_async(check())
+        return results[:len(image_names)], results[len(image_names):]
+
+    def _push_tags(self, repository: str, tags: typing.List[str], verbose: bool = False) -> None:
+        """Method to push several tags of a repository at once
+
+        Args:
+            repository(str): Repository to push to, e.g. gigantum/labmanager
+            tags(list): Tags to push
+            verbose(bool): flag indicating if push progress should be printed
+
+        Returns:
+            None
+        """
+        try:
+            client = AsyncDockerClient()
+        except ValueError:
+            # Endpoint not supported by the async client (e.g. TLS), push one tag at a time
+            for tag in tags:
+                for ln in self.docker_client.api.push(repository, tag=tag, stream=True, decode=True):
+                    if 'error' in ln:
+                        raise ValueError(f"Failed to push {repository}:{tag}: {ln['error']}")
+                    if verbose and 'status' in ln:
+                        layer = f"{ln['id']}: " if 'id' in ln else ""
+                        print(f"[{tag}] {layer}{ln['status']}")
+            return
+
+        auth_header = get_registry_auth_header(repository)
+
+        async def push(tag):
+            async for ln in client.push(repository, tag, auth_header=auth_header):
+                if verbose and 'status' in ln:
+                    layer = f"{ln['id']}: " if 'id' in ln else ""
+                    print(f"[{tag}] {layer}{ln['status']}")
+
+        async def push_all():
+            await asyncio.gather(*[push(tag) for tag in tags])
+
+        run_async(push_all())
+
+    def _tag_images(self, source_image: str, repository: str, tags: typing.List[str]) -> None:
+        """Method to apply several tags to an image at once
+
+        Args:
+            source_image(str): Image to tag
+            repository(str): Repository for the new tags
+            tags(list): Tags to apply
+
+        Returns:
+            None
+        """
+        try:
+            client = AsyncDockerClient()
+        except ValueError:
+            # Endpoint not supported by the async client (e.g. TLS), tag one at a time
+            image = self.docker_client.images.get(source_image)
+            for tag in tags:
+                image.tag(repository, tag=tag)
+            return
+
+        async def tag_all():
+            await asyncio.gather(*[client.tag(source_image, repository, tag) for tag in tags])
+
+        run_async(tag_all())
+
     def remove_image(self, image_name: str) -> None:
         """Remove a docker image by name
 
@@ -178,85 +342,71 @@ class LabManagerBuilder(object):
         except NotFound:
             pass
 
-    def build_image(self, show_output: bool=False, no_cache: bool=False, demo: bool=False) -> None:
-        """Method to build the LabManager Docker Image
+    def _get_ui_bundle_key(self, frontend_dir: str) -> str:
+        """Method to compute the cache key of the compiled frontend application
+
+        The key covers every source file of labmanager-ui (node_modules and build output excluded), which includes
+        package.json and yarn.lock, and the id of the frontend build image.
+
+        Args:
+            frontend_dir(str): labmanager-ui directory
 
         Returns:
-            None
+            str
         """
-        self.docker_client = get_docker_client()
-
-        # Check if image exists
-        named_image = "{}:{}".format(self.image_name, self.get_image_tag())
-        if self.image_exists(named_image):
-            if ask_question("Image `{}` already exists. Do you wish to rebuild it?".format(named_image)):
-                # Image found. Make sure container isn't running.
-                self.prune_container(named_image)
-                pass
-            else:
-                # User said no
-                raise ValueError("User aborted build due to duplicate image name.")
+        sources = []
+        for root, dirs, files in os.walk(frontend_dir):
+            excluded = ['node_modules', '.git'] + (['build'] if root == frontend_dir else [])
+            dirs[:] = sorted([d for d in dirs if d not in excluded])
+            sources.extend([os.path.relpath(os.path.join(root, f), frontend_dir) for f in files if f != '.git'])
 
-        # Rebuild front-end image to get latest sw dependencies if desired
-        build_ui_container = True
-        if self.image_exists(self._ui_build_image_name):
-            if ask_question("\nFrontend build container already exists. Do you want to rebuild it?".format(self.image_name)):
-                print("*** Building frontend build image {}, please wait...\n".format(self._ui_build_image_name))
-                # Remove so you can rebuild
-                self.remove_image(self._ui_build_image_name)
-                build_ui_container = True
-            else:
-                build_ui_container = False
+        h = hashlib.sha256()
+        h.update(self.docker_client.images.get(self._ui_build_image_name).id.encode() + b'\0')
+        for rel_path, digest in sorted(FileIndex(frontend_dir).hash_files(sources).items()):
+            h.update('{}\0{}\0'.format(rel_path, digest).encode())
+        return h.hexdigest()[:16]
 
-        # Setup docker volume that will hold the node packages
-        if self.node_volume.exists():
-            if ask_question("\nNode Packages already installed. Do you want to rebuild from scratch?"):
-                print("*** Removing node package install\n")
-                self.node_volume.remove()
-                self.node_volume.create()
-        else:
-            # Create an empty volume
-            self.node_volume.create()
+    def _compile_frontend(self, frontend_dir: str, show_output: bool = False, no_cache: bool = False) -> None:
+        """Method to compile the frontend application into labmanager-ui/build using the frontend build image
 
-        docker_build_dir = os.path.expanduser(resource_filename("gtmlib", "resources"))
-        frontend_dir = os.path.join(docker_build_dir, 'submodules', 'labmanager-ui')
+        node_modules is kept in a volume matching package.json and yarn.lock, so `yarn install` only runs when they
+        change.
 
-        if build_ui_container:
-            # Build frontend image
-            if show_output:
-                [print(ln[list(ln.keys())[0]], end='') for ln in self.docker_client.api.build(path=docker_build_dir,
-                                                                                  dockerfile='Dockerfile_frontend_build',
-                                                                                  tag=self._ui_build_image_name,
-                                                                                  pull=True, rm=True,
-                                                                                  decode=True,
-                                                                                  nocache=no_cache)]
-            else:
-                self.docker_client.images.build(path=docker_build_dir, dockerfile='Dockerfile_frontend_build',
-                                    tag=self._ui_build_image_name, pull=True, rm=True, nocache=no_cache)
+        Args:
+            frontend_dir(str): labmanager-ui directory
+            show_output(bool): flag indicating if the build output should be printed
+            no_cache(bool): flag indicating if node packages should be installed into an empty volume
 
-        # Compile frontend application into gtmlib/resources/frontend_resources/build
+        Returns:
+            None
+        """
+        # Compile frontend application in a persistent workspace, synced from labmanager-ui WITHOUT node packages
         print("\n*** Updating node packages and compiling frontend application...\n\n")
         container_name = self._ui_build_image_name.replace("/", ".")
         self.prune_container(container_name)
 
-        # Copy labmanager-ui to temp dir WITHOUT node packages
-        temp_ui_dir = os.path.join(docker_build_dir, 'frontend_resources', 'build')
-        if os.path.exists(temp_ui_dir):
-            shutil.rmtree(temp_ui_dir)
-        shutil.copytree(frontend_dir, temp_ui_dir + os.path.sep, ignore=shutil.ignore_patterns("node_modules"))
+        workspace_dir = get_cache_dir('ui-workspace')
+        sync_result = sync_directory(frontend_dir, workspace_dir, exclude=UI_WORKSPACE_EXCLUDES)
+        print("*** Synced frontend workspace: {} files copied, {} removed, {} unchanged\n".format(
+            len(sync_result['copied']), len(sync_result['removed']), sync_result['unchanged']))
 
-        if os.path.exists(os.path.join(temp_ui_dir, 'build')):
-            # Remove build dir in root of UI code
-            shutil.rmtree(os.path.join(temp_ui_dir, 'build'))
+        if os.path.exists(os.path.join(workspace_dir, 'build')):
+            # Remove output of a previous failed build
+            shutil.rmtree(os.path.join(workspace_dir, 'build'))
 
         # convert to docker mountable volume name (needed for non-POSIX fs)
         if platform.system() == 'Windows':
-            dkr_vol_path = dockerize_windows_path(temp_ui_dir)
+            dkr_vol_path = dockerize_windows_path(workspace_dir)
         else:
-            dkr_vol_path = temp_ui_dir
+            dkr_vol_path = workspace_dir
+
+        node_volume, node_installed = self.node_volume_pool.acquire(NodeVolumePool.get_key(frontend_dir),
+                                                                    fresh=no_cache)
+        if node_installed:
+            print("*** Node packages unchanged, reusing volume {}\n".format(node_volume.volume_name))
 
         volumes = {dkr_vol_path: {'bind': '/mnt/labmanager-ui', 'mode': 'rw'},
-                   self.node_volume.volume_name: {
+                   node_volume.volume_name: {
                        "bind": '/opt/build_dir/node_modules',
                        'mode': 'rw'}
                    }
@@ -265,6 +415,8 @@ class LabManagerBuilder(object):
             environment_vars = {'WINDOWS_HOST': 1}
         else:
             environment_vars = {'LOCAL_USER_ID': os.getuid()}
+        if node_installed:
+            environment_vars['SKIP_YARN_INSTALL'] = 1
 
         if show_output:
             container = self.docker_client.containers.run(self._ui_build_image_name,
@@ -281,25 +433,87 @@ class LabManagerBuilder(object):
                                               init=True, environment=environment_vars, volumes=volumes)
 
         # Verify build succeeded
-        if not os.path.exists(os.path.join(temp_ui_dir, 'build', 'service-worker.js')):
+        if not os.path.exists(os.path.join(workspace_dir, 'build', 'service-worker.js')):
             print("** Error: Frontend build failed! ***")
             sys.exit(1)
+        self.node_volume_pool.mark_installed(node_volume)
+
+        # Move build dir into submodules/labmanager-ui
+        publish_directory(os.path.join(workspace_dir, 'build'), os.path.join(frontend_dir, 'build'))
+
+    def build_image(self, show_output: bool=False, no_cache: bool=False, demo: bool=False,
+                    measure_import_time: bool=False) -> None:
+        """Method to build the LabManager Docker Image
+
+        Args:
+            show_output(bool): flag indicating if build output should be printed
+            no_cache(bool): flag indicating if the docker cache should be ignored
+            demo(bool): flag indicating if the demo config override should be used
+            measure_import_time(bool): flag indicating if the API's cold-start import time should be measured after
+                                       the build, which runs two extra containers
+
+        Returns:
+            None
+        """
+        # Check the image and the frontend build image concurrently
+        named_image = "{}:{}".format(self.image_name, self.get_image_tag())
+        (named_image_exists, ui_image_exists), _ = self._check_build_state(
+            [named_image, self._ui_build_image_name], [])
+
+        if named_image_exists:
+            if ask_question("Image `{}` already exists. Do you wish to rebuild it?".format(named_image)):
+                # Image found. Make sure container isn't running.
+                self.prune_container(named_image)
+                pass
+            else:
+                # User said no
+                raise ValueError("User aborted build due to duplicate image name.")
+
+        # Rebuild front-end image to get latest sw dependencies if desired
+        build_ui_container = True
+        if ui_image_exists:
+            if ask_question("\nFrontend build container already exists. Do you want to rebuild it?".format(self.image_name)):
+                print("*** Building frontend build image {}, please wait...\n".format(self._ui_build_image_name))
+                # Remove so you can rebuild
+                self.remove_image(self._ui_build_image_name)
+                build_ui_container = True
+            else:
+                build_ui_container = False
 
-        # Copy build dir back to submodules/labmanager-ui
+        docker_build_dir = os.path.expanduser(resource_filename("gtmlib", "resources"))
+        frontend_dir = os.path.join(docker_build_dir, 'submodules', 'labmanager-ui')
+
+        if build_ui_container:
+            # Build frontend image
+            build_context = get_build_context(docker_build_dir, 'Dockerfile_frontend_build')
+            run_build(self.docker_client, verbose=show_output, **build_context, tag=self._ui_build_image_name,
+                      pull=True, rm=True, nocache=no_cache)
+
+        # Reuse the compiled application if the UI sources (including yarn.lock) and the builder image are unchanged
+        ui_bundle_key = self._get_ui_bundle_key(frontend_dir)
+        cached_bundle = None if no_cache else self.ui_bundle_cache.get(ui_bundle_key)
         ui_dest_dir = os.path.join(frontend_dir, 'build')
-        if os.path.exists(ui_dest_dir):
-            shutil.rmtree(ui_dest_dir)
-        shutil.copytree(os.path.join(temp_ui_dir, 'build'), ui_dest_dir)
-        # Clean up temp copy of code
-        shutil.rmtree(temp_ui_dir)
+        if cached_bundle:
+            print("\n*** Frontend application unchanged, restoring cached build {}\n".format(ui_bundle_key))
+            restore_dir = os.path.join(get_cache_dir('ui-workspace'), 'build')
+            if os.path.exists(restore_dir):
+                shutil.rmtree(restore_dir)
+            shutil.copytree(cached_bundle, restore_dir, symlinks=True)
+            publish_directory(restore_dir, ui_dest_dir)
+        else:
+            self._compile_frontend(frontend_dir, show_output, no_cache)
+
+        # Write the .gz (and .br) variants nginx serves with gzip_static
+        print("\n*** {}\n".format(format_report(precompress_directory(ui_dest_dir))))
+        if not cached_bundle:
+            self.ui_bundle_cache.put(ui_bundle_key, ui_dest_dir)
 
-        # Build LabManager container
+        # Build LabManager container. The demo only differs by its config override, which also selects its
+        # performance profile, so both use the same supervisor config
         if demo:
             config_override_name = 'demo-config-override.yaml'
-            supervisor_name = 'supervisord-demo.conf'
         else:
             config_override_name = 'labmanager-config-override.yaml'
-            supervisor_name = 'supervisord-labmanager.conf'
 
         # Write updated config file
         base_config_file = os.path.join(docker_build_dir, "submodules", 'labmanager-common', 'lmcommon',
@@ -307,69 +521,57 @@ class LabManagerBuilder(object):
         overwrite_config_file = os.path.join(docker_build_dir, 'labmanager_resources' ,config_override_name)
         final_config_file = os.path.join(docker_build_dir, 'labmanager_resources', 'labmanager-config.yaml')
 
-        with open(base_config_file, "rt") as cf:
-            base_data = yaml.load(cf)
-        with open(overwrite_config_file, "rt") as cf:
-            overwrite_data = yaml.load(cf)
-
-        # Merge sub-sections together
-        for key in base_data:
-            if key in overwrite_data:
-                base_data[key].update(overwrite_data[key])
-
-        # Add Build Info
-        base_data['build_info'] = {'application': "LabManager",
-                                   'built_on': str(datetime.datetime.utcnow()),
-                                   'revision': self._get_current_commit_hash()}
-
-        # Write out updated config file
-        with open(final_config_file, "wt") as cf:
-            cf.write(yaml.dump(base_data, default_flow_style=False))
+        config_text, base_data = render_config(base_config_file, overwrite_config_file)
+        write_if_changed(final_config_file, config_text)
 
         # Write final supervisor file to set CHP parameters
-        base_supervisor = os.path.join(docker_build_dir, "labmanager_resources", supervisor_name)
+        base_supervisor = os.path.join(docker_build_dir, "labmanager_resources", 'supervisord-labmanager.conf')
         final_supervisor = os.path.join(docker_build_dir, "labmanager_resources", 'supervisord-configured.conf')
+        write_if_changed(final_supervisor, render_supervisor(base_supervisor, base_data))
+
+        # Write the nginx config serving the frontend
+        write_if_changed(os.path.join(docker_build_dir, "labmanager_resources", 'nginx_ui-configured.conf'),
+                         render_nginx_ui())
 
-        with open(base_supervisor, 'rt') as source:
-            with open(final_supervisor, 'wt') as dest:
-                supervisor_data = source.read()
+        # Write the performance profiles the entrypoint applies when the container starts
+        profiles_file = os.path.join(docker_build_dir, "labmanager_resources", 'performance-profiles.sh')
+        write_if_changed(profiles_file, render_performance_profiles(overwrite_config_file))
 
-                ext_proxy_port = base_data['proxy']["external_proxy_port"]
-                api_port = base_data['proxy']['api_port']
+        # Write the nginx API config of each profile, the entrypoint links the one in use
+        nginx_api_dir = os.path.join(docker_build_dir, "labmanager_resources", 'nginx_api-configured')
+        os.makedirs(nginx_api_dir, exist_ok=True)
+        nginx_api_configs = render_nginx_api_profiles(overwrite_config_file)
+        for name in os.listdir(nginx_api_dir):
+            if name not in nginx_api_configs:
+                os.remove(os.path.join(nginx_api_dir, name))
+        for name, text in nginx_api_configs.items():
+            write_if_changed(os.path.join(nginx_api_dir, name), text)
 
-                dest.write(f"""{supervisor_data}\n\n
-[program:chp]
-command=configurable-http-proxy --ip=0.0.0.0 --port={ext_proxy_port} --api-port={api_port} --default-target='http://localhost:10002'
-autostart=true
-autorestart=true
-priority=0""")
+        # Build info changes every build, so it is only set in labels and the last layer of the image
+        build_info = get_build_info(self._get_current_commit_hash())
 
         # Image Labels
         labels = {'io.gigantum.app': 'labmanager',
-                  'io.gigantum.maintainer.email': 'hello@gigantum.io'}
-
-        # Delete .pyc files in case dev tools used on something not ubuntu before building
-        self._remove_pyc(os.path.join(docker_build_dir, "submodules", 'labmanager-common', 'lmcommon'))
-        self._remove_pyc(os.path.join(docker_build_dir, "submodules", 'labmanager-service-labbook', 'lmsrvcore'))
-        self._remove_pyc(os.path.join(docker_build_dir, "submodules", 'labmanager-service-labbook', 'lmsrvlabbook'))
+                  'io.gigantum.maintainer.email': 'hello@gigantum.io',
+                  'io.gigantum.build.date': build_info['BUILD_DATE'],
+                  'io.gigantum.build.revision': build_info['BUILD_REVISION']}
 
         # Build image
         print("\n\n*** Building LabManager image `{}`, please wait...\n\n".format(self.image_name))
-        if show_output:
-            [print(ln[list(ln.keys())[0]], end='') for ln in self.docker_client.api.build(path=docker_build_dir,
-                                                                              dockerfile='Dockerfile_labmanager',
-                                                                              tag=named_image,
-                                                                              labels=labels, nocache=no_cache,
-                                                                              pull=True, rm=True,
-                                                                              decode=True)]
-        else:
-            self.docker_client.images.build(path=docker_build_dir, dockerfile='Dockerfile_labmanager',
-                                            tag=named_image, nocache=no_cache,
-                                            pull=True, labels=labels)
+        self._build_or_reuse(docker_build_dir, 'Dockerfile_labmanager', named_image, build_info, labels,
+                             show_output=show_output, no_cache=no_cache)
 
         # Tag with `latest` for auto-detection of image on launch
         self.docker_client.api.tag(named_image, 'gigantum/labmanager', 'latest')
 
+        if measure_import_time:
+            import_times = self._measure_import_time(named_image)
+            if None in import_times.values():
+                print("\n*** Could not measure the import time of service:app")
+            else:
+                print("\n*** Cold-start import of service:app: {:.2f}s without bytecode, {:.2f}s with bytecode".format(
+                    import_times['without_bytecode'], import_times['with_bytecode']))
+
     def publish(self, image_tag: str = None, verbose=False) -> None:
         """Method to push image to the logged in image repository server (e.g hub.docker.com)
 
@@ -383,13 +585,8 @@ priority=0""")
         if not image_tag:
             image_tag = self.get_image_tag()
 
-        if verbose:
-            [print(ln[list(ln.keys())[0]]) for ln in self.docker_client.api.push('gigantum/labmanager', tag=image_tag,
-                                                                                 stream=True, decode=True)]
-        else:
-            self.docker_client.images.push('gigantum/labmanager', tag=image_tag)
-
-        self.docker_client.images.push('gigantum/labmanager', tag='latest')
+        # Push the named tag and `latest` together. They share every layer, which the daemon only uploads once.
+        self._push_tags('gigantum/labmanager', [image_tag, 'latest'], verbose=verbose)
 
     def publish_edge(self, image_tag: str = None, verbose=False) -> None:
         """Method to push image to the logged in image repository server (e.g hub.docker.com)
@@ -405,17 +602,9 @@ priority=0""")
             image_tag = self.get_image_tag()
 
         # Re-tag current labmanager build as edge locally
-        self.docker_client.images.get('gigantum/labmanager:latest').tag(f'gigantum/labmanager-edge:{image_tag}')
-        self.docker_client.images.get(f'gigantum/labmanager-edge:{image_tag}').tag('gigantum/labmanager-edge:latest')
+        self._tag_images('gigantum/labmanager:latest', 'gigantum/labmanager-edge', [image_tag, 'latest'])
 
-        if verbose:
-            [print(ln[list(ln.keys())[0]]) for ln in self.docker_client.api.push('gigantum/labmanager-edge',
-                                                                                 tag=image_tag,
-                                                                                 stream=True, decode=True)]
-        else:
-            self.docker_client.images.push('gigantum/labmanager-edge', tag=image_tag)
-
-        self.docker_client.images.push('gigantum/labmanager-edge', tag='latest')
+        self._push_tags('gigantum/labmanager-edge', [image_tag, 'latest'], verbose=verbose)
 
     def publish_demo(self, image_tag: str = None, verbose=False) -> None:
         """Method to push a cloud demo image to the logged in image repository server (e.g hub.docker.com)
@@ -431,17 +620,9 @@ priority=0""")
             image_tag = self.get_image_tag()
 
         # Re-tag current labmanager build as edge locally
-        self.docker_client.images.get('gigantum/labmanager:latest').tag(f'gigantum/gigantum-cloud-demo:{image_tag}')
-        self.docker_client.images.get(f'gigantum/gigantum-cloud-demo:{image_tag}').tag('gigantum/gigantum-cloud-demo:latest')
-
-        if verbose:
-            [print(ln[list(ln.keys())[0]]) for ln in self.docker_client.api.push('gigantum/gigantum-cloud-demo',
-                                                                                 tag=image_tag,
-                                                                                 stream=True, decode=True)]
-        else:
-            self.docker_client.images.push('gigantum/gigantum-cloud-demo', tag=image_tag)
+        self._tag_images('gigantum/labmanager:latest', 'gigantum/gigantum-cloud-demo', [image_tag, 'latest'])
 
-        self.docker_client.images.push('gigantum/gigantum-cloud-demo', tag='latest')
+        self._push_tags('gigantum/gigantum-cloud-demo', [image_tag, 'latest'], verbose=verbose)
 
     def cleanup(self, dev_images=False):
         """Method to clean up old gigantum/labmanager images
@@ -0,0 +1,257 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import asyncio
+import threading
+import time
+import typing
+
+from docker.errors import APIError, NotFound
+
+from gtmlib.common.dockerasync import run_async
+
+# Ports the LabManager container serves on the host: the proxy, the API and the UI
+READINESS_PORTS = {'proxy': 10000, 'api': 10001, 'ui': 10002}
+
+# Supervisor states of programs that gave up starting
+FAILED_STATES = ['FATAL']
+
+
+def parse_supervisor_status(output: str) -> typing.Dict[str, str]:
+    """Method to parse the output of `supervisorctl status`
+
+    Args:
+        output(str): Command output, one `<program> <STATE> <description>` line per program
+
+    Returns:
+        dict: program -> state
+    """
+    states = dict()
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[1].isupper() and parts[1].isalpha():
+            states[parts[0]] = parts[1]
+    return states
+
+
+class ReadinessTracker(object):
+    """Class to wait for a started LabManager container to serve requests, recording when each service became ready
+
+    Every `interval` seconds the ports in READINESS_PORTS are probed with an HTTP request (a 5xx response means nginx is
+    up but its upstream isn't) while `supervisorctl status` runs in the container, all concurrently. The container is
+    ready once every port responds and every supervisor program is RUNNING. Waiting stops early if the container exits
+    or a program fails.
+    """
+    def __init__(self, container, started_at: float, host: str = 'localhost',
+                 ports: typing.Optional[typing.Dict[str, int]] = None, timeout: float = 120.0,
+                 interval: float = 0.5, clock: typing.Callable[[], float] = time.monotonic) -> None:
+        """Constructor
+
+        Args:
+            container: docker Container to check
+            started_at(float): clock() value when the container was started
+            host(str): Host the container's ports are published on
+            ports(dict): Service name -> port, defaults to READINESS_PORTS
+            timeout(float): Seconds to wait for readiness
+            interval(float): Seconds between probes
+            clock(callable): Monotonic clock
+        """
+        self.container = container
+        self.started_at = started_at
+        self.host = host
+        self.ports = ports if ports is not None else dict(READINESS_PORTS)
+        self.timeout = timeout
+        self.interval = interval
+        self.clock = clock
+
+        self.ready_at = dict()  # type: typing.Dict[str, float]
+        self.states = dict()  # type: typing.Dict[str, str]
+        self.failure = None  # type: typing.Optional[str]
+
+    async def _probe_port(self, port: int) -> bool:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, port), self.interval * 2)
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        try:
+            writer.write("GET / HTTP/1.0\r\nHost: {}\r\n\r\n".format(self.host).encode())
+            status_line = await asyncio.wait_for(reader.readline(), self.interval * 4)
+            parts = status_line.split()
+            return len(parts) >= 2 and parts[1].isdigit() and int(parts[1]) < 500
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+
+    def _get_supervisor_states(self) -> typing.Dict[str, str]:
+        """Method to get the supervisor program states, raising ValueError if the container is no longer running"""
+        try:
+            self.container.reload()
+        except NotFound:
+            raise ValueError("Container was removed")
+        if self.container.status not in ['created', 'running']:
+            raise ValueError("Container {}".format(self.container.status))
+
+        try:
+            exit_code, output = self.container.exec_run(['supervisorctl', 'status'])
+        except APIError:
+            # Container is still starting
+            return dict()
+        return parse_supervisor_status(output.decode('utf-8', errors='replace'))
+
+    async def _probe_supervisor(self) -> typing.Dict[str, str]:
+        """Method to get the supervisor program states without blocking the probes, raising asyncio.TimeoutError if
+        the container doesn't answer in time
+
+        The exec runs on a daemon thread rather than the loop's executor, so a hung exec can't keep the wait (or gtm)
+        from finishing.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def set_result(result, error):
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        def run():
+            try:
+                result, error = self._get_supervisor_states(), None
+            except Exception as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(set_result, result, error)
+            except RuntimeError:
+                # The wait finished and its loop is closed
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+        return await asyncio.wait_for(future, self.interval * 4)
+
+    def _record(self, name: str, now: float) -> None:
+        if name not in self.ready_at:
+            self.ready_at[name] = now - self.started_at
+
+    @property
+    def services(self) -> typing.List[str]:
+        """Names of everything being waited for"""
+        names = ["port {} ({})".format(port, name) for name, port in sorted(self.ports.items(), key=lambda x: x[1])]
+        return names + ["supervisor {}".format(program) for program in sorted(self.states)]
+
+    @property
+    def is_ready(self) -> bool:
+        return bool(self.states) and all([name in self.ready_at for name in self.services])
+
+    async def _wait(self) -> None:
+        deadline = self.started_at + self.timeout
+        while True:
+            pending_ports = {name: port for name, port in self.ports.items()
+                             if "port {} ({})".format(port, name) not in self.ready_at}
+            results = await asyncio.gather(self._probe_supervisor(),
+                                           *[self._probe_port(port) for port in pending_ports.values()],
+                                           return_exceptions=True)
+            now = self.clock()
+
+            if isinstance(results[0], ValueError):
+                self.failure = str(results[0])
+                return
+            if isinstance(results[0], asyncio.TimeoutError):
+                # supervisorctl didn't answer this time, keep the last known states
+                pass
+            elif isinstance(results[0], BaseException):
+                raise results[0]
+            elif results[0]:
+                self.states = results[0]
+
+            for (name, port), ready in zip(pending_ports.items(), results[1:]):
+                if ready is True:
+                    self._record("port {} ({})".format(port, name), now)
+            for program, state in self.states.items():
+                if state == 'RUNNING':
+                    self._record("supervisor {}".format(program), now)
+
+            failed = sorted([p for p, state in self.states.items() if state in FAILED_STATES])
+            if failed:
+                self.failure = "Supervisor program(s) failed: {}".format(
+                    ", ".join(["{} ({})".format(p, self.states[p]) for p in failed]))
+                return
+            if self.is_ready:
+                return
+            if now >= deadline:
+                self.failure = "Timed out after {:g}s".format(self.timeout)
+                return
+            await asyncio.sleep(min(self.interval, max(0.0, deadline - now)))
+
+    def wait(self) -> typing.Dict[str, typing.Any]:
+        """Method to wait until the container is ready, it fails, or the timeout expires
+
+        Returns:
+            dict: the readiness report
+        """
+        run_async(self._wait())
+        return self.report()
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        """Method to get the startup timings
+
+        Returns:
+            dict: `ready`, `failure`, `ready_seconds` (when everything was ready) and the `services` with the seconds
+            after start each became ready (None if it didn't)
+        """
+        services = list()
+        for name in self.services:
+            service = {'name': name, 'ready_seconds': self.ready_at.get(name)}
+            if name.startswith("supervisor "):
+                service['state'] = self.states.get(name[len("supervisor "):])
+            services.append(service)
+
+        ready = self.failure is None and self.is_ready
+        return {'container': self.container.name,
+                'ready': ready,
+                'failure': self.failure,
+                'timeout': self.timeout,
+                'ready_seconds': max(self.ready_at.values()) if ready else None,
+                'services': services}
+
+
+def format_timeline(report: typing.Dict[str, typing.Any]) -> str:
+    """Method to print a readiness report as a timeline
+
+    Args:
+        report(dict): Result of ReadinessTracker.report
+
+    Returns:
+        str
+    """
+    if report['ready']:
+        lines = ["Startup timeline of `{}` (ready in {:.1f}s):".format(report['container'], report['ready_seconds'])]
+    else:
+        lines = ["Startup timeline of `{}` (not ready: {}):".format(report['container'], report['failure'])]
+
+    services = sorted(report['services'], key=lambda s: (s['ready_seconds'] is None, s['ready_seconds'] or 0))
+    for service in services:
+        if service['ready_seconds'] is None:
+            state = " ({})".format(service['state']) if service.get('state') else ""
+            lines.append("      -    {}  not ready{}".format(service['name'], state))
+        else:
+            lines.append("  {:>7.1f}s  {}".format(service['ready_seconds'], service['name']))
+    return "\n".join(lines)
@@ -19,10 +19,11 @@
 # SOFTWARE.
 import os
 import platform
+import time
+import typing
 
-import docker
-
-from gtmlib.common import dockerize_windows_path, DockerVolume
+from gtmlib.common import dockerize_windows_path, get_docker_client, DockerVolume
+from gtmlib.labmanager.readiness import ReadinessTracker
 
 
 class LabManagerRunner(object):
@@ -30,11 +31,13 @@ class LabManagerRunner(object):
     """
 
     def __init__(self, image_name: str, container_name: str, show_output: bool=False):
-        self.docker_client = docker.from_env()
+        self.docker_client = get_docker_client()
         self.image_name = image_name
         self.container_name = container_name
         self.docker_image = self.docker_client.images.get(image_name)
         self.show_output = show_output
+        self.container = None
+        self.launched_at = None  # type: typing.Optional[float]
 
         if not self.docker_image:
             raise ValueError("Image name `{}' does not exist.".format(image_name))
@@ -64,7 +67,7 @@ class LabManagerRunner(object):
                         '10002/tcp': 10002}
 
         # Make sure the container-container share volume exists
-        share_volume = DockerVolume("labmanager_share_vol")
+        share_volume = DockerVolume("labmanager_share_vol", client=self.docker_client)
         if not share_volume.exists():
             share_volume.create()
 
@@ -83,10 +86,27 @@ class LabManagerRunner(object):
             environment_mapping['LOCAL_USER_ID'] = os.getuid()
             volume_mapping[working_dir] = {'bind': '/mnt/gigantum', 'mode': 'cached'}
 
-        self.docker_client.containers.run(image=self.docker_image,
-                                          detach=True,
-                                          name=self.container_name,
-                                          init=True,
-                                          ports=port_mapping,
-                                          volumes=volume_mapping,
-                                          environment=environment_mapping)
+        self.launched_at = time.monotonic()
+        self.container = self.docker_client.containers.run(image=self.docker_image,
+                                                           detach=True,
+                                                           name=self.container_name,
+                                                           init=True,
+                                                           ports=port_mapping,
+                                                           volumes=volume_mapping,
+                                                           environment=environment_mapping)
+
+    def wait_until_ready(self, timeout: float = 120.0, interval: float = 0.5) -> typing.Dict[str, typing.Any]:
+        """Wait for the launched container to serve on all its ports with every supervisor program running
+
+        Args:
+            timeout(float): Seconds after launch to give up
+            interval(float): Seconds between probes
+
+        Returns:
+            dict: the readiness report, see ReadinessTracker.report
+        """
+        if self.container is None:
+            raise ValueError("Container must be launched before waiting for it.")
+
+        tracker = ReadinessTracker(self.container, started_at=self.launched_at, timeout=timeout, interval=interval)
+        return tracker.wait()
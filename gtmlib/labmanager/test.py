@@ -17,7 +17,7 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import docker
+from gtmlib.common import get_docker_client
 
 
 class LabManagerTester(object):
@@ -25,7 +25,7 @@ class LabManagerTester(object):
     """
 
     def __init__(self, container_name: str):
-        self.docker_client = docker.from_env()
+        self.docker_client = get_docker_client()
         self.container_name = container_name
 
     def _retrieve_container(self):
@@ -7,9 +7,11 @@ cp -R /mnt/labmanager-ui/* /opt/build_dir
 #cd /opt/build_dir/
 #chown giguser:root -R $(ls | awk '{if($1 != "node_modules"){ print $1 }}')
 
-# Update node
+# Update node, unless the node_modules volume already matches yarn.lock
 cd /opt/build_dir
-yarn install
+if [ -z "$SKIP_YARN_INSTALL" ]; then
+    yarn install
+fi
 
 # Run relay
 yarn relay
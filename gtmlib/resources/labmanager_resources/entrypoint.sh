@@ -7,6 +7,11 @@ export LANG=C.UTF-8
 # TODO: Generalize Dev Env Vars
 export JUPYTER_RUNTIME_DIR=/mnt/share/jupyter/runtime
 
+# Export the uwsgi, rq worker and redis settings of the performance profile, read by supervisor, and use its
+# nginx API config
+source /etc/gigantum/performance-profiles.sh
+ln -sf /etc/gigantum/nginx_api/${GTM_PERFORMANCE_PROFILE}.conf /etc/nginx/sites-enabled/nginx_api.conf
+
 # Open up the docker socket for now
 chmod 777 /var/run/docker.sock
 
@@ -0,0 +1,177 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import threading
+import time
+
+import pytest
+
+from gtmlib.baseimage import build as baseimage_build
+from gtmlib.baseimage.build import BaseImageBuilder
+from gtmlib.common.buildstate import BuildStateStore
+
+
+@pytest.fixture()
+def base_images(tmp_path, monkeypatch):
+    """Fixture to create a fake base-images submodule and a builder whose docker builds are simulated
+
+        minimal <- python3 <- python3-data
+        minimal <- r
+        standalone
+    """
+    resources = tmp_path / "resources"
+    images = {"python3-minimal": "FROM ubuntu:18.04",
+              "python3": "FROM gigantum/python3-minimal:latest",
+              "python3-data": "FROM gigantum/python3\nRUN x",
+              "r": "FROM gigantum/python3-minimal",
+              "standalone": "FROM ubuntu:18.04"}
+    for name, dockerfile in images.items():
+        os.makedirs(resources / "submodules" / "base-images" / name)
+        (resources / "submodules" / "base-images" / name / "Dockerfile").write_text(dockerfile)
+    monkeypatch.setattr(baseimage_build, "resource_filename", lambda pkg, name: str(resources))
+
+    builder = BaseImageBuilder()
+    builder.tracking_file = str(tmp_path / ".image-build-status.json")
+    builder.state = BuildStateStore(str(tmp_path / ".image-build-status.db"), legacy_json=builder.tracking_file)
+    builder.events = []
+    builder.running = 0
+    builder.max_running = 0
+    lock = threading.Lock()
+
+    def fake_build(build_dir, verbose=False, no_cache=False, pull=None, prefix=""):
+        name = os.path.basename(build_dir)
+        with lock:
+            builder.events.append(("start", name, pull))
+            builder.running += 1
+            builder.max_running = max(builder.max_running, builder.running)
+        time.sleep(0.05)
+        with lock:
+            builder.running -= 1
+            builder.events.append(("done", name, pull))
+        if name in getattr(builder, "fail", []):
+            raise ValueError("Image Build Failed!")
+        return f"gigantum/{name}:abc"
+
+    monkeypatch.setattr(builder, "_build_image", fake_build)
+    monkeypatch.setattr(builder, "_get_image_details", lambda tag: (1000, "sha256:" + tag))
+    yield builder
+
+
+def _index(events, kind, name):
+    return [i for i, e in enumerate(events) if e[0] == kind and e[1] == name][0]
+
+
+class TestBaseImageBuild(object):
+    def test_dependency_order(self, base_images):
+        """Test children start only after their parents finish, and only roots pull"""
+        base_images.build(jobs=4)
+        events = base_images.events
+
+        assert _index(events, "done", "python3-minimal") < _index(events, "start", "python3")
+        assert _index(events, "done", "python3-minimal") < _index(events, "start", "r")
+        assert _index(events, "done", "python3") < _index(events, "start", "python3-data")
+        assert {e[1]: e[2] for e in events if e[0] == "start"} == {"python3-minimal": True, "standalone": True,
+                                                                    "python3": False, "r": False,
+                                                                    "python3-data": False}
+        images = base_images.state.list_images()
+        assert len(images) == 5
+        assert all(x['is_built'] and x['size'] == 1000 and x['build_seconds'] > 0 for x in images)
+
+    def test_parallel(self, base_images):
+        """Test independent images build concurrently, bounded by jobs"""
+        base_images.build(jobs=2)
+        assert base_images.max_running == 2
+
+        base_images.events = []
+        base_images.max_running = 0
+        base_images.build(jobs=1)
+        assert base_images.max_running == 1
+
+    def test_failure_skips_dependents(self, base_images):
+        """Test a failed image blocks its descendants but not unrelated images"""
+        base_images.fail = ["python3"]
+        with pytest.raises(ValueError, match="python3, python3-data"):
+            base_images.build(jobs=4)
+
+        started = [e[1] for e in base_images.events if e[0] == "start"]
+        assert "python3-data" not in started
+        assert "r" in started and "standalone" in started
+
+    def test_single_image_does_not_pull_local_parent(self, base_images):
+        """Test building one image uses its parent's existing :latest tag"""
+        base_images.build(image_name="r")
+        assert base_images.events == [("start", "r", False), ("done", "r", False)]
+
+    def test_cycle(self, base_images, tmp_path):
+        """Test circular FROM lines are reported"""
+        path = tmp_path / "resources" / "submodules" / "base-images" / "python3-minimal" / "Dockerfile"
+        path.write_text("FROM gigantum/python3-data")
+
+        with pytest.raises(ValueError, match="Circular"):
+            base_images.build(jobs=2)
+
+
+@pytest.fixture()
+def built_images(base_images, monkeypatch):
+    """Fixture to build the fake base images and simulate pushing them"""
+    base_images.build(jobs=4)
+    base_images.pushes = []
+    base_images.push_failures = {}
+    lock = threading.Lock()
+
+    def fake_publish(image_tag, verbose=False, progress=None, registry=None):
+        with lock:
+            base_images.pushes.append(("start", image_tag))
+        time.sleep(0.02)
+        with lock:
+            base_images.pushes.append(("done", image_tag))
+            if base_images.push_failures.get(image_tag, 0) > 0:
+                base_images.push_failures[image_tag] -= 1
+                raise ValueError("unauthorized")
+        return "sha256:" + image_tag.split(":")[0].split("/")[1]
+
+    monkeypatch.setattr(base_images, "_publish_image", fake_publish)
+    yield base_images
+
+
+class TestBaseImagePublish(object):
+    def test_parents_pushed_first(self, built_images):
+        """Test children are pushed after their parents and every image is marked published"""
+        built_images.publish(jobs=4)
+        pushes = built_images.pushes
+
+        assert _index(pushes, "done", "gigantum/python3-minimal:abc") < _index(pushes, "start", "gigantum/python3:abc")
+        assert _index(pushes, "done", "gigantum/python3:abc") < _index(pushes, "start", "gigantum/python3-data:abc")
+        images = built_images.state.list_images()
+        assert all(x['is_published'] for x in images)
+        assert built_images.state.get("gigantum/r:abc")['digest'] == "sha256:r"
+
+    def test_retry(self, built_images, monkeypatch):
+        """Test a failing push is retried and a persistent failure blocks dependents"""
+        monkeypatch.setattr(baseimage_build, "time", type("FakeTime", (), {"sleep": staticmethod(lambda s: None)}))
+        built_images.push_failures = {"gigantum/r:abc": 2, "gigantum/python3:abc": 10}
+
+        with pytest.raises(ValueError, match="python3-data"):
+            built_images.publish(jobs=2, retries=2)
+
+        assert len([p for p in built_images.pushes if p == ("start", "gigantum/r:abc")]) == 3
+        assert ("start", "gigantum/python3-data:abc") not in built_images.pushes
+        assert built_images.state.get("gigantum/r:abc")['is_published'] == 1
+        assert built_images.state.get("gigantum/python3:abc")['is_published'] == 0
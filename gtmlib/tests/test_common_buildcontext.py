@@ -0,0 +1,92 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import io
+import os
+import tarfile
+
+import pytest
+
+from gtmlib.common.buildcontext import BuildContext, get_build_context
+
+
+@pytest.fixture()
+def context(tmp_path):
+    """Fixture to create a build context with files the Dockerfile does and doesn't use"""
+    (tmp_path / "Dockerfile_test").write_text("FROM ubuntu:18.04\n"
+                                              "COPY src /opt/src\n"
+                                              "COPY conf/app.conf /etc/app.conf\n"
+                                              "COPY missing.txt /tmp/\n")
+    (tmp_path / "src" / "pkg" / "__pycache__").mkdir(parents=True)
+    (tmp_path / "src" / "pkg" / "__init__.py").write_text("x = 1\n")
+    (tmp_path / "src" / "pkg" / "mod.pyc").write_bytes(b"\0")
+    (tmp_path / "src" / "pkg" / "__pycache__" / "mod.cpython-36.pyc").write_bytes(b"\0")
+    (tmp_path / "src" / ".git").write_text("gitdir: ../.git/modules/src")
+    (tmp_path / "src" / "big.bin").write_bytes(os.urandom(3000))
+    (tmp_path / "src" / "scratch.tmp").write_text("tmp")
+    os.symlink("__init__.py", str(tmp_path / "src" / "pkg" / "link.py"))
+    (tmp_path / "conf").mkdir()
+    (tmp_path / "conf" / "app.conf").write_text("a = 1")
+    (tmp_path / "conf" / "other.conf").write_text("b = 1")
+    (tmp_path / "ui" / "node_modules").mkdir(parents=True)
+    (tmp_path / ".dockerignore").write_text("# comment\nsrc/*.tmp\n")
+    yield str(tmp_path)
+
+
+class TestBuildContext(object):
+    def test_files(self, context):
+        """Test only referenced files are included, less ignored and compiled files"""
+        assert BuildContext(context, "Dockerfile_test").files == [
+            "Dockerfile_test", os.path.join("conf", "app.conf"), os.path.join("src", "big.bin"),
+            os.path.join("src", "pkg", "__init__.py"), os.path.join("src", "pkg", "link.py")]
+
+    def test_stream(self, context):
+        """Test the streamed archive is a valid tar with the right contents"""
+        build_context = BuildContext(context, "Dockerfile_test")
+        chunks = list(build_context.stream(chunk_size=1024))
+        assert max([len(c) for c in chunks]) <= 1024
+
+        with tarfile.open(fileobj=io.BytesIO(b"".join(chunks))) as tar:
+            assert tar.getnames() == ["Dockerfile_test", "conf/app.conf", "src/big.bin", "src/pkg/__init__.py",
+                                      "src/pkg/link.py"]
+            with open(os.path.join(context, "src", "big.bin"), "rb") as f:
+                assert tar.extractfile("src/big.bin").read() == f.read()
+            assert tar.getmember("src/pkg/link.py").issym()
+            assert tar.getmember("src/pkg/link.py").linkname == "__init__.py"
+            assert tar.getmember("conf/app.conf").uid == 0
+
+        assert build_context.size == sum([os.lstat(os.path.join(context, x)).st_size for x in build_context.files])
+
+    def test_extra_dirs(self, context, tmp_path):
+        """Test directories outside the context are added under their archive path"""
+        wheels = tmp_path / "wheels"
+        wheels.mkdir()
+        (wheels / "requests-2.18.4-py2.py3-none-any.whl").write_bytes(b"wheel")
+
+        build_context = BuildContext(context, "Dockerfile_test", extra_dirs={"wheelhouse": str(wheels)})
+        assert build_context.files[-1] == os.path.join("wheelhouse", "requests-2.18.4-py2.py3-none-any.whl")
+        with tarfile.open(fileobj=io.BytesIO(b"".join(build_context.stream()))) as tar:
+            assert tar.extractfile("wheelhouse/requests-2.18.4-py2.py3-none-any.whl").read() == b"wheel"
+
+    def test_build_kwargs(self, context, capsys):
+        """Test the build arguments use a custom context and report its size"""
+        kwargs = get_build_context(context, "Dockerfile_test")
+        assert kwargs["custom_context"] is True
+        assert kwargs["dockerfile"] == "Dockerfile_test"
+        assert "Build context: 5 files" in capsys.readouterr().out
@@ -0,0 +1,120 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+
+import pytest
+
+from gtmlib.common.buildmanifest import BuildManifest, get_copy_sources, hash_build_context, resolve_parent_digests
+
+
+@pytest.fixture()
+def context(tmp_path, monkeypatch):
+    """Fixture to create a small build context"""
+    monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "app").mkdir()
+    (tmp_path / "app" / "a.py").write_text("a")
+    (tmp_path / "app" / "b.py").write_text("b")
+    (tmp_path / "entrypoint.sh").write_text("#!/bin/bash")
+    (tmp_path / "unused.txt").write_text("x")
+    (tmp_path / "Dockerfile").write_text("FROM ubuntu:18.04\n"
+                                         "COPY app /opt/app\n"
+                                         "COPY [\"entrypoint.sh\", \"/usr/local/bin/\"]\n"
+                                         "COPY --from=builder /build /var/www\n"
+                                         "ADD https://example.com/x.tgz /tmp/\n")
+    yield str(tmp_path)
+
+
+class FakeImage(object):
+    def __init__(self, image_id):
+        self.id = image_id
+        self.tags = []
+
+    def tag(self, repository, tag=None):
+        self.tags.append("{}:{}".format(repository, tag) if tag else repository)
+
+
+class FakeClient(object):
+    def __init__(self, images):
+        self.images = self
+        self._images = images
+
+    def get(self, name):
+        from docker.errors import ImageNotFound
+        if name not in self._images:
+            raise ImageNotFound(name)
+        return self._images[name]
+
+
+class FakeLowLevelAPI(object):
+    def inspect_distribution(self, image):
+        return {'Descriptor': {'digest': 'sha256:registry'}}
+
+
+class TestBuildManifest(object):
+    def test_copy_sources(self, context):
+        """Test only local COPY/ADD sources are included, with directories expanded"""
+        assert get_copy_sources(os.path.join(context, "Dockerfile"), context) == \
+            [os.path.join("app", "a.py"), os.path.join("app", "b.py"), "entrypoint.sh"]
+
+    def test_hash(self, context):
+        """Test the hash changes with copied files and parent digests, but not other files"""
+        dockerfile = os.path.join(context, "Dockerfile")
+        parents = {"ubuntu:18.04": "sha256:1"}
+        first = hash_build_context(dockerfile, context, parents)
+
+        with open(os.path.join(context, "unused.txt"), "wt") as f:
+            f.write("changed")
+        assert hash_build_context(dockerfile, context, parents) == first
+
+        assert hash_build_context(dockerfile, context, {"ubuntu:18.04": "sha256:2"}) != first
+
+        with open(os.path.join(context, "app", "a.py"), "wt") as f:
+            f.write("changed")
+        assert hash_build_context(dockerfile, context, parents) != first
+
+    def test_reuse(self, tmp_path):
+        """Test a matching hash reuses the image and retags it when the tag changed"""
+        manifest = BuildManifest(str(tmp_path / "manifest.json"))
+        image = FakeImage("sha256:img")
+        client = FakeClient({"sha256:img": image})
+
+        assert manifest.reuse(client, "gigantum/x", "h1", "gigantum/x:t1") is None
+        manifest.record("gigantum/x", "h1", "gigantum/x:t1", "sha256:img")
+
+        assert manifest.reuse(client, "gigantum/x", "h2", "gigantum/x:t1") is None
+        assert manifest.reuse(client, "gigantum/x", "h1", "gigantum/x:t1") == "unchanged"
+        assert manifest.reuse(client, "gigantum/x", "h1", "gigantum/x:t2") == "retagged"
+        assert "gigantum/x:t2" in image.tags
+        assert manifest.get("gigantum/x")["tag"] == "gigantum/x:t2"
+
+        # The image was removed from the daemon
+        assert manifest.reuse(FakeClient({}), "gigantum/x", "h1", "gigantum/x:t2") is None
+
+    def test_parent_digests_without_registry_data(self, context):
+        """Test parents are resolved on docker-py releases without images.get_registry_data()"""
+        client = FakeClient({"ubuntu:18.04": FakeImage("sha256:local")})
+        dockerfile = os.path.join(context, "Dockerfile")
+
+        assert resolve_parent_digests(client, dockerfile, pull=False) == {"ubuntu:18.04": "sha256:local"}
+        # Neither registry API available, the manifest is skipped
+        assert resolve_parent_digests(client, dockerfile, pull=True) is None
+
+        client.api = FakeLowLevelAPI()
+        assert resolve_parent_digests(client, dockerfile, pull=True) == {"ubuntu:18.04": "sha256:registry"}
@@ -0,0 +1,102 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import multiprocessing
+import sqlite3
+import threading
+
+from gtmlib.common import buildstate
+from gtmlib.common.buildstate import BuildStateStore
+
+
+def _mark_many(db_file, prefix):
+    store = BuildStateStore(db_file)
+    for i in range(25):
+        store.mark_built("{}:{}".format(prefix, i), build_seconds=1.0)
+
+
+class Sqlite322Connection(sqlite3.Connection):
+    """Connection that rejects the upsert syntax added in SQLite 3.24, like Ubuntu 18.04's SQLite 3.22"""
+    def execute(self, sql, *args):
+        if "ON CONFLICT" in sql.upper():
+            raise sqlite3.OperationalError('near "ON": syntax error')
+        return super().execute(sql, *args)
+
+
+class TestBuildStateStore(object):
+    def test_import_legacy_json(self, tmp_path):
+        """Test the JSON tracking file is imported once"""
+        legacy = tmp_path / "status.json"
+        legacy.write_text(json.dumps({"gigantum/a:1": {"isBuilt": True, "isPublished": True},
+                                      "gigantum/b:1": {"isBuilt": True, "isPublished": False}}))
+        store = BuildStateStore(str(tmp_path / "status.db"), legacy_json=str(legacy))
+
+        assert [x['tag'] for x in store.list_images(published=False)] == ["gigantum/b:1"]
+        assert store.get("gigantum/a:1")['is_published'] == 1
+
+        # Changes to the JSON file after the import are ignored
+        legacy.write_text(json.dumps({"gigantum/c:1": {"isBuilt": True, "isPublished": False}}))
+        store = BuildStateStore(str(tmp_path / "status.db"), legacy_json=str(legacy))
+        assert store.get("gigantum/c:1") is None
+
+    def test_build_and_publish(self, tmp_path):
+        """Test details are kept across a rebuild and publish"""
+        store = BuildStateStore(str(tmp_path / "status.db"))
+        store.mark_built("gigantum/a:1", build_seconds=12.5, size=1024, image_id="sha256:1")
+        store.mark_published("gigantum/a:1", digest="sha256:d")
+
+        image = store.get("gigantum/a:1")
+        assert image['is_built'] == 1 and image['is_published'] == 1
+        assert (image['build_seconds'], image['size'], image['image_id'], image['digest']) == \
+            (12.5, 1024, "sha256:1", "sha256:d")
+
+        # Rebuilding the same tag makes it unpublished again
+        store.mark_built("gigantum/a:1", build_seconds=3.0)
+        assert store.get("gigantum/a:1")['is_published'] == 0
+        assert store.list_images(published=True) == []
+
+    def test_old_sqlite(self, tmp_path, monkeypatch):
+        """Test updates don't need SQLite 3.24 upserts"""
+        connect = sqlite3.connect
+        monkeypatch.setattr(buildstate.sqlite3, "connect",
+                            lambda *args, **kwargs: connect(*args, factory=Sqlite322Connection, **kwargs))
+        store = BuildStateStore(str(tmp_path / "status.db"))
+
+        store.mark_published("gigantum/a:1", digest="sha256:d")
+        store.mark_built("gigantum/a:1", build_seconds=2.0)
+        store.mark_published("gigantum/a:1")
+
+        image = store.get("gigantum/a:1")
+        assert (image['is_built'], image['is_published'], image['build_seconds'], image['digest']) == \
+            (1, 1, 2.0, "sha256:d")
+
+    def test_concurrent_writers(self, tmp_path):
+        """Test updates from several threads and processes are not lost"""
+        db_file = str(tmp_path / "status.db")
+        threads = [threading.Thread(target=_mark_many, args=(db_file, "thread{}".format(i))) for i in range(4)]
+        # Spawn, since forked children would inherit SQLite's lock bookkeeping from the running threads
+        processes = [multiprocessing.get_context("spawn").Process(target=_mark_many, args=(db_file, "process{}".format(i)))
+                     for i in range(2)]
+        for worker in threads + processes:
+            worker.start()
+        for worker in threads + processes:
+            worker.join()
+
+        assert len(BuildStateStore(db_file).list_images()) == 150
@@ -0,0 +1,126 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import csv
+import json
+
+import pytest
+
+from gtmlib.common import buildstream
+from gtmlib.common.buildstream import BuildStreamParser, CACHE_HIT, CACHE_MISS, IMAGE_ID, STEP_FINISHED, \
+    STEP_STARTED, run_build
+
+STREAM = [{"stream": "Step 1/3 : FROM ubuntu:18.04"},
+          {"stream": "\n"},
+          {"status": "Pulling from library/ubuntu", "id": "18.04"},
+          {"status": "Downloading", "progressDetail": {"current": 10, "total": 100}, "id": "abc"},
+          {"stream": " ---> 452a96d81c30\n"},
+          {"stream": "Step 2/3 : COPY app /opt/app\n"},
+          {"stream": " ---> Using cache\n ---> 1f2d\n"},
+          {"stream": "Step 3/3 : RUN make\n"},
+          {"stream": " ---> Running in 5e6f\n"},
+          {"stream": "compiling\n"},
+          {"stream": "Removing intermediate container 5e6f\n ---> 9a8b\n"},
+          {"aux": {"ID": "sha256:9a8b"}},
+          {"stream": "Successfully built 9a8b\n"},
+          {"stream": "Successfully tagged gigantum/test:latest\n"}]
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class FakeAPI(object):
+    def __init__(self, stream):
+        self.stream = stream
+        self.kwargs = None
+
+    def build(self, **kwargs):
+        self.kwargs = kwargs
+        return iter(self.stream)
+
+
+class FakeClient(object):
+    def __init__(self, stream):
+        self.api = FakeAPI(stream)
+
+
+class TestBuildStreamParser(object):
+    def test_events(self):
+        """Test the stream is parsed into typed events, including lines split across messages"""
+        parser = BuildStreamParser(clock=FakeClock())
+        events = []
+        for message in STREAM:
+            events.extend([(e.kind, e.step) for e in parser.feed(message) if e.kind not in ("output", "status")])
+        parser.close()
+
+        assert events == [(STEP_STARTED, 1), (STEP_FINISHED, 1), (STEP_STARTED, 2), (CACHE_HIT, 2),
+                          (STEP_FINISHED, 2), (STEP_STARTED, 3), (CACHE_MISS, 3), (IMAGE_ID, 3),
+                          (STEP_FINISHED, 3)]
+        assert parser.image_id == "sha256:9a8b"
+        assert [s.cached for s in parser.steps] == [False, True, False]
+        assert all(s.duration > 0 for s in parser.steps)
+
+    def test_output(self):
+        """Test displayed output is prefixed per line and hides progress bars"""
+        lines = []
+        BuildStreamParser().consume(STREAM, output=lines.append, prefix="> ")
+        text = "".join(lines)
+        assert "> Step 1/3 : FROM ubuntu:18.04\n" in text
+        assert "> 18.04: Pulling from library/ubuntu\n" in text
+        assert "Downloading" not in text
+        assert "> compiling\n" in text
+
+    def test_error(self):
+        """Test an error in the stream fails the build with the daemon's message"""
+        stream = STREAM[:8] + [{"errorDetail": {"code": 2, "message": "make: not found"},
+                                "error": "make: not found"}]
+        parser = BuildStreamParser()
+        with pytest.raises(ValueError, match="make: not found"):
+            parser.consume(stream)
+        assert parser.steps[-1].finished is not None
+        assert parser.report()["error"] == "make: not found"
+
+    @pytest.mark.parametrize("fmt", ["json", "csv"])
+    def test_run_build_report(self, tmp_path, monkeypatch, fmt, capsys):
+        """Test run_build passes the build arguments through and writes the timing report"""
+        monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path))
+        monkeypatch.setenv("GTM_BUILD_REPORT_FORMAT", fmt)
+        client = FakeClient(STREAM)
+        parser = run_build(client, tag="gigantum/test:abc", nocache=True)
+
+        assert client.api.kwargs == {"decode": True, "tag": "gigantum/test:abc", "nocache": True}
+        assert parser.image_id == "sha256:9a8b"
+        assert "1/3 steps cached" in capsys.readouterr().out
+
+        path = buildstream.get_report_path("gigantum/test:abc")
+        assert path.endswith("gigantum_test." + fmt)
+        with open(path) as f:
+            if fmt == "json":
+                report = json.load(f)
+                assert [s["instruction"] for s in report["steps"]] == ["FROM ubuntu:18.04", "COPY app /opt/app",
+                                                                        "RUN make"]
+            else:
+                rows = list(csv.DictReader(f))
+                assert [r["cached"] for r in rows] == ["False", "True", "False"]
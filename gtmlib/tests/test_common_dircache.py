@@ -0,0 +1,75 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+
+import pytest
+
+from gtmlib.common.dircache import DirectoryCache
+
+
+@pytest.fixture()
+def dircache(tmp_path, monkeypatch):
+    """Fixture to create a directory cache in a temporary cache root and a directory to store"""
+    monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "build"
+    (source / "static").mkdir(parents=True)
+    (source / "index.html").write_text("<html></html>")
+    (source / "static" / "main.js").write_text("console.log(1)")
+    yield DirectoryCache('ui-bundles', keep=2), str(source)
+
+
+class TestDirectoryCache(object):
+    def test_put_get(self, dircache):
+        """Test a stored directory is returned for its key only"""
+        cache, source = dircache
+        assert cache.get('abc') is None
+
+        cached = cache.put('abc', source, metadata={'tag': 'test'})
+        assert cache.get('abc') == cached
+        assert cache.get('def') is None
+        with open(os.path.join(cached, 'static', 'main.js'), 'rt') as f:
+            assert f.read() == "console.log(1)"
+        assert [d for d in os.listdir(cache.root) if d.startswith('.')] == []
+
+    def test_put_replaces(self, dircache):
+        """Test storing a key again replaces the previous content"""
+        cache, source = dircache
+        cache.put('abc', source)
+        os.remove(os.path.join(source, 'index.html'))
+        cached = cache.put('abc', source)
+        assert not os.path.exists(os.path.join(cached, 'index.html'))
+
+    def test_incomplete_entry_ignored(self, dircache):
+        """Test an entry without the completion marker is not returned"""
+        cache, source = dircache
+        os.makedirs(os.path.join(cache.root, 'abc', 'data'))
+        assert cache.get('abc') is None
+
+    def test_evict_least_recently_used(self, dircache):
+        """Test only the most recently used entries are kept"""
+        cache, source = dircache
+        cache.put('one', source)
+        cache.put('two', source)
+        os.utime(cache._marker('one'), (1, 1))
+        os.utime(cache._marker('two'), (2, 2))
+
+        cache.get('one')
+        cache.put('three', source)
+        assert sorted(os.listdir(cache.root)) == ['one', 'three']
@@ -0,0 +1,115 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+
+import pytest
+
+from gtmlib.common.dirsync import publish_directory, sync_directory
+
+
+@pytest.fixture()
+def source_dir(tmp_path):
+    """Fixture to create a source tree with an excluded directory"""
+    source = tmp_path / "source"
+    for rel_path in ["package.json", "src/index.js", "src/components/App.js", "node_modules/react/index.js"]:
+        os.makedirs(str(source / os.path.dirname(rel_path)), exist_ok=True)
+        (source / rel_path).write_text(rel_path)
+    yield str(source), str(tmp_path / "dest")
+
+
+class TestSyncDirectory(object):
+    def test_initial_sync(self, source_dir):
+        """Test everything except excluded paths is copied into an empty destination"""
+        source, dest = source_dir
+        result = sync_directory(source, dest, exclude=['node_modules', '*/node_modules'])
+
+        assert result['copied'] == ['package.json', 'src/components/App.js', 'src/index.js']
+        assert result['unchanged'] == 0
+        assert not os.path.exists(os.path.join(dest, 'node_modules'))
+        with open(os.path.join(dest, 'src', 'components', 'App.js'), 'rt') as f:
+            assert f.read() == "src/components/App.js"
+
+    def test_incremental_sync(self, source_dir):
+        """Test only changed files are copied and deleted files are removed"""
+        source, dest = source_dir
+        sync_directory(source, dest)
+
+        with open(os.path.join(source, 'src', 'index.js'), 'wt') as f:
+            f.write("changed")
+        os.remove(os.path.join(source, 'package.json'))
+        result = sync_directory(source, dest)
+
+        assert result['copied'] == ['src/index.js']
+        assert result['removed'] == ['package.json']
+        assert result['unchanged'] == 2
+        with open(os.path.join(dest, 'src', 'index.js'), 'rt') as f:
+            assert f.read() == "changed"
+        assert not os.path.exists(os.path.join(dest, 'package.json'))
+
+    def test_touched_file_not_copied(self, source_dir):
+        """Test a file with a new mtime but the same content only has its mtime updated"""
+        source, dest = source_dir
+        sync_directory(source, dest)
+
+        os.utime(os.path.join(source, 'package.json'), (1, 1))
+        result = sync_directory(source, dest)
+        assert result['copied'] == []
+        assert os.stat(os.path.join(dest, 'package.json')).st_mtime == 1
+
+    def test_excluded_dest_paths_kept(self, source_dir):
+        """Test excluded paths in the destination are not removed"""
+        source, dest = source_dir
+        os.makedirs(os.path.join(dest, 'build'))
+        result = sync_directory(source, dest, exclude=['build'])
+        assert os.path.isdir(os.path.join(dest, 'build'))
+        assert result['removed'] == []
+
+    def test_file_replaced_by_directory(self, source_dir):
+        """Test a path that changes between file and directory is replaced"""
+        source, dest = source_dir
+        os.makedirs(os.path.join(dest, 'package.json'))
+        with open(os.path.join(dest, 'src'), 'wt') as f:
+            f.write("file")
+
+        sync_directory(source, dest)
+        assert os.path.isfile(os.path.join(dest, 'package.json'))
+        assert os.path.isfile(os.path.join(dest, 'src', 'index.js'))
+
+
+class TestPublishDirectory(object):
+    def test_publish_new(self, tmp_path):
+        """Test publishing to a path that does not exist"""
+        (tmp_path / "output").mkdir()
+        (tmp_path / "output" / "index.html").write_text("new")
+
+        publish_directory(str(tmp_path / "output"), str(tmp_path / "build"))
+        assert not (tmp_path / "output").exists()
+        assert (tmp_path / "build" / "index.html").read_text() == "new"
+
+    def test_publish_replaces(self, tmp_path):
+        """Test publishing replaces the existing directory and leaves nothing behind"""
+        (tmp_path / "build").mkdir()
+        (tmp_path / "build" / "old.js").write_text("old")
+        (tmp_path / "output").mkdir()
+        (tmp_path / "output" / "index.html").write_text("new")
+
+        publish_directory(str(tmp_path / "output"), str(tmp_path / "build"))
+        assert os.listdir(str(tmp_path / "build")) == ["index.html"]
+        assert sorted(os.listdir(str(tmp_path))) == ["build"]
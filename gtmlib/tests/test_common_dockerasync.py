@@ -0,0 +1,246 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import asyncio
+import io
+import json
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import time
+
+import pytest
+
+from gtmlib.common.dockerasync import AsyncDockerClient, AsyncDockerError, run_async
+
+
+class FakeDaemon(object):
+    """A tiny stand-in for the Docker daemon, served on a UNIX socket"""
+    def __init__(self):
+        self.requests = []
+        self.build_context = b''
+        self.active_pushes = 0
+        self.max_active_pushes = 0
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode()
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, value = line.decode().split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+
+        body = b''
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        return method, target, headers, body
+
+    @staticmethod
+    def _json(writer, status, data):
+        body = json.dumps(data).encode()
+        writer.write(b"HTTP/1.1 %d X\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                     % (status, len(body), body))
+
+    @staticmethod
+    async def _chunked(writer, pieces):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for piece in pieces:
+            writer.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+            await writer.drain()
+            await asyncio.sleep(0.05)
+        writer.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _raw_stream(writer, frames):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n\r\n")
+        for stream_id, payload in frames:
+            writer.write(struct.pack('>BxxxL', stream_id, len(payload)) + payload)
+
+    async def handle(self, reader, writer):
+        method, target, headers, body = await self._read_request(reader)
+        path = target.split("?")[0]
+        self.requests.append((method, target))
+
+        if path == "/v1.37/images/gigantum/exists/json":
+            self._json(writer, 200, {"Id": "sha256:abc"})
+        elif path.startswith("/v1.37/images/") and path.endswith("/json"):
+            self._json(writer, 404, {"message": "No such image"})
+        elif path == "/v1.37/volumes/node_vol":
+            self._json(writer, 200, {"Name": "node_vol"})
+        elif path.startswith("/v1.37/volumes/"):
+            self._json(writer, 404, {"message": "no such volume"})
+        elif path == "/v1.37/build":
+            self.build_context = body
+            stream = b'{"stream":"Step 1/1 : FROM scratch\\n"}\r\n{"aux":{"ID":"sha256:def"}}{"stream":"done\\n"}'
+            # Split objects across chunk boundaries
+            await self._chunked(writer, [stream[:10], stream[10:50], stream[50:]])
+        elif path.endswith("/push"):
+            self.active_pushes += 1
+            self.max_active_pushes = max(self.max_active_pushes, self.active_pushes)
+            if "tag=bad" in target:
+                pieces = [b'{"errorDetail":{"message":"denied: requested access"},"error":"denied"}']
+            else:
+                pieces = [b'{"status":"Preparing","id":"l1"}', b'{"status":"Pushed","id":"l1"}']
+            try:
+                await self._chunked(writer, pieces + [b'{"status":"done"}'])
+            finally:
+                self.active_pushes -= 1
+        elif path.endswith("/tag"):
+            self._json(writer, 201, {})
+        elif path == "/v1.37/containers/c1/logs":
+            self._raw_stream(writer, [(1, b"line 1\n"), (2, b"warning\n"), (1, b"line 2\n")])
+        elif path == "/v1.37/containers/c1/exec":
+            assert json.loads(body.decode())["Cmd"] == ["/bin/sh", "-c", "echo hi"]
+            self._json(writer, 201, {"Id": "e1"})
+        elif path == "/v1.37/exec/e1/start":
+            self._raw_stream(writer, [(1, b"hi\n")])
+        elif path == "/v1.37/exec/e1/json":
+            self._json(writer, 200, {"ExitCode": 3})
+        else:
+            self._json(writer, 500, {"message": "unexpected request"})
+
+        await writer.drain()
+        writer.close()
+
+
+@pytest.fixture()
+def fake_daemon():
+    """Fixture to provide a FakeDaemon and a helper that runs a coroutine against it"""
+    temp_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(temp_dir, "docker.sock")
+    daemon = FakeDaemon()
+
+    def run(test_coroutine_fn):
+        async def main():
+            server = await asyncio.start_unix_server(daemon.handle, path=socket_path)
+            try:
+                client = AsyncDockerClient(api_version="1.37", docker_host=f"unix://{socket_path}")
+                return await test_coroutine_fn(client)
+            finally:
+                server.close()
+                await server.wait_closed()
+        return run_async(main())
+
+    yield daemon, run
+    shutil.rmtree(temp_dir)
+
+
+class TestAsyncDockerClient(object):
+    def test_exists_checks_concurrently(self, fake_daemon):
+        """Test image and volume checks, gathered together"""
+        daemon, run = fake_daemon
+
+        async def check(client):
+            return await asyncio.gather(client.image_exists("gigantum/exists"),
+                                        client.image_exists("gigantum/missing"),
+                                        client.volume_exists("node_vol"),
+                                        client.volume_exists("other_vol"))
+
+        assert run(check) == [True, False, True, False]
+        assert len(daemon.requests) == 4
+
+    def test_build_streams_context_and_output(self, fake_daemon):
+        """Test a generator context is uploaded chunked and the output is decoded across chunk boundaries"""
+        daemon, run = fake_daemon
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            data = b"FROM scratch\n"
+            info = tarfile.TarInfo("Dockerfile")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        context = buffer.getvalue()
+
+        def chunks():
+            for i in range(0, len(context), 1000):
+                yield context[i:i + 1000]
+
+        async def build(client):
+            return [ln async for ln in client.build(chunks(), tag="gigantum/test:1", nocache=True,
+                                                    labels={"a": "b"})]
+
+        output = run(build)
+        assert output == [{"stream": "Step 1/1 : FROM scratch\n"}, {"aux": {"ID": "sha256:def"}},
+                          {"stream": "done\n"}]
+        assert daemon.build_context == context
+        assert "nocache=1" in daemon.requests[0][1]
+
+    def test_push_two_tags_concurrently(self, fake_daemon):
+        """Test two pushes overlap"""
+        daemon, run = fake_daemon
+
+        async def push(client):
+            async def one(tag):
+                return [ln async for ln in client.push("gigantum/labmanager", tag, auth_header="e30=")]
+            return await asyncio.gather(one("abc"), one("latest"))
+
+        start = time.time()
+        results = run(push)
+        assert time.time() - start < 0.3
+        assert daemon.max_active_pushes == 2
+        assert results[0][-1] == {"status": "done"}
+
+    def test_push_error(self, fake_daemon):
+        """Test an error embedded in the stream is raised"""
+        _, run = fake_daemon
+
+        async def push(client):
+            return [ln async for ln in client.push("gigantum/labmanager", "bad", auth_header="e30=")]
+
+        with pytest.raises(AsyncDockerError, match="denied: requested access"):
+            run(push)
+
+    def test_logs_and_exec(self, fake_daemon):
+        """Test demultiplexing logs and exec output"""
+        _, run = fake_daemon
+
+        async def logs_and_exec(client):
+            logs = [ln async for ln in client.logs("c1")]
+            exec_id = await client.exec_create("c1", "echo hi")
+            output = [ln async for ln in client.exec_start(exec_id)]
+            return logs, output, await client.exec_exit_code(exec_id)
+
+        logs, output, exit_code = run(logs_and_exec)
+        assert logs == [b"line 1\n", b"warning\n", b"line 2\n"]
+        assert output == [b"hi\n"]
+        assert exit_code == 3
+
+    def test_error_status(self, fake_daemon):
+        """Test error statuses raise with the daemon's message"""
+        _, run = fake_daemon
+
+        async def unexpected(client):
+            await client.tag("a", "b", "c")
+            return await client._request_json("GET", "/nope")
+
+        with pytest.raises(AsyncDockerError, match="unexpected request"):
+            run(unexpected)
@@ -0,0 +1,162 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+
+import pytest
+
+from gtmlib.common import dockerclient
+
+
+@pytest.fixture()
+def fresh_registry():
+    """Fixture to start and finish a test with an empty client registry"""
+    dockerclient.reset_docker_clients()
+    yield
+    dockerclient.reset_docker_clients()
+
+
+class _FakeDaemonHandler(socketserver.StreamRequestHandler):
+    """Answers /version with a chunked body written in several pieces, and anything else with a plain body"""
+    def handle(self):
+        request_line = self.rfile.readline().decode()
+        while self.rfile.readline() not in (b"\r\n", b""):
+            pass
+        self.server.requests.append(request_line.split()[1])
+
+        if request_line.split()[1] == "/version":
+            body = json.dumps({"ApiVersion": self.server.api_version, "Version": "18.06.0-ce"}).encode()
+            self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Transfer-Encoding: chunked\r\n\r\n")
+            for i in range(0, len(body), 7):
+                chunk = body[i:i + 7]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+                time.sleep(0.001)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            body = json.dumps({"ID": "FAKE:DAEMON:ID"}).encode()
+            self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+
+
+@pytest.fixture()
+def fake_daemon(monkeypatch):
+    """Fixture to run a fake docker daemon on a UNIX socket and point DOCKER_HOST and the gtm cache at temp dirs"""
+    temp_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(temp_dir, "docker.sock")
+
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _FakeDaemonHandler)
+    server.requests = []
+    server.api_version = "1.37"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{socket_path}")
+    monkeypatch.setenv("GTM_CACHE_DIR", os.path.join(temp_dir, "cache"))
+    dockerclient.reset_docker_clients()
+
+    yield server
+
+    dockerclient.reset_docker_clients()
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(temp_dir)
+
+
+class TestDockerClient(object):
+    def test_client_is_pooled(self, fresh_registry):
+        """Test repeated calls share a single client"""
+        start = dockerclient.get_docker_stats()
+
+        client1 = dockerclient.get_docker_client()
+        client2 = dockerclient.get_docker_client()
+
+        assert client1 is client2
+        assert dockerclient.get_docker_stats()['clients'] == start['clients'] + 1
+
+    def test_reset(self, fresh_registry):
+        """Test resetting the registry creates a new client"""
+        client1 = dockerclient.get_docker_client()
+        dockerclient.reset_docker_clients()
+        client2 = dockerclient.get_docker_client()
+
+        assert client1 is not client2
+
+    def test_api_calls_counted(self, fresh_registry):
+        """Test the response hook installed on pooled clients counts calls and errors"""
+        client = dockerclient.get_docker_client()
+        start = dockerclient.get_docker_stats()
+
+        class FakeResponse(object):
+            def __init__(self, status_code):
+                self.status_code = status_code
+
+        for hook in client.api.hooks['response']:
+            hook(FakeResponse(200))
+            hook(FakeResponse(404))
+
+        stats = dockerclient.get_docker_stats()
+        assert stats['api_calls'] == start['api_calls'] + 2
+        assert stats['api_errors'] == start['api_errors'] + 1
+
+    def test_chunked_version_response(self, fake_daemon):
+        """Test the version query handles a chunked body delivered over several reads"""
+        assert dockerclient._get_docker_server_api_version() == "1.37"
+
+    def test_version_cached_on_disk(self, fake_daemon):
+        """Test a second process (simulated by a reset) skips the version round trip"""
+        assert dockerclient._get_cached_api_version() == "1.37"
+        assert fake_daemon.requests == ["/version"]
+
+        dockerclient.reset_docker_clients()
+        assert dockerclient._get_cached_api_version() == "1.37"
+        assert fake_daemon.requests == ["/version"]
+
+        with open(dockerclient._get_api_version_cache_file(), "rt") as f:
+            entry = list(json.load(f).values())[0]
+        assert entry["api_version"] == "1.37" and entry["fingerprint"]
+
+    def test_version_cache_ttl(self, fake_daemon):
+        """Test expired entries are renegotiated"""
+        dockerclient._get_cached_api_version()
+        fake_daemon.api_version = "1.38"
+
+        assert dockerclient._get_cached_api_version(ttl=0) == "1.38"
+        assert fake_daemon.requests.count("/version") == 2
+
+    def test_version_cache_invalidated(self, fake_daemon):
+        """Test a version error drops the cache entry so the next client renegotiates"""
+        dockerclient.get_docker_client()
+        fake_daemon.api_version = "1.36"
+
+        class FakeResponse(object):
+            status_code = 400
+            content = b'{"message":"client version 1.37 is too new. Maximum supported API version is 1.36"}'
+
+        dockerclient._on_response(FakeResponse())
+
+        client = dockerclient.get_docker_client()
+        assert client.api._version == "1.36"
+        assert fake_daemon.requests.count("/version") == 2
@@ -0,0 +1,62 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from gtmlib.common.dockerfile import parse_dockerfile, get_parent_images, split_image_reference
+
+
+class TestDockerfile(object):
+    def test_parse(self, tmp_path):
+        """Test comments, continuations and case handling"""
+        dockerfile = tmp_path / "Dockerfile"
+        dockerfile.write_text("# comment\n"
+                              "from ubuntu:18.04\n"
+                              "RUN apt-get update && \\\n"
+                              "    # inline comment\n"
+                              "    apt-get install -y git\n"
+                              "\n"
+                              "COPY a b /opt/\n")
+
+        assert parse_dockerfile(str(dockerfile)) == [("FROM", "ubuntu:18.04"),
+                                                     ("RUN", "apt-get update &&  apt-get install -y git"),
+                                                     ("COPY", "a b /opt/")]
+
+    def test_escape_directive(self, tmp_path):
+        """Test the escape parser directive"""
+        dockerfile = tmp_path / "Dockerfile"
+        dockerfile.write_text("# escape=`\nFROM windows\nRUN a `\n  b\n")
+
+        assert parse_dockerfile(str(dockerfile)) == [("FROM", "windows"), ("RUN", "a  b")]
+
+    def test_parent_images(self, tmp_path):
+        """Test build stages are not reported as parents"""
+        dockerfile = tmp_path / "Dockerfile"
+        dockerfile.write_text("FROM --platform=linux/amd64 gigantum/python3-minimal:latest AS base\n"
+                              "FROM node:8 as ui\n"
+                              "FROM base\n"
+                              "COPY --from=ui /build /build\n")
+
+        assert get_parent_images(str(dockerfile)) == ["gigantum/python3-minimal:latest", "node:8"]
+
+    def test_split_image_reference(self):
+        """Test splitting tags, digests and registry ports"""
+        assert split_image_reference("gigantum/a:latest") == ("gigantum/a", "latest")
+        assert split_image_reference("gigantum/a") == ("gigantum/a", None)
+        assert split_image_reference("localhost:5000/a") == ("localhost:5000/a", None)
+        assert split_image_reference("localhost:5000/a:1") == ("localhost:5000/a", "1")
+        assert split_image_reference("a@sha256:abc") == ("a", "sha256:abc")
@@ -17,11 +17,14 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import os
+
 import pytest
 from gtmlib.common import dockerclient
-from docker.errors import NotFound
+from docker.errors import APIError, NotFound
 
 from gtmlib.common import DockerVolume
+from gtmlib.common.dockervolume import LOCKFILE_HASH_LABEL, POOL_LABEL, NodeVolumePool
 
 
 @pytest.fixture()
@@ -49,6 +52,92 @@ def cleanup_docker_vol():
         pass
 
 
+class FakeVolume(object):
+    def __init__(self, volumes, name, labels):
+        self.volumes = volumes
+        self.name = name
+        self.attrs = {'Labels': labels}
+        self.in_use = False
+
+    def remove(self):
+        if self.in_use:
+            raise APIError("volume is in use")
+        del self.volumes.volumes[self.name]
+
+
+class FakeVolumes(object):
+    def __init__(self):
+        self.volumes = dict()
+
+    def get(self, name):
+        if name not in self.volumes:
+            raise NotFound("not found")
+        return self.volumes[name]
+
+    def create(self, name, labels=None):
+        self.volumes[name] = FakeVolume(self, name, labels or dict())
+        return self.volumes[name]
+
+    def list(self, filters=None):
+        key, value = filters['label'].split('=')
+        return [v for v in self.volumes.values() if v.attrs['Labels'].get(key) == value]
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.volumes = FakeVolumes()
+
+
+@pytest.fixture()
+def node_pool(tmp_path, monkeypatch):
+    """Fixture to create a node volume pool with a fake docker client and a temporary cache"""
+    monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path / "cache"))
+    package_dir = tmp_path / "labmanager-ui"
+    package_dir.mkdir()
+    (package_dir / "package.json").write_text('{"name": "labmanager-ui"}')
+    (package_dir / "yarn.lock").write_text("react@16.0.0")
+    yield NodeVolumePool("test_node_vol", keep=2, client=FakeClient()), str(package_dir)
+
+
+class TestNodeVolumePool(object):
+    def test_key(self, node_pool):
+        """Test the key changes with package.json or yarn.lock"""
+        pool, package_dir = node_pool
+        key = pool.get_key(package_dir)
+        assert pool.get_key(package_dir) == key
+
+        with open(os.path.join(package_dir, 'yarn.lock'), 'wt') as f:
+            f.write("react@16.1.0")
+        assert pool.get_key(package_dir) != key
+
+    def test_acquire(self, node_pool):
+        """Test a new volume is labeled and only reported installed once marked"""
+        pool, package_dir = node_pool
+        key = pool.get_key(package_dir)
+
+        volume, installed = pool.acquire(key)
+        assert installed is False
+        assert volume.volume_name == "test_node_vol_{}".format(key)
+        assert volume.get_labels() == {POOL_LABEL: "test_node_vol", LOCKFILE_HASH_LABEL: key}
+
+        assert pool.acquire(key)[1] is False
+        pool.mark_installed(volume)
+        assert pool.acquire(key)[1] is True
+        assert pool.acquire(key, fresh=True)[1] is False
+
+    def test_evict(self, node_pool):
+        """Test only the most recently used volumes are kept, skipping volumes in use"""
+        pool, package_dir = node_pool
+        for key in ['one', 'two', 'three']:
+            pool.acquire(key)
+        assert sorted(pool.client.volumes.volumes) == ['test_node_vol_three', 'test_node_vol_two']
+
+        pool.client.volumes.get('test_node_vol_two').in_use = True
+        pool.acquire('four')
+        assert sorted(pool.client.volumes.volumes) == ['test_node_vol_four', 'test_node_vol_three',
+                                                       'test_node_vol_two']
+
+
 class TestLabManagerBuild(object):
     def test_does_not_exist(self):
         """Test checking for a docker volume that does not exist"""
@@ -0,0 +1,91 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import time
+
+import pytest
+
+from gtmlib.common.fileindex import FileIndex
+
+
+@pytest.fixture()
+def tree(tmp_path):
+    """Fixture to create files old enough for their hashes to be cached"""
+    root = tmp_path / "root"
+    root.mkdir()
+    old = time.time() - 60
+    for i in range(5):
+        path = root / "f{}.txt".format(i)
+        path.write_text("content {}".format(i))
+        os.utime(str(path), (old, old))
+    yield str(root), str(tmp_path / "index.json")
+
+
+class TestFileIndex(object):
+    def test_only_changed_files_are_hashed(self, tree, monkeypatch):
+        """Test unchanged files reuse their hash and modified files are re-read"""
+        root, index_file = tree
+        paths = ["f{}.txt".format(i) for i in range(5)]
+        first = FileIndex(root, index_file=index_file).hash_files(paths)
+        assert len(set(first.values())) == 5
+
+        index = FileIndex(root, index_file=index_file)
+        assert index.hash_files(paths) == first
+        assert index.changed == []
+
+        old = time.time() - 30
+        with open(os.path.join(root, "f2.txt"), "wt") as f:
+            f.write("modified")
+        os.utime(os.path.join(root, "f2.txt"), (old, old))
+
+        index = FileIndex(root, index_file=index_file)
+        second = index.hash_files(paths + ["missing.txt"])
+        assert index.changed == ["f2.txt"]
+        assert second["f2.txt"] != first["f2.txt"]
+        assert "missing.txt" not in second
+
+    def test_recent_files_are_not_trusted(self, tree):
+        """Test a file modified within the mtime race window is hashed again next time"""
+        root, index_file = tree
+        with open(os.path.join(root, "new.txt"), "wt") as f:
+            f.write("new")
+
+        FileIndex(root, index_file=index_file).hash_files(["new.txt"])
+        index = FileIndex(root, index_file=index_file)
+        index.hash_files(["new.txt"])
+        assert index.changed == ["new.txt"]
+
+    def test_other_root(self, tree, tmp_path):
+        """Test an index written for a different directory is ignored"""
+        root, index_file = tree
+        FileIndex(root, index_file=index_file).hash_files(["f0.txt"])
+        assert FileIndex(str(tmp_path), index_file=index_file).entries == {}
+
+    def test_concurrent_saves_are_merged(self, tree):
+        """Test indexes loaded at the same time keep each other's hashes when saved"""
+        root, index_file = tree
+        first = FileIndex(root, index_file=index_file)
+        second = FileIndex(root, index_file=index_file)
+        first.hash_files(["f0.txt", "f1.txt"])
+        second.hash_files(["f2.txt"])
+
+        index = FileIndex(root, index_file=index_file)
+        index.hash_files(["f0.txt", "f1.txt", "f2.txt"])
+        assert index.changed == []
@@ -0,0 +1,141 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import datetime
+import json
+import mmap
+import os
+
+import pytest
+
+from gtmlib.common.logquery import LogIndex, parse_timestamp, query_records
+
+START = datetime.datetime(2018, 7, 25, 14, 0, 0)
+
+
+def _write_records(path, first: int, count: int) -> None:
+    """Helper to append one record per second, with every 10th an ERROR from labbook.py"""
+    with open(path, "at") as f:
+        for i in range(first, first + count):
+            ts = START + datetime.timedelta(seconds=i)
+            error = i % 10 == 0
+            f.write(json.dumps({"asctime": ts.strftime("%Y-%m-%d %H:%M:%S,%f")[:-3],
+                                "levelname": "ERROR" if error else "INFO",
+                                "filename": "labbook.py" if error else "files.py",
+                                "funcName": "put" if error else "get",
+                                "lineno": i, "message": f"record {i}"}) + "\n")
+
+
+@pytest.fixture()
+def log_file(tmp_path):
+    path = str(tmp_path / "labmanager.log")
+    _write_records(path, 0, 600)
+    yield path
+
+
+def _ts(seconds: int) -> float:
+    return (START + datetime.timedelta(seconds=seconds)).timestamp()
+
+
+class TestLogQuery(object):
+    def test_parse_timestamp(self):
+        """Test parsing log and command line timestamps"""
+        assert parse_timestamp("2018-07-25 14:00:01,500") == _ts(1) + 0.5
+        assert parse_timestamp("2018-07-25 14:02") == _ts(120)
+        assert parse_timestamp("14:02") == datetime.datetime.combine(datetime.date.today(),
+                                                                      datetime.time(14, 2)).timestamp()
+        assert parse_timestamp("not a time") is None
+
+    def test_time_range(self, log_file):
+        """Test a since/until query returns exactly the records in range"""
+        records = list(query_records(log_file, since=_ts(120), until=_ts(300)))
+
+        assert records[0]["message"] == "record 120"
+        assert records[-1]["message"] == "record 300"
+        assert len(records) == 181
+
+    def test_out_of_order_records(self, log_file):
+        """Test a record written just after a slightly newer one (by another process) is still found"""
+        with open(log_file, "rt") as f:
+            lines = f.readlines()
+        lines[200], lines[201] = lines[201], lines[200]
+        with open(log_file, "wt") as f:
+            f.writelines(lines)
+
+        records = list(query_records(log_file, since=_ts(120), until=_ts(200)))
+        assert sorted([r["lineno"] for r in records]) == list(range(120, 201))
+
+    def test_field_filters(self, log_file):
+        """Test level, file and function filters"""
+        errors = list(query_records(log_file, level="warning"))
+        assert len(errors) == 60
+        assert all(r["levelname"] == "ERROR" for r in errors)
+
+        files = list(query_records(log_file, filename="labbook.py", func="put", since=_ts(100), until=_ts(199)))
+        assert [r["lineno"] for r in files] == list(range(100, 200, 10))
+
+        assert list(query_records(log_file, func="missing")) == []
+
+        with pytest.raises(ValueError):
+            list(query_records(log_file, level="LOUD"))
+
+    def test_index_incremental(self, log_file):
+        """Test the sidecar index is reused and extended as the log grows"""
+        list(query_records(log_file, since=_ts(10)))
+        assert os.path.exists(log_file + ".idx")
+
+        index = LogIndex(log_file, interval=4096)
+        with open(log_file, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                index.update(mm, os.fstat(f.fileno()).st_ino)
+        first_offsets = list(index.offsets)
+        assert len(first_offsets) > 10
+        assert index.timestamps == sorted(index.timestamps)
+
+        _write_records(log_file, 600, 600)
+        index = LogIndex(log_file, interval=4096)
+        with open(log_file, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                index.update(mm, os.fstat(f.fileno()).st_ino)
+
+        assert index.offsets[:len(first_offsets)] == first_offsets
+        assert len(index.offsets) > 2 * len(first_offsets) - 2
+
+        records = list(query_records(log_file, since=_ts(1100)))
+        assert [r["lineno"] for r in records] == list(range(1100, 1200))
+
+    def test_index_rebuilt_after_rotation(self, log_file):
+        """Test a stale index for a replaced log is not used"""
+        list(query_records(log_file, since=_ts(10)))
+        os.remove(log_file)
+        _write_records(log_file, 1000, 10)
+
+        records = list(query_records(log_file, since=_ts(1005)))
+        assert [r["lineno"] for r in records] == list(range(1005, 1010))
+
+    def test_index_end_offset(self, log_file):
+        """Test the scan for `until` stops one block past the first block starting after it"""
+        index = LogIndex(log_file, interval=4096)
+        with open(log_file, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                index.update(mm, os.fstat(f.fileno()).st_ino)
+
+        past = [i for i, t in enumerate(index.timestamps) if t > _ts(300)][0]
+        assert index.end_offset(_ts(300)) == index.offsets[past + 1]
+        assert index.end_offset(_ts(10000)) is None
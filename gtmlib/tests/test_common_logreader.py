@@ -0,0 +1,152 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from gtmlib.common.filewatch import FileWatcher
+from gtmlib.common.logreader import seek_tail, LogFollower
+
+
+def _record(message: str) -> bytes:
+    return (json.dumps({"levelname": "INFO", "message": message}) + "\n").encode()
+
+
+@pytest.fixture()
+def log_file(tmp_path):
+    """Fixture to write a small JSON log and return its path"""
+    path = tmp_path / "labmanager.log"
+    with open(path, "wt") as f:
+        for i in range(100):
+            f.write(json.dumps({"levelname": "INFO", "message": f"record {i}"}) + "\n")
+    yield str(path)
+
+
+class TestLogReader(object):
+    @pytest.mark.parametrize("block_size", [7, 64, 65536])
+    def test_seek_tail_lines(self, log_file, block_size):
+        """Test seeking back a number of records, across block boundaries"""
+        with open(log_file, "rb") as f:
+            seek_tail(f, lines=3, block_size=block_size)
+            records = [json.loads(ln)["message"] for ln in f.readlines()]
+
+        assert records == ["record 97", "record 98", "record 99"]
+
+    def test_seek_tail_end(self, log_file):
+        """Test the default seeks straight to the end"""
+        with open(log_file, "rb") as f:
+            offset = seek_tail(f)
+            assert f.read() == b""
+
+        with open(log_file, "rb") as f:
+            assert offset == len(f.read())
+
+    def test_seek_tail_more_than_available(self, log_file):
+        """Test asking for more records than exist returns the whole file"""
+        with open(log_file, "rb") as f:
+            assert seek_tail(f, lines=1000, block_size=50) == 0
+            assert len(f.readlines()) == 100
+
+    def test_seek_tail_partial_record(self, log_file):
+        """Test an unterminated final record counts as a record"""
+        with open(log_file, "ab") as f:
+            f.write(b'{"levelname": "INFO", "mess')
+
+        with open(log_file, "rb") as f:
+            seek_tail(f, lines=2, block_size=16)
+            lines = f.readlines()
+
+        assert json.loads(lines[0])["message"] == "record 99"
+        assert lines[1] == b'{"levelname": "INFO", "mess'
+
+    def test_follow_new_records(self, log_file):
+        """Test following returns only records written after start, in one batch"""
+        follower = LogFollower(log_file)
+        assert follower.read_batch() == []
+
+        with open(log_file, "ab") as f:
+            f.write(_record("new 1") + _record("new 2") + b'{"levelname": "IN')
+
+        batch = follower.read_batch()
+        assert [json.loads(x)["message"] for x in batch] == ["new 1", "new 2"]
+
+        # Finishing the partial record returns it whole
+        with open(log_file, "ab") as f:
+            f.write(b'FO", "message": "new 3"}\n')
+        assert [json.loads(x)["message"] for x in follower.read_batch()] == ["new 3"]
+        follower.close()
+
+    def test_follow_rotation(self, log_file):
+        """Test records written to the old file before rotation are not lost"""
+        follower = LogFollower(log_file)
+
+        with open(log_file, "ab") as f:
+            f.write(_record("before rotate"))
+        os.rename(log_file, log_file + ".1")
+        with open(log_file, "wb") as f:
+            f.write(_record("after rotate"))
+
+        messages = [json.loads(x)["message"] for x in follower.read_batch() + follower.read_batch()]
+        assert messages == ["before rotate", "after rotate"]
+        assert follower.rotations == 1
+        follower.close()
+
+    def test_follow_truncation(self, log_file):
+        """Test a log truncated in place is re-read from the start"""
+        follower = LogFollower(log_file)
+
+        with open(log_file, "wb") as f:
+            f.write(_record("fresh"))
+
+        assert [json.loads(x)["message"] for x in follower.read_batch()] == ["fresh"]
+        follower.close()
+
+    def test_watcher_wakes_on_write(self, log_file):
+        """Test the watcher returns promptly when the file is written"""
+        watcher = FileWatcher(log_file)
+        if not watcher.uses_inotify:
+            pytest.skip("inotify not available")
+
+        def write_later():
+            time.sleep(0.1)
+            with open(log_file, "ab") as f:
+                f.write(_record("wake"))
+
+        thread = threading.Thread(target=write_later)
+        thread.start()
+        start = time.time()
+        watcher.wait(timeout=3)
+        thread.join()
+        watcher.close()
+
+        assert time.time() - start < 1
+
+    def test_watcher_polls_off_linux(self, log_file, monkeypatch):
+        """Test the watcher doesn't try inotify on other platforms, where libc can't be loaded the same way"""
+        monkeypatch.setattr(sys, "platform", "win32")
+        watcher = FileWatcher(log_file, poll_interval=0.01)
+
+        assert not watcher.uses_inotify
+        watcher.wait()
+        watcher.close()
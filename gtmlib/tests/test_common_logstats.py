@@ -0,0 +1,93 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import gzip
+import json
+
+import pytest
+
+from gtmlib.common.logstats import LogStats, find_log_files, iter_log_lines
+
+
+def _line(level: str, filename: str, func: str, minute: int) -> bytes:
+    return (json.dumps({"asctime": f"2018-07-25 14:{minute:02d}:00,000", "levelname": level, "filename": filename,
+                        "funcName": func, "message": "x"}) + "\n").encode()
+
+
+@pytest.fixture()
+def rotated_logs(tmp_path):
+    """Fixture to create a live log plus a plain and a gzip compressed rotation"""
+    live = str(tmp_path / "labmanager.log")
+    with gzip.open(live + ".2.gz", "wb") as f:
+        f.write(_line("ERROR", "a.py", "f", 0) * 3)
+    with open(live + ".1", "wb") as f:
+        f.write(_line("INFO", "b.py", "g", 1) * 5)
+    with open(live, "wb") as f:
+        f.write(_line("WARNING", "b.py", "g", 2) + b"not json\n")
+    with open(live + ".idx", "wt") as f:
+        f.write("{}")
+    yield live
+
+
+class TestLogStats(object):
+    def test_find_log_files(self, rotated_logs):
+        """Test rotated files are found oldest first and unrelated files ignored"""
+        assert find_log_files(rotated_logs) == [rotated_logs + ".2.gz", rotated_logs + ".1", rotated_logs]
+
+    def test_aggregate(self, rotated_logs):
+        """Test levels, sources and per-minute errors across plain and gzip files"""
+        stats = LogStats()
+        for path in find_log_files(rotated_logs):
+            for line in iter_log_lines(path):
+                stats.add_line(line)
+
+        assert stats.records == 9
+        assert stats.invalid == 1
+        assert stats.levels == {"ERROR": 3, "INFO": 5, "WARNING": 1}
+        assert stats.top_sources(1) == [("b.py::g", 6, 0)]
+        assert stats.error_minutes() == [("2018-07-25 14:00", 3, 3), ("2018-07-25 14:01", 5, 0),
+                                         ("2018-07-25 14:02", 1, 0)]
+        assert "b.py::g" in stats.report()
+
+    def test_bounded_memory(self):
+        """Test the source and minute tables never exceed their limits and heavy hitters survive"""
+        stats = LogStats(capacity=10, max_minutes=5)
+        for i in range(2000):
+            stats.add({"levelname": "INFO", "filename": "hot.py", "funcName": "loop",
+                       "asctime": f"2018-07-25 {i // 60 % 24:02d}:{i % 60:02d}:00"})
+            stats.add({"levelname": "INFO", "filename": f"cold{i}.py", "funcName": "once"})
+
+        assert len(stats._sources) == 10
+        assert len(stats._heap) == 10
+        assert len(stats.error_minutes()) == 5
+        source, count, error = stats.top_sources(1)[0]
+        assert source == "hot.py::loop"
+        assert count - error <= 2000 <= count
+
+    def test_evicts_smallest_counter(self):
+        """Test eviction replaces the source with the smallest current count, even after other counts changed"""
+        stats = LogStats(capacity=3)
+        for source, count in [("a", 5), ("b", 1), ("c", 3)]:
+            for _ in range(count):
+                stats.add({"levelname": "INFO", "filename": source, "funcName": "f"})
+        for _ in range(6):
+            stats.add({"levelname": "INFO", "filename": "b", "funcName": "f"})
+
+        stats.add({"levelname": "INFO", "filename": "d", "funcName": "f"})
+        assert sorted(stats.top_sources()) == [("a::f", 5, 0), ("b::f", 7, 0), ("d::f", 4, 3)]
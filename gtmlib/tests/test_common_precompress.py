@@ -0,0 +1,91 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import gzip
+import os
+
+import pytest
+
+from gtmlib.common import precompress
+from gtmlib.common.precompress import format_report, precompress_directory
+
+
+@pytest.fixture()
+def ui_build(tmp_path, monkeypatch):
+    """Fixture to create a compiled frontend with compressible, small and binary files, without brotli"""
+    monkeypatch.setattr(precompress, "brotli", None)
+    build = tmp_path / "build"
+    (build / "static" / "js").mkdir(parents=True)
+    (build / "static" / "js" / "main.1a2b3c4d.js").write_text("var x = 1;\n" * 1000)
+    (build / "index.html").write_text("<html>" + "<div></div>" * 200 + "</html>")
+    (build / "manifest.json").write_text("{}")
+    (build / "logo.png").write_bytes(os.urandom(4096))
+    yield str(build)
+
+
+class TestPrecompress(object):
+    def test_precompress(self, ui_build):
+        """Test gzip variants are written for large compressible files only"""
+        report = precompress_directory(ui_build)
+
+        assert sorted(report['files']) == ['index.html', os.path.join('static', 'js', 'main.1a2b3c4d.js')]
+        assert '.br' not in report
+        assert report['.gz'] < report['original']
+
+        js_file = os.path.join(ui_build, 'static', 'js', 'main.1a2b3c4d.js')
+        with gzip.open(js_file + '.gz', 'rb') as f:
+            assert f.read() == b"var x = 1;\n" * 1000
+        assert not os.path.exists(os.path.join(ui_build, 'manifest.json.gz'))
+        assert not os.path.exists(os.path.join(ui_build, 'logo.png.gz'))
+
+    def test_deterministic(self, ui_build):
+        """Test the same input gives byte identical variants, and up to date variants are reused"""
+        precompress_directory(ui_build)
+        gz_file = os.path.join(ui_build, 'index.html.gz')
+        with open(gz_file, 'rb') as f:
+            first = f.read()
+
+        os.remove(gz_file)
+        precompress_directory(ui_build)
+        with open(gz_file, 'rb') as f:
+            assert f.read() == first
+
+        os.utime(gz_file, (1, 1))
+        os.utime(os.path.join(ui_build, 'index.html'), (0, 0))
+        precompress_directory(ui_build)
+        assert os.stat(gz_file).st_mtime == 1
+
+    def test_brotli(self, ui_build, monkeypatch):
+        """Test .br variants are written when a brotli module is available"""
+        class FakeBrotli(object):
+            @staticmethod
+            def compress(data, quality=11):
+                return data[:10]
+
+        monkeypatch.setattr(precompress, "brotli", FakeBrotli)
+        report = precompress_directory(ui_build)
+        assert os.path.isfile(os.path.join(ui_build, 'index.html.br'))
+        assert report['.br'] == 20
+        assert ".br:" in format_report(report)
+
+    def test_report(self, ui_build):
+        """Test the report shows the bytes saved"""
+        text = format_report(precompress_directory(ui_build))
+        assert text.startswith("Precompressed 2 files")
+        assert "saved" in text
@@ -0,0 +1,55 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from gtmlib.common.pushprogress import PushProgress
+
+
+class TestPushProgress(object):
+    def test_shared_layers(self):
+        """Test layers shared between images are counted once and skipped layers are not uploaded bytes"""
+        lines = []
+        progress = PushProgress(2, interval=0, output=lines.append)
+        progress.start("a:1")
+        progress.start("b:1")
+
+        progress.update("a:1", {"status": "Preparing", "id": "l1"})
+        progress.update("a:1", {"status": "Pushing", "id": "l1", "progressDetail": {"current": 500000,
+                                                                                  "total": 2000000}})
+        progress.update("b:1", {"status": "Layer already exists", "id": "l2"})
+        progress.update("b:1", {"status": "Waiting", "id": "l1"})
+        assert "1 uploading, 1 already in registry" in lines[-1]
+        assert "0.5/2.0 MB" in lines[-1]
+
+        progress.update("a:1", {"status": "Pushed", "id": "l1"})
+        progress.update("b:1", {"status": "Mounted from gigantum/a", "id": "l1"})
+        progress.update("a:1", {"aux": {"Tag": "1", "Digest": "sha256:abc", "Size": 1}})
+        progress.finish("a:1")
+
+        assert progress.digests == {"a:1": "sha256:abc"}
+        assert "1 running, 1/2 done" in lines[-1]
+        assert "1 pushed, 0 uploading, 1 already in registry" in lines[-1]
+        assert "2.0/2.0 MB" in lines[-1]
+
+    def test_throttle(self):
+        """Test summaries are printed at most once per interval"""
+        lines = []
+        progress = PushProgress(1, interval=60, output=lines.append)
+        for i in range(10):
+            progress.update("a:1", {"status": "Pushing", "id": "l1", "progressDetail": {"current": i, "total": 10}})
+        assert len(lines) == 1
@@ -0,0 +1,198 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import shutil
+import subprocess
+
+import pytest
+import yaml
+
+from gtmlib.common.render import BUILD_DATE_PLACEHOLDER, PERFORMANCE_PROFILES, get_performance_profiles, \
+    render_config, render_nginx_api, render_nginx_api_profiles, render_nginx_ui, render_performance_profiles, \
+    render_supervisor, write_if_changed
+
+
+@pytest.fixture()
+def config_files(tmp_path):
+    """Fixture to create a default config, an override and a supervisor config"""
+    base = tmp_path / "labmanager.yaml.default"
+    base.write_text("proxy:\n  api_port: 1999\n  external_proxy_port: 10000\n"
+                    "git:\n  working_directory: /tmp\n  lfs_enabled: false\n")
+    override = tmp_path / "override.yaml"
+    override.write_text("git:\n  lfs_enabled: true\n")
+    supervisor = tmp_path / "supervisord.conf"
+    supervisor.write_text("[program:redis]\ncommand=redis-server\n")
+    yield str(base), str(override), str(supervisor)
+
+
+class TestRender(object):
+    def test_config_is_stable(self, config_files):
+        """Test the rendered config only depends on its inputs and leaves build metadata as placeholders"""
+        base, override, _ = config_files
+        text, data = render_config(base, override)
+        assert render_config(base, override)[0] == text
+
+        assert data['git'] == {'working_directory': '/tmp', 'lfs_enabled': True}
+        assert yaml.safe_load(text)['build_info']['built_on'] == BUILD_DATE_PLACEHOLDER
+
+    def test_supervisor(self, config_files):
+        """Test the proxy program uses the configured ports"""
+        base, override, supervisor = config_files
+        _, data = render_config(base, override)
+        text = render_supervisor(supervisor, data)
+        assert text.startswith("[program:redis]")
+        assert "--port=10000 --api-port=1999" in text
+
+    def test_write_if_changed(self, tmp_path):
+        """Test unchanged content does not touch the file"""
+        path = str(tmp_path / "out.conf")
+        assert write_if_changed(path, "a") is True
+        os.utime(path, (1000, 1000))
+
+        assert write_if_changed(path, "a") is False
+        assert os.stat(path).st_mtime == 1000
+
+        assert write_if_changed(path, "b") is True
+        with open(path) as f:
+            assert f.read() == "b"
+
+    def test_nginx_ui(self):
+        """Test the UI config serves precompressed files and sets the cache headers"""
+        text = render_nginx_ui(port=10002)
+        assert "listen 10002;" in text
+        assert "gzip_static on;" in text
+        assert "immutable" in text
+        assert text.count('Cache-Control "no-cache"') == 3
+        assert "location = /index.html {" in text
+        assert text.count("{") == text.count("}")
+
+    def test_nginx_api(self):
+        """Test the API config uses the profile's buffer sizes"""
+        text = render_nginx_api(PERFORMANCE_PROFILES['server'], port=10001, socket='/tmp/test.sock')
+        assert "uwsgi_buffers 32 16k;" in text
+        assert "client_body_buffer_size 16m;" in text
+        assert "uwsgi_pass unix:///tmp/test.sock;" in text
+        assert text.count("{") == text.count("}")
+
+    def test_nginx_api_profiles(self, tmp_path):
+        """Test a config is rendered for every profile, including ones added by the override"""
+        override = tmp_path / "override.yaml"
+        override.write_text("performance:\n  profiles:\n    tiny:\n      nginx_client_body_buffer_size: 2m\n")
+        configs = render_nginx_api_profiles(str(override))
+        assert sorted(configs) == ['laptop.conf', 'server.conf', 'tiny.conf', 'workstation.conf']
+        assert "client_body_buffer_size 2m;" in configs['tiny.conf']
+
+        override.write_text("performance:\n  profiles:\n    ../tiny:\n      nginx_client_body_buffer_size: 2m\n")
+        with pytest.raises(ValueError):
+            render_nginx_api_profiles(str(override))
+
+    def test_performance_profiles(self, tmp_path):
+        """Test the override selects a profile and changes or adds profile settings"""
+        override = tmp_path / "override.yaml"
+        override.write_text("git:\n  lfs_enabled: true\n")
+        profile, profiles = get_performance_profiles(str(override))
+        assert profile == 'auto'
+        assert sorted(profiles) == ['laptop', 'server', 'workstation']
+
+        override.write_text("performance:\n  profile: tiny\n  profiles:\n"
+                            "    tiny:\n      uwsgi_processes: 1\n    server:\n      rq_workers: 40\n")
+        profile, profiles = get_performance_profiles(str(override))
+        assert profile == 'tiny'
+        assert profiles['tiny']['uwsgi_processes'] == 1
+        assert profiles['tiny']['rq_workers'] == profiles['workstation']['rq_workers']
+        assert profiles['server']['rq_workers'] == 40
+
+    def test_performance_profiles_invalid(self, tmp_path):
+        """Test unknown profiles and settings are rejected"""
+        override = tmp_path / "override.yaml"
+        override.write_text("performance:\n  profile: huge\n")
+        with pytest.raises(ValueError):
+            get_performance_profiles(str(override))
+
+        override.write_text("performance:\n  profiles:\n    laptop:\n      gunicorn_workers: 2\n")
+        with pytest.raises(ValueError):
+            get_performance_profiles(str(override))
+
+    @pytest.mark.parametrize("settings", ["nginx_uwsgi_busy_buffers_size: 4k",
+                                          "nginx_uwsgi_busy_buffers_size: 256k",
+                                          "nginx_uwsgi_buffers: 1 64k",
+                                          "nginx_uwsgi_buffer_size: 16 kb"])
+    def test_performance_profiles_invalid_nginx(self, tmp_path, settings):
+        """Test buffer settings nginx would refuse to start with are rejected"""
+        override = tmp_path / "override.yaml"
+        override.write_text("performance:\n  profiles:\n    laptop:\n      {}\n".format(settings))
+        with pytest.raises(ValueError):
+            get_performance_profiles(str(override))
+
+    @pytest.mark.skipif(not shutil.which('bash'), reason="requires bash")
+    def test_performance_profiles_script(self, tmp_path):
+        """Test the rendered script exports the selected profile, which the environment can override"""
+        override = tmp_path / "override.yaml"
+        override.write_text("performance:\n  profile: laptop\n")
+        script = tmp_path / "performance-profiles.sh"
+        script.write_text(render_performance_profiles(str(override)))
+
+        def run(profile=None):
+            env = dict(os.environ)
+            env.pop('GTM_PERFORMANCE_PROFILE', None)
+            if profile:
+                env['GTM_PERFORMANCE_PROFILE'] = profile
+            result = subprocess.run(['bash', '-c', 'source {} > /dev/null && echo $GTM_PERFORMANCE_PROFILE '
+                                     '$GTM_UWSGI_PROCESSES $GTM_RQ_WORKERS'.format(script)],
+                                    stdout=subprocess.PIPE, env=env, check=True)
+            return result.stdout.decode().split()
+
+        assert run() == ['laptop', '4', '8']
+        assert run('server') == ['server', '10', '25']
+        assert run('auto')[0] in ['laptop', 'workstation', 'server']
+
+    @pytest.mark.skipif(not shutil.which('bash'), reason="requires bash")
+    def test_performance_profiles_auto_cgroup(self, tmp_path):
+        """Test the auto profile uses the cgroup v2 or v1 limits of the container, and the host when there are none"""
+        override = tmp_path / "override.yaml"
+        override.write_text("performance:\n  profile: auto\n")
+        script = tmp_path / "performance-profiles.sh"
+        script.write_text(render_performance_profiles(str(override)))
+
+        def run(cgroup_files):
+            cgroup_root = tmp_path / "cgroup-{}".format(len(list(tmp_path.iterdir())))
+            cgroup_root.mkdir()
+            for name, content in cgroup_files.items():
+                (cgroup_root / name).parent.mkdir(exist_ok=True)
+                (cgroup_root / name).write_text(content + "\n")
+            env = dict(os.environ, GTM_CGROUP_ROOT=str(cgroup_root))
+            env.pop('GTM_PERFORMANCE_PROFILE', None)
+            result = subprocess.run(['bash', '-c', 'source {} > /dev/null && echo $GTM_PERFORMANCE_PROFILE '
+                                     '$GTM_CPUS $GTM_MEMORY_GB'.format(script)],
+                                    stdout=subprocess.PIPE, env=env, check=True)
+            return result.stdout.decode().split()
+
+        host = run({})
+        assert run({'cpu.max': 'max 100000', 'memory.max': 'max'}) == host
+        assert run({'cpu/cpu.cfs_quota_us': '-1', 'cpu/cpu.cfs_period_us': '100000',
+                    'memory/memory.limit_in_bytes': '9223372036854771712'}) == host
+
+        # Limits only ever lower the host values
+        host_cpus, host_memory_gb = int(host[1]), int(host[2])
+        assert run({'cpu.max': '150000 100000', 'memory.max': str(4 * 1024 ** 3)}) == \
+            ['laptop', str(min(2, host_cpus)), str(min(4, host_memory_gb))]
+        assert run({'cpu/cpu.cfs_quota_us': '100000', 'cpu/cpu.cfs_period_us': '100000',
+                    'memory/memory.limit_in_bytes': str(2 * 1024 ** 3)}) == \
+            ['laptop', '1', str(min(2, host_memory_gb))]
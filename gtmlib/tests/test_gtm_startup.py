@@ -0,0 +1,67 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import subprocess
+import sys
+
+
+GTM_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _loaded_modules(code: str) -> set:
+    """Helper to get the modules loaded by a fresh interpreter after running `code`"""
+    result = subprocess.run([sys.executable, "-c", f"import sys; {code}; print(','.join(sys.modules.keys()))"],
+                            cwd=GTM_ROOT, stdout=subprocess.PIPE, check=True, universal_newlines=True)
+    return set(result.stdout.strip().split(","))
+
+
+class TestGtmStartup(object):
+    def test_cli_does_not_load_components(self):
+        """Test importing the CLI does not import any component or docker"""
+        modules = _loaded_modules("import gtm")
+
+        assert "docker" not in modules
+        assert "git" not in modules
+        assert "yaml" not in modules
+        assert "gtmlib.labmanager" not in modules
+
+    def test_log_reader_is_lightweight(self):
+        """Test the log command only loads the log reader"""
+        modules = _loaded_modules("import gtm; import gtmlib.common.logreader")
+
+        assert "gtmlib.common.logreader" in modules
+        assert "gtmlib.common.dockerclient" in modules
+        assert "docker" not in modules
+
+    def test_load_component(self):
+        """Test a component is imported when selected"""
+        modules = _loaded_modules("import gtm; gtm.load_component('base-image')")
+
+        assert "gtmlib.baseimage" in modules
+        assert "gtmlib.labmanager" not in modules
+
+    def test_common_exports(self):
+        """Test the gtmlib.common re-exports resolve without loading docker"""
+        modules = _loaded_modules("from gtmlib.common import ask_question, dockerize_windows_path, "
+                                  "get_docker_client, DockerVolume")
+
+        assert "gtmlib.common.dockervolume" in modules
+        assert "gtmlib.common.dockerclient" in modules
+        assert "docker" not in modules
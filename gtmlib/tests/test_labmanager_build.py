@@ -17,12 +17,60 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import os
+
 import pytest
 
 
+from gtmlib.labmanager import build as labmanager_build
 from gtmlib.labmanager.build import LabManagerBuilder
 
 
+class FakeImage(object):
+    def __init__(self, image_id, tags=None):
+        self.id = image_id
+        self.tags = tags if tags is not None else []
+
+    def tag(self, repository, tag=None):
+        self.tags.append(f"{repository}:{tag}")
+
+
+class FakeImages(object):
+    def __init__(self):
+        self.image_id = "sha256:1111"
+        self.tags = []
+
+    def get(self, name):
+        return FakeImage(self.image_id, self.tags)
+
+
+class FakeContainers(object):
+    def __init__(self):
+        self.commands = []
+
+    def run(self, image, command, **kwargs):
+        self.commands.append(command[-1])
+        if "-delete" in command[-1]:
+            return b"1.5\n"
+        return b"Loading config\n0.25\n"
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.pushed = []
+
+    def push(self, repository, tag=None, stream=False, decode=False):
+        self.pushed.append(f"{repository}:{tag}")
+        return iter([{'status': 'Pushing', 'id': 'abc'}, {'status': f'{tag}: digest: sha256:d'}])
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.images = FakeImages()
+        self.containers = FakeContainers()
+        self.api = FakeAPI()
+
+
 @pytest.fixture()
 def setup_build_class():
     """Fixture to create a Build instance with a test image name that does not exist and cleanup after"""
@@ -96,6 +144,89 @@ class TestLabManagerBuild(object):
         with pytest.raises(ValueError):
             b.container_name = "/my-image324"
 
+    def test_ui_bundle_key(self, tmp_path, monkeypatch):
+        """Test the frontend bundle key follows the UI sources and the builder image but not build output"""
+        monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path / "cache"))
+        frontend_dir = tmp_path / "labmanager-ui"
+        for rel_path in ["package.json", "yarn.lock", "src/index.js", "node_modules/react/index.js"]:
+            os.makedirs(str(frontend_dir / os.path.dirname(rel_path)), exist_ok=True)
+            (frontend_dir / rel_path).write_text(rel_path)
+
+        b = LabManagerBuilder()
+        b.docker_client = FakeClient()
+        key = b._get_ui_bundle_key(str(frontend_dir))
+        assert b._get_ui_bundle_key(str(frontend_dir)) == key
+
+        (frontend_dir / "build").mkdir()
+        (frontend_dir / "build" / "index.html").write_text("<html></html>")
+        (frontend_dir / "node_modules" / "react" / "index.js").write_text("changed")
+        assert b._get_ui_bundle_key(str(frontend_dir)) == key
+
+        (frontend_dir / "yarn.lock").write_text("react@16.0.0")
+        changed_key = b._get_ui_bundle_key(str(frontend_dir))
+        assert changed_key != key
+
+        b.docker_client.images.image_id = "sha256:2222"
+        assert b._get_ui_bundle_key(str(frontend_dir)) != changed_key
+
+    def test_measure_import_time(self):
+        """Test the import time is measured with and without the bytecode compiled into the image"""
+        b = LabManagerBuilder()
+        b.docker_client = FakeClient()
+        assert b._measure_import_time("test-labmanager-image") == {'without_bytecode': 1.5, 'with_bytecode': 0.25}
+        assert all(["import service" in cmd for cmd in b.docker_client.containers.commands])
+
+    def test_tag_and_push_without_async_client(self, monkeypatch):
+        """Test tagging and pushing fall back to the pooled client for endpoints the async client can't use"""
+        monkeypatch.setenv("DOCKER_HOST", "tcp://docker.example.com:2376")
+        monkeypatch.setenv("DOCKER_TLS_VERIFY", "1")
+        b = LabManagerBuilder()
+        b.docker_client = FakeClient()
+
+        b._tag_images('gigantum/labmanager:latest', 'gigantum/labmanager-edge', ['abc123', 'latest'])
+        b._push_tags('gigantum/labmanager-edge', ['abc123', 'latest'])
+
+        assert b.docker_client.images.tags == ['gigantum/labmanager-edge:abc123', 'gigantum/labmanager-edge:latest']
+        assert b.docker_client.api.pushed == ['gigantum/labmanager-edge:abc123', 'gigantum/labmanager-edge:latest']
+
+    def test_build_or_reuse(self, tmp_path, monkeypatch):
+        """Test an unchanged context reuses the last build without creating or sending a context"""
+        monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path / "cache"))
+        builds = []
+
+        class FakeWheelhouse(object):
+            def get_key(self):
+                return "wheels"
+
+            def build(self, verbose=False):
+                return str(tmp_path / "wheelhouse")
+
+        def fake_context(context_dir, dockerfile, extra_dirs=None):
+            builds.append(dockerfile)
+            return {'fileobj': iter([]), 'custom_context': True, 'dockerfile': dockerfile}
+
+        context_hash = {'value': "hash1"}
+        monkeypatch.setattr(labmanager_build, "WheelhouseBuilder", FakeWheelhouse)
+        monkeypatch.setattr(labmanager_build, "resolve_parent_digests", lambda client, dockerfile, pull: {})
+        monkeypatch.setattr(labmanager_build, "hash_build_context", lambda *args, **kwargs: context_hash['value'])
+        monkeypatch.setattr(labmanager_build, "get_build_context", fake_context)
+        monkeypatch.setattr(labmanager_build, "run_build", lambda client, **kwargs: None)
+
+        b = LabManagerBuilder()
+        b.docker_client = FakeClient()
+        b.image_name = "test-labmanager-image"
+        build_info = {'BUILD_DATE': 'now', 'BUILD_REVISION': 'abc'}
+
+        b._build_or_reuse(str(tmp_path), 'Dockerfile_labmanager', "test-labmanager-image:abc", build_info, {})
+        b._build_or_reuse(str(tmp_path), 'Dockerfile_labmanager', "test-labmanager-image:abc", build_info, {})
+        assert builds == ['Dockerfile_labmanager']
+
+        context_hash['value'] = "hash2"
+        b._build_or_reuse(str(tmp_path), 'Dockerfile_labmanager', "test-labmanager-image:abc", build_info, {})
+        b._build_or_reuse(str(tmp_path), 'Dockerfile_labmanager', "test-labmanager-image:abc", build_info, {},
+                          no_cache=True)
+        assert len(builds) == 3
+
     # DMK - removing test for now because added prompts break the test in its current form
     # def test_build_labmanager(self, setup_build_class):
     #     """Method to test building a labmanager image"""
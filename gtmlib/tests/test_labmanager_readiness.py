@@ -0,0 +1,167 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import http.server
+import threading
+import time
+
+import pytest
+
+from gtmlib.labmanager.readiness import ReadinessTracker, format_timeline, parse_supervisor_status
+
+
+SUPERVISOR_STATUS = b"""nginx                            RUNNING   pid 12, uptime 0:00:05
+redis                            RUNNING   pid 13, uptime 0:00:05
+labmanager                       STARTING
+"""
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class FakeContainer(object):
+    def __init__(self, outputs, status='running'):
+        self.name = 'gigantum.labmanager'
+        self.status = status
+        self.outputs = list(outputs)
+
+    def reload(self):
+        pass
+
+    def exec_run(self, cmd):
+        assert cmd == ['supervisorctl', 'status']
+        output = self.outputs.pop(0) if len(self.outputs) > 1 else self.outputs[0]
+        return 0, output
+
+
+class HangingContainer(FakeContainer):
+    def __init__(self):
+        FakeContainer.__init__(self, [b""])
+        self.release = threading.Event()
+
+    def exec_run(self, cmd):
+        self.release.wait(10)
+        return 0, b""
+
+
+class StatusHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def http_port():
+    """Fixture to serve HTTP on a free local port, yielding (server, port)"""
+    server = http.server.HTTPServer(('127.0.0.1', 0), StatusHandler)
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+class TestReadiness(object):
+    def test_parse_supervisor_status(self):
+        """Test parsing `supervisorctl status` output"""
+        states = parse_supervisor_status(SUPERVISOR_STATUS.decode() + "unix:///var/run/supervisor.sock no such file\n")
+
+        assert states == {'nginx': 'RUNNING', 'redis': 'RUNNING', 'labmanager': 'STARTING'}
+
+    def test_ready(self, http_port):
+        """Test waiting until the port responds and all programs are running"""
+        server, port = http_port
+        running = SUPERVISOR_STATUS.replace(b"STARTING", b"RUNNING   pid 14, uptime 0:00:01")
+        container = FakeContainer([SUPERVISOR_STATUS, running])
+        tracker = ReadinessTracker(container, started_at=0.0, host='127.0.0.1', ports={'api': port},
+                                   timeout=30, interval=0.01, clock=FakeClock())
+
+        report = tracker.wait()
+
+        assert report['ready'] is True
+        assert report['failure'] is None
+        assert report['ready_seconds'] == 2.0
+        services = {s['name']: s['ready_seconds'] for s in report['services']}
+        assert services == {"port {} (api)".format(port): 1.0,
+                            "supervisor labmanager": 2.0,
+                            "supervisor nginx": 1.0,
+                            "supervisor redis": 1.0}
+
+        timeline = format_timeline(report)
+        assert "ready in 2.0s" in timeline
+        assert timeline.splitlines()[-1].endswith("supervisor labmanager")
+
+    def test_server_error_is_not_ready(self, http_port):
+        """Test a 5xx response (upstream not up yet) times out"""
+        server, port = http_port
+        server.status = 502
+        container = FakeContainer([SUPERVISOR_STATUS.replace(b"STARTING", b"RUNNING")])
+        tracker = ReadinessTracker(container, started_at=0.0, host='127.0.0.1', ports={'api': port},
+                                   timeout=3, interval=0.01, clock=FakeClock())
+
+        report = tracker.wait()
+
+        assert report['ready'] is False
+        assert report['failure'] == "Timed out after 3s"
+        assert report['ready_seconds'] is None
+        assert "port {} (api)  not ready".format(port) in format_timeline(report)
+
+    def test_fatal_program(self):
+        """Test waiting stops when a supervisor program fails"""
+        container = FakeContainer([SUPERVISOR_STATUS.replace(b"STARTING", b"FATAL     Exited too quickly")])
+        tracker = ReadinessTracker(container, started_at=0.0, ports={}, timeout=30, interval=0.01, clock=FakeClock())
+
+        report = tracker.wait()
+
+        assert report['ready'] is False
+        assert report['failure'] == "Supervisor program(s) failed: labmanager (FATAL)"
+        assert "supervisor labmanager  not ready (FATAL)" in format_timeline(report)
+
+    def test_container_exited(self):
+        """Test waiting stops when the container exits"""
+        container = FakeContainer([b""], status='exited')
+        tracker = ReadinessTracker(container, started_at=0.0, ports={}, timeout=30, interval=0.01, clock=FakeClock())
+
+        report = tracker.wait()
+
+        assert report['ready'] is False
+        assert report['failure'] == "Container exited"
+
+    def test_hung_exec_times_out(self):
+        """Test a supervisorctl exec that never returns doesn't keep the wait past its timeout"""
+        container = HangingContainer()
+        tracker = ReadinessTracker(container, started_at=time.monotonic(), ports={}, timeout=0.3, interval=0.05)
+
+        start = time.monotonic()
+        report = tracker.wait()
+        container.release.set()
+
+        assert time.monotonic() - start < 2
+        assert report['ready'] is False
+        assert report['failure'] == "Timed out after 0.3s"
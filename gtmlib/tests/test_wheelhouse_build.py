@@ -0,0 +1,97 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import time
+
+import pytest
+
+from gtmlib.wheelhouse import build as wheelhouse_build
+from gtmlib.wheelhouse.build import REQUIREMENTS_FILES, WheelhouseBuilder
+
+
+class FakeImages(object):
+    def __init__(self):
+        self.removed = []
+
+    def remove(self, name):
+        self.removed.append(name)
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.images = FakeImages()
+
+
+@pytest.fixture()
+def wheelhouse(tmp_path, monkeypatch):
+    """Fixture to create fake requirements files and a wheelhouse builder using a temporary cache"""
+    resources = tmp_path / "resources"
+    for rel_path in ['Dockerfile_wheelhouse'] + REQUIREMENTS_FILES:
+        os.makedirs(str(resources / os.path.dirname(rel_path)), exist_ok=True)
+        (resources / rel_path).write_text("requests==2.18.4\n")
+    monkeypatch.setenv("GTM_CACHE_DIR", str(tmp_path / "cache"))
+
+    client = FakeClient()
+    monkeypatch.setattr(wheelhouse_build, "get_docker_client", lambda: client)
+
+    builder = WheelhouseBuilder(keep=2)
+    builder.docker_build_dir = str(resources)
+    builder.client = client
+    yield builder
+
+
+def _make_wheelhouse(builder, key, last_used):
+    wheelhouse_dir = builder.get_wheelhouse_dir(key)
+    os.makedirs(wheelhouse_dir)
+    marker = os.path.join(wheelhouse_dir, '.complete')
+    with open(marker, 'wt') as f:
+        f.write('{}')
+    os.utime(marker, (last_used, last_used))
+
+
+class TestWheelhouseBuilder(object):
+    def test_key(self, wheelhouse):
+        """Test the key changes with any requirements file"""
+        key = wheelhouse.get_key()
+        assert wheelhouse.get_key() == key
+
+        with open(os.path.join(wheelhouse.docker_build_dir, REQUIREMENTS_FILES[2]), 'at') as f:
+            f.write("pyyaml==3.12\n")
+        assert wheelhouse.get_key() != key
+
+    def test_existing_wheelhouse_is_reused(self, wheelhouse, capsys):
+        """Test a complete wheelhouse for the current requirements is used without building"""
+        key = wheelhouse.get_key()
+        _make_wheelhouse(wheelhouse, key, time.time() - 100)
+
+        assert wheelhouse.build() == wheelhouse.get_wheelhouse_dir(key)
+        assert "up to date" in capsys.readouterr().out
+        assert os.path.getmtime(os.path.join(wheelhouse.get_wheelhouse_dir(key), '.complete')) > time.time() - 10
+
+    def test_evict_least_recently_used(self, wheelhouse):
+        """Test only the most recently used wheelhouses are kept, with their builder images removed"""
+        now = time.time()
+        _make_wheelhouse(wheelhouse, "old", now - 300)
+        _make_wheelhouse(wheelhouse, "recent", now - 100)
+        _make_wheelhouse(wheelhouse, "current", now - 500)
+
+        assert wheelhouse.evict(current="current") == ["old"]
+        assert sorted(os.listdir(os.path.dirname(wheelhouse.get_wheelhouse_dir("x")))) == ["current", "recent"]
+        assert wheelhouse.client.images.removed == ["gigantum/wheelhouse-builder:old"]
@@ -0,0 +1,195 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import typing
+from pkg_resources import resource_filename
+
+from docker.errors import APIError, ImageNotFound
+
+from gtmlib.common import get_docker_client
+from gtmlib.common.buildcontext import get_build_context
+from gtmlib.common.buildstream import run_build
+from gtmlib.common.cache import get_cache_dir
+
+# Requirements files (relative to gtmlib/resources) the images install from the wheelhouse
+REQUIREMENTS_FILES = [os.path.join('submodules', 'labmanager-common', 'requirements.txt'),
+                      os.path.join('submodules', 'labmanager-common', 'requirements-testing.txt'),
+                      os.path.join('submodules', 'labmanager-service-labbook', 'requirements.txt'),
+                      os.path.join('submodules', 'labmanager-service-labbook', 'requirements-testing.txt')]
+
+
+class WheelhouseBuilder(object):
+    """Class to build and cache the Python wheels the LabManager, developer and CircleCI images install
+
+    Wheels are compiled once in a builder image matching the target images (ubuntu:18.04, python3) and extracted to
+    .gtm-cache/wheelhouse/<key>, where the key is a hash of the requirements files and Dockerfile_wheelhouse. Image
+    builds then add the wheelhouse to their context and install from it with `pip3 install --no-index`.
+    """
+    def __init__(self, keep: int = 3) -> None:
+        """Constructor
+
+        Args:
+            keep(int): Number of wheelhouses (requirements versions) to keep, least recently used are removed
+        """
+        self.docker_build_dir = os.path.expanduser(resource_filename("gtmlib", "resources"))
+        self.image_name = "gigantum/wheelhouse-builder"
+        self.keep = keep
+
+    def get_key(self) -> str:
+        """Method to hash everything that determines the wheels
+
+        Returns:
+            str
+        """
+        h = hashlib.sha256()
+        for rel_path in ['Dockerfile_wheelhouse'] + REQUIREMENTS_FILES:
+            h.update(rel_path.encode() + b'\0')
+            with open(os.path.join(self.docker_build_dir, rel_path), 'rb') as f:
+                h.update(f.read() + b'\0')
+        return h.hexdigest()[:16]
+
+    def get_wheelhouse_dir(self, key: str) -> str:
+        """Method to get the cache directory for a wheelhouse
+
+        Args:
+            key(str): Key from get_key()
+
+        Returns:
+            str
+        """
+        return os.path.join(get_cache_dir('wheelhouse'), key)
+
+    def is_built(self, key: str) -> bool:
+        """Method to check if a complete wheelhouse exists for a key
+
+        Args:
+            key(str): Key from get_key()
+
+        Returns:
+            bool
+        """
+        return os.path.isfile(os.path.join(self.get_wheelhouse_dir(key), '.complete'))
+
+    def _extract_wheels(self, image_tag: str, wheelhouse_dir: str) -> None:
+        """Method to copy /wheelhouse out of the builder image
+
+        Args:
+            image_tag(str): Builder image
+            wheelhouse_dir(str): Destination directory, replaced atomically
+
+        Returns:
+            None
+        """
+        client = get_docker_client()
+        cache_root = get_cache_dir('wheelhouse')
+        temp_dir = tempfile.mkdtemp(dir=cache_root, prefix='.tmp-')
+        container = client.containers.create(image_tag, command='true')
+        try:
+            with tempfile.TemporaryFile(dir=cache_root) as archive:
+                stream, _ = container.get_archive('/wheelhouse')
+                for chunk in stream:
+                    archive.write(chunk)
+                archive.seek(0)
+
+                with tarfile.open(fileobj=archive) as tar:
+                    for member in tar.getmembers():
+                        name = os.path.normpath(member.name)
+                        if os.path.isabs(name) or name.startswith('..') or not (member.isfile() or member.isdir()):
+                            raise ValueError("Unexpected file in wheelhouse archive: {}".format(member.name))
+                    tar.extractall(temp_dir)
+
+            if os.path.exists(wheelhouse_dir):
+                shutil.rmtree(wheelhouse_dir)
+            os.replace(os.path.join(temp_dir, 'wheelhouse'), wheelhouse_dir)
+        finally:
+            container.remove(force=True)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def build(self, verbose: bool = False, no_cache: bool = False, force: bool = False) -> str:
+        """Method to build the wheelhouse for the current requirements, unless it already exists
+
+        Args:
+            verbose(bool): flag indicating if the build output should be printed
+            no_cache(bool): flag indicating if the docker cache should be ignored
+            force(bool): flag indicating if an existing wheelhouse should be rebuilt
+
+        Returns:
+            str: the wheelhouse directory
+        """
+        key = self.get_key()
+        wheelhouse_dir = self.get_wheelhouse_dir(key)
+
+        if self.is_built(key) and not force and not no_cache:
+            print("Wheelhouse {} is up to date".format(key))
+        else:
+            print("Building wheelhouse {}, please wait...".format(key))
+            image_tag = "{}:{}".format(self.image_name, key)
+            build_context = get_build_context(self.docker_build_dir, 'Dockerfile_wheelhouse')
+            run_build(get_docker_client(), verbose=verbose, **build_context, tag=image_tag, nocache=no_cache,
+                      pull=True, rm=True)
+            self._extract_wheels(image_tag, wheelhouse_dir)
+
+            wheels = [x for x in os.listdir(wheelhouse_dir) if x.endswith('.whl')]
+            size = sum([os.path.getsize(os.path.join(wheelhouse_dir, x)) for x in wheels])
+            with open(os.path.join(wheelhouse_dir, '.complete'), 'wt') as f:
+                json.dump({'key': key, 'created': time.time(), 'wheels': sorted(wheels)}, f)
+            print("Built wheelhouse {}: {} wheels, {:.1f} MB".format(key, len(wheels), size / 1e6))
+
+        # Mark as used, for eviction
+        os.utime(os.path.join(wheelhouse_dir, '.complete'))
+        self.evict(current=key)
+        return wheelhouse_dir
+
+    def evict(self, current: str = None) -> typing.List[str]:
+        """Method to remove the least recently used wheelhouses beyond `keep`, with their builder images
+
+        Args:
+            current(str): Key that is never removed
+
+        Returns:
+            list: removed keys
+        """
+        cache_root = get_cache_dir('wheelhouse')
+        keys = []
+        for key in os.listdir(cache_root):
+            marker = os.path.join(cache_root, key, '.complete')
+            if key.startswith('.') or key == current:
+                continue
+            last_used = os.path.getmtime(marker) if os.path.isfile(marker) else 0
+            keys.append((last_used, key))
+
+        removed = []
+        for _, key in sorted(keys, reverse=True)[max(0, self.keep - (1 if current else 0)):]:
+            shutil.rmtree(os.path.join(cache_root, key), ignore_errors=True)
+            try:
+                get_docker_client().images.remove("{}:{}".format(self.image_name, key))
+            except (APIError, ImageNotFound):
+                pass
+            removed.append(key)
+
+        if removed:
+            print("Removed {} unused wheelhouse(s)".format(len(removed)))
+        return removed